@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Benchmark of the metadata crawler's own overhead (L{metageta.crawler.Crawler})
+
+Generates directory trees of C{--datasets} datasets of C{--files} files each and times
+searching and crawling them with a format driver that doesn't read anything (every file
+in a dataset's directory is in its filelist). Half of each dataset's files are images the
+crawler finds, the other half are sidecar files (.aux) that it doesn't look for. The time
+per file should stay about the same as the number of files grows, i.e. crawl overhead is
+linear in file count.
+
+To compare with another revision, check it out and point C{--repo} at it, e.g.::
+    git worktree add ../metageta-before <revision>
+    python benchmarks/bench_crawler.py --repo ../metageta-before
+
+Usage::
+    python benchmarks/bench_crawler.py [--datasets 500,1000,2000,4000] [--files 21] [--repo .]
+'''
+
+import optparse, os, shutil, sys, tempfile, time
+
+def tree(d,ndatasets,nfiles):
+    ''' Write a tree of empty image and sidecar files, one directory per dataset'''
+    for i in range(ndatasets):
+        dataset=os.path.join(d,'%05d'%i)
+        os.mkdir(dataset)
+        for j in range(nfiles):open(os.path.join(dataset,'band%02d.%s'%(j,'tif' if j%2==0 else 'aux')),'w').close()
+
+class Dataset(object):
+    ''' Stands in for a format driver, the dataset claims every file in its directory'''
+    def __init__(self,f):
+        d=os.path.dirname(f)
+        self.filelist=[os.path.join(d,name) for name in os.listdir(d)]
+
+def crawl(crawler,d):
+    ''' Crawl a tree, returning the number of datasets and files'''
+    ndatasets,nfiles=0,0
+    for ds in crawler.Crawler(d):
+        ndatasets+=1
+        nfiles+=len(ds.filelist)
+    return ndatasets,nfiles
+
+def main():
+    parser=optparse.OptionParser(usage=__doc__.split('Usage::')[1].strip())
+    parser.add_option('--datasets',default='500,1000,2000,4000',help='Comma separated numbers of datasets to crawl')
+    parser.add_option('--files',type='int',default=21,help='Number of files per dataset')
+    parser.add_option('--repo',default=os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'),
+                      help='Directory of the metageta checkout to benchmark')
+    opts,args=parser.parse_args()
+
+    sys.path.insert(0,os.path.abspath(opts.repo))
+    from metageta import crawler
+    crawler.formats.Open=Dataset
+    print 'Crawler from %s'%os.path.dirname(crawler.__file__)
+    print '%10s %10s %10s %12s'%('datasets','files','seconds','us per file')
+    for ndatasets in [int(n) for n in opts.datasets.split(',')]:
+        d=tempfile.mkdtemp()
+        try:
+            tree(d,ndatasets,opts.files)
+            start=time.time()
+            result=crawl(crawler,d)
+            seconds=time.time()-start
+            assert result==(ndatasets,ndatasets*opts.files),result
+            print '%10s %10s %10.2f %12.1f'%(ndatasets,result[1],seconds,seconds/result[1]*1e6)
+        finally:
+            shutil.rmtree(d)
+
+if __name__=='__main__':
+    main()
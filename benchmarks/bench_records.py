@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Micro-benchmark of reading CEOS leader file records (L{metageta.utilities.RecordLayout})
+
+Compares the way the SPOT, CCRS and ALOS drivers used to read their leader files, i.e.
+reading the whole file and calling L{utilities.readbinary} for each field, with memory
+mapping it (L{utilities.mapfile}) and decoding each record with a L{utilities.RecordLayout}.
+
+A leader file of C{--records} 3960 byte (SPOT) records is generated in a temporary
+directory and the SPOT scene header, ephemeris and map projection records are read from it.
+
+Usage::
+    python benchmarks/bench_records.py [--records 30] [--repeat 5] [--number 2000]
+'''
+
+import optparse, os, shutil, sys, tempfile, timeit
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+from metageta import utilities
+
+recordlength=3960
+sceneheader={ #As per metageta.formats.spot_cap
+    'sceneid':(37,52),'cy':(85,100),'cx':(101,116),'uly':(149,164),'ulx':(165,180),
+    'ury':(213,228),'urx':(229,244),'lly':(277,292),'llx':(293,308),'lry':(341,356),'lrx':(357,372),
+    'rotation':(437,452,float),'sunazimuth':(469,484,float),'sunelevation':(485,500,float),
+    'imgdate':(581,612),'satellite':(613,628),'sensor':(629,644),'mode':(645,660),
+    'ncols':(997,1012,int),'nrows':(1013,1028,int),'nbands':(1045,1060,int),'bands':(1061,1316),
+    'level':(1317,1332),'resampling':(1365,1380),'cellx':(1381,1396),'celly':(1397,1412)}
+ephemeris={'viewangle':(3065,3076,float)}
+mapprojection={'projection':(21,52),'ellipsoid':(57,88),'datum':(101,132)}
+records=[(2,sceneheader),(3,ephemeris),(26,mapprojection)]
+
+def leaderfile(d,nrecords):
+    ''' Write a leader file with a numeric value in each field of the records that are read'''
+    data=bytearray(' '*recordlength*nrecords)
+    for record,fields in records:
+        for start,stop in [spec[:2] for spec in fields.values()]:
+            value='1'*(stop-start+1)
+            pos=(record-1)*recordlength+start-1
+            data[pos:pos+len(value)]=value
+    f=os.path.join(d,'LEAD')
+    open(f,'wb').write(str(data))
+    return f
+
+def readbinary(f):
+    ''' Read the records as the drivers used to'''
+    meta=open(f,'rb').read()
+    md={}
+    for record,fields in records:
+        for name,spec in fields.items():
+            value=utilities.readbinary(meta,(record-1)*recordlength,spec[0],spec[1])
+            if len(spec)>2:value=spec[2](value)
+            md[name]=value
+    return md
+
+layouts=[(record,utilities.RecordLayout(fields)) for record,fields in records]
+def recordlayout(f):
+    ''' Read the records as the drivers do now'''
+    md={}
+    with utilities.mapfile(f) as meta:
+        for record,layout in layouts:md.update(layout.read(meta,(record-1)*recordlength))
+    return md
+
+def main():
+    parser=optparse.OptionParser(usage=__doc__.split('Usage::')[1].strip())
+    parser.add_option('--records',type='int',default=30,help='Number of records in the leader file')
+    parser.add_option('--repeat',type='int',default=5,help='Number of timings, the best is reported')
+    parser.add_option('--number',type='int',default=2000,help='Number of times the records are read per timing')
+    opts,args=parser.parse_args()
+
+    d=tempfile.mkdtemp()
+    try:
+        f=leaderfile(d,opts.records)
+        assert readbinary(f)==recordlayout(f)
+        print 'Reading %s fields from a %s byte leader file, best of %s x %s:'%(
+            sum([len(fields) for record,fields in records]),os.path.getsize(f),opts.repeat,opts.number)
+        results={}
+        for func in (readbinary,recordlayout):
+            best=min(timeit.repeat(lambda:func(f),repeat=opts.repeat,number=opts.number))
+            results[func.__name__]=best/opts.number
+            print '    %-14s %8.1f us per file'%(func.__name__,results[func.__name__]*1e6)
+        print '    speedup        %8.1fx'%(results['readbinary']/results['recordlayout'])
+    finally:
+        shutil.rmtree(d)
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Benchmark of the time taken to import the format drivers (L{metageta.formats})
+
+Imports L{metageta.formats} in a fresh interpreter C{--repeat} times and reports the best
+time, the number of format drivers that were imported and whether GDAL was imported.
+The "cold" run has an empty user cache directory, the "warm" runs reuse it.
+Format drivers should only be imported when a file matches one of their regexes,
+so importing L{metageta.formats} shouldn't import any of them (or GDAL).
+
+To compare with another revision, check it out and point C{--repo} at it, e.g.::
+    git worktree add ../metageta-before <revision>
+    python benchmarks/bench_startup.py --repo ../metageta-before
+
+Usage::
+    python benchmarks/bench_startup.py [--repeat 5] [--repo .]
+'''
+
+import optparse, os, shutil, subprocess, sys, tempfile
+
+script='''
+import sys,time
+sys.path.insert(0,%r)
+start=time.time()
+from metageta import formats
+seconds=time.time()-start
+print repr((seconds,len([d for d in formats.__formats__.values() if d]),'osgeo.gdal' in sys.modules))
+'''
+
+def run(repo,cache):
+    ''' Import metageta.formats in a new interpreter, returning (seconds, drivers imported, gdal imported)'''
+    env=dict(os.environ,XDG_CACHE_HOME=cache)
+    out=subprocess.Popen([sys.executable,'-c',script%repo],env=env,stdout=subprocess.PIPE).communicate()[0]
+    return eval(out.strip().splitlines()[-1])
+
+def main():
+    parser=optparse.OptionParser(usage=__doc__.split('Usage::')[1].strip())
+    parser.add_option('--repeat',type='int',default=5,help='Number of warm imports to time')
+    parser.add_option('--repo',default=os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'),
+                      help='Directory of the metageta checkout to benchmark')
+    opts,args=parser.parse_args()
+
+    repo=os.path.abspath(opts.repo)
+    cache=tempfile.mkdtemp()
+    try:
+        print 'Format drivers from %s'%os.path.join(repo,'metageta','formats')
+        print '%6s %10s %10s %6s'%('run','seconds','drivers','gdal')
+        print '%6s %10.3f %10s %6s'%(('cold',)+run(repo,cache))
+        print '%6s %10.3f %10s %6s'%(('warm',)+min([run(repo,cache) for i in range(opts.repeat)]))
+    finally:
+        shutil.rmtree(cache)
+
+if __name__=='__main__':
+    main()
@@ -37,25 +37,37 @@ Usage::
 @sysarg: C{-e, --exclude}   : Glob style file/directory exclusion pattern/s
 @sysarg: C{-r, --recurse}   : Search directory recursively?
 @sysarg: C{-a, --archive}   : Search compressed archives?
+@sysarg: C{--stream}        : Extract metadata while still searching for files
+@sysarg: C{--threads}       : Number of threads used to search directories
+@sysarg: C{--workers}       : Number of processes used to extract metadata
+@sysarg: C{--threaded}      : Use threads instead of processes for --workers and --ovworkers
+@sysarg: C{--ovworkers}     : Number of processes used to generate overview images, by default they're generated while extracting metadata
+@sysarg: C{--resume}        : Resume an interrupted crawl from its last checkpoint (the directory is searched again, datasets saved at the checkpoint are skipped without opening them)
+@sysarg: C{--fields}        : Only extract these (comma separated) metadata fields
 @sysarg: C{--debug}         : Turn debug output on
 
 @note: See U{Issue 22<https://github.com/lpinner/metageta/issues/22>}
 '''
 
 import sys, os
+import collections
+import Queue
+import threading
 import time
+import warnings
 import optparse
 
 from metageta import formats
+from metageta.formats import __dataset__
 from metageta import geometry
 from metageta import utilities
 from metageta import crawler
-from metageta import overviews
+from metageta import manifest
 from metageta import progresslogger
 from metageta import icons
 from metageta import getargs
 
-def execute(dir, xlsx, logger, mediaid=None, update=False, getovs=False, recurse=False, archive=False, excludes=''):
+def execute(dir, xlsx, logger, mediaid=None, update=False, getovs=False, recurse=False, archive=False, excludes='', stream=False, threads=1, workers=1, resume=False, checkpoint=600, threaded=False, fields=None, ovworkers=0):
 
     """ Run the Metadata Crawler
 
@@ -75,36 +87,85 @@ def execute(dir, xlsx, logger, mediaid=None, update=False, getovs=False, recurse
         @param archive: Search compressed archives (tar/zip)?
         @type  exclude: C{list}
         @param archive: Glob style file/directory exclusion pattern/s
+        @type  stream: C{boolean}
+        @param stream: Extract metadata while still searching for files?
+        @type  threads: C{int}
+        @param threads: Number of threads used to search directories
+        @type  workers: C{int}
+        @param workers: Number of processes used to extract metadata
+        @type  resume: C{boolean}
+        @param resume: Resume an interrupted crawl from its last checkpoint. The directory is searched
+                       again and the datasets saved at the checkpoint are skipped without opening them.
+        @type  checkpoint: C{int}
+        @param checkpoint: Seconds between checkpoints, when the records written so far are saved
+        @type  threaded: C{boolean}
+        @param threaded: Use worker threads instead of processes to extract metadata
+        @type  fields: C{list}
+        @param fields: Only extract these metadata fields (file info fields are always extracted), defaults to all fields
+        @type  ovworkers: C{int}
+        @param ovworkers: Number of processes used to generate overview images, see L{OverviewQueue}.
+                          If 0 (the default), overview images are generated while extracting metadata.
         @return:  C{progresslogger.ProgressLogger}
     """
 
     shp=xlsx.replace('.xlsx','.shp')
+    mft=xlsx.replace('.xlsx','.manifest')
     excludes = excludes.split()
 
     format_regex  = formats.format_regex
     format_fields = formats.fields
 
     logger.debug(' '.join(sys.argv))
+    if fields:
+        unknown=[f for f in fields if f not in format_fields]
+        if unknown:
+            logger.error('Unknown metadata field/s: %s' % ', '.join(unknown))
+            return
+    if resume:update=True #The spreadsheet holds the records from the last checkpoint
 
     #raise Exception
     #ExcelWriter=utilities.ExcelWriter(xlsx,format_fields.keys(),update=update)
+    Manifest=manifest.Manifest(mft)
     with utilities.ExcelWriter(xlsx,format_fields.keys(),update=update) as ExcelWriter:
         try:
             #Are we updating an existing crawl?
             records={}
+            rebuild=not (update and Manifest.isvalid(xlsx))
+            Manifest.invalidate() #Until the spreadsheet is saved
+            if resume:
+                Manifest.active=True
+                if rebuild:logger.info('No checkpoint found, %s will be updated'%xlsx)
+                else:logger.info('Resuming from the last checkpoint, datasets already saved will be skipped')
+                crashed=Manifest.crashed()
+                if crashed:
+                    logger.warn('The crawl died while opening %s, it will be skipped'%crashed)
+                    Manifest.error(crashed,'Crawl died while opening this file')
+            else:Manifest.clearerrors()
             if update and os.path.exists(xlsx):
 
                 #Do we need to recreate the shapefile?
-                if os.path.exists(shp):
+                if os.path.exists(shp) and not resume:
                     ShapeWriter=False
+                elif resume:
+                    #It may have records added after the last checkpoint
+                    logger.info('%s will be recreated...'%shp)
+                    ShapeWriter=geometry.ShapeWriter(shp,format_fields,update=False)
                 else:
                     logger.info('%s does not exist, it will be recreated...'%shp)
                     ShapeWriter=geometry.ShapeWriter(shp,format_fields,update=False)
 
+                if rebuild:
+                    #The manifest is out of date, get the existing records from the spreadsheet
+                    Manifest.clear()
+                if rebuild or ShapeWriter:
+                    existing=((utilities.uuid(rec['filepath']),row,rec) for row,rec in enumerate(utilities.ExcelReader(xlsx)))
+                else:
+                    existing=list(Manifest.records())
+
                 #Build a dict of existing records
                 row=-1
                 #with utilities.ExcelReader(xlsx) as ExcelReader: #Using a context manager ensures closure before writing
-                for row,rec in enumerate(utilities.ExcelReader(xlsx)):
+                for key,row,rec in existing:
                     #Check if the dataset still exists, mark it DELETED if it doesn't
                     if os.path.exists(rec['filepath']) or rec['mediaid'] !='' or \
                        (rec['filepath'][0:4]=='/vsi' and utilities.compressed_file_exists(rec['filepath'],False)):
@@ -113,119 +174,104 @@ def execute(dir, xlsx, logger, mediaid=None, update=False, getovs=False, recurse
                             ShapeWriter.WriteRecord(ext,rec)
                         #Kludge to ensure backwards compatibility with previously generated guids
                         #records[rec['guid']]=rec
-                        records[utilities.uuid(rec['filepath'])]=(row,rec)
+                        records[key]=(row,rec)
                     else:
                         if rec.get('DELETED',0)not in [1,'1']:
                             rec['DELETED']=1
                             ExcelWriter.UpdateRecord(rec,row)
                             logger.info('Marked %s as deleted' % (rec['filepath']))
+                        if not rebuild:Manifest.delete(key)
+                    if rebuild:Manifest.add(key,row,rec)
                 if row==-1:logger.info('Output spreadsheet is empty, no records to update')
                 ExcelWriter.save()
                 del ShapeWriter
+            else:Manifest.clear()
             ShapeWriter=geometry.ShapeWriter(shp,format_fields,update=update)
 
         except Exception,err:
             logger.error('%s' % utilities.ExceptionInfo())
             logger.debug(utilities.ExceptionInfo(10))
             #sys.exit(1)
+            Manifest.close()
             return
 
+        def skip(f,filestat,stats):
+            #Skip files that couldn't be opened before the crawl was interrupted
+            if resume:
+                err=Manifest.failed(f)
+                if err is not None:
+                    Crawler.filecount-=1
+                    Crawler.errors.append((f,err[0],err[1]))
+                    return []
+            #Skip unchanged datasets from the previous crawl without opening them
+            rec=Manifest.unchanged(f,filestat,stats) if records else None
+            if rec is not None and not overviewsmissing(rec,os.path.dirname(xlsx),getovs):
+                logger.info('Metadata did not need updating for %s, %s files remaining' % (f,Crawler.remaining()))
+                return rec['files']
+            if workers<=1:Manifest.opening(f) #So we can skip it when resuming if it crashes the crawl
+            return None
+
+        last=[time.time()]
+        def save(f):
+            #Periodically save the records written so far
+            if time.time()-last[0]<checkpoint:return
+            ExcelWriter.checkpoint()
+            for file,err,dbg in Crawler.errors:Manifest.error(file,err,dbg)
+            Manifest.checkpoint(xlsx)
+            logger.debug('Checkpoint saved at %s'%f)
+            last[0]=time.time()
+
+        if getovs and ovworkers>0:
+            #Generate overview images in their own worker processes/threads so they don't hold up the metadata
+            Overviews=OverviewQueue(ovworkers,writeoverviews,logger,threaded=threaded)
+        else:Overviews=None
+
         logger.info('Searching for files...')
         now=time.time()
-        Crawler=crawler.Crawler(dir,recurse=recurse,archive=archive,excludes=excludes)
-        logger.info('Found %s files...'%Crawler.filecount)
-
-        #Loop thru dataset objects returned by Crawler
-        for ds in Crawler:
-            try:
-                logger.debug('Attempting to open %s'%Crawler.file)
-                fi=ds.fileinfo
-                fi['filepath']=utilities.uncpath(fi['filepath'])
-                fi['filelist']='|'.join(utilities.uncpath(ds.filelist))
-                #qlk=utilities.uncpath(os.path.join(os.path.dirname(xlsx),'%s.%s.qlk.jpg'%(fi['filename'],fi['guid'])))
-                #thm=utilities.uncpath(os.path.join(os.path.dirname(xlsx),'%s.%s.thm.jpg'%(fi['filename'],fi['guid'])))
-                qlk=os.path.join(os.path.dirname(xlsx),'%s.%s.qlk.jpg'%(fi['filename'],fi['guid']))
-                thm=os.path.join(os.path.dirname(xlsx),'%s.%s.thm.jpg'%(fi['filename'],fi['guid']))
-
-                if update and ds.guid in records:
-                    row,rec=records[ds.guid]
-                    #Issue 35: if it's not modified, but we've asked for overview images and it doesn't already have them....
-                    if ismodified(rec,fi,os.path.dirname(xlsx)) or (not rec['quicklook'] and getovs):
-                        md=ds.metadata
-                        geom=ds.extent
-                        md.update(fi)
-                        logger.info('Updated metadata for %s, %s files remaining' % (Crawler.file,len(Crawler.files)))
-                        try:
-                            if rec['quicklook'] and os.path.exists(rec['quicklook']):getovs=False #Don't update overview
-                            if getovs:
-                                qlk=ds.getoverview(qlk, width=800)
-                                #We don't need to regenerate it, just resize it
-                                #thm=ds.getoverview(thm, width=150)
-                                thm=overviews.resize(qlk,thm,width=150)
-                                md['quicklook']=os.path.basename(qlk)
-                                md['thumbnail']=os.path.basename(thm)
-                                #md['quicklook']=utilities.uncpath(qlk)
-                                #md['thumbnail']=utilities.uncpath(thm)
-                                logger.info('Updated overviews for %s' % Crawler.file)
-                        except Exception,err:
-                            logger.error('%s\n%s' % (Crawler.file, utilities.ExceptionInfo()))
-                            logger.debug(utilities.ExceptionInfo(10))
-                        try:
-                            ExcelWriter.UpdateRecord(md,row)
-                        except Exception,err:
-                            logger.error('%s\n%s' % (Crawler.file, utilities.ExceptionInfo()))
-                            logger.debug(utilities.ExceptionInfo(10))
-                        try:
-                            ShapeWriter.UpdateRecord(geom,md,'guid="%s"'%rec['guid'])
-                        except Exception,err:
-                            logger.error('%s\n%s' % (Crawler.file, utilities.ExceptionInfo()))
-                            logger.debug(utilities.ExceptionInfo(10))
-                    else:
-                        logger.info('Metadata did not need updating for %s, %s files remaining' % (Crawler.file,len(Crawler.files)))
-                        continue
-                else:
-                    md=ds.metadata
-                    geom=ds.extent
-                    md.update(fi)
-                    if mediaid:md.update({'mediaid':mediaid})
-                    logger.info('Extracted metadata from %s, %s files remaining' % (Crawler.file,len(Crawler.files)))
+        Crawler=crawler.Crawler(dir,recurse=recurse,archive=archive,excludes=excludes,stream=stream,threads=threads,skip=skip)
+        if not stream:logger.info('Found %s files...'%Crawler.filecount)
+
+        try:
+            if workers>1:
+                #Open files and extract metadata in worker processes/threads, write the results here in crawl order
+                extractall(Crawler, xlsx, ExcelWriter, ShapeWriter, Manifest, records, logger, workers, getovs, mediaid, save, threaded, fields, Overviews)
+            else:
+                #Loop thru dataset objects returned by Crawler
+                for ds in Crawler:
+                    Manifest.opened()
                     try:
-                        if getovs:
-                            qlk=ds.getoverview(qlk, width=800)
-                            #We don't need to regenerate it, just resize it
-                            #thm=ds.getoverview(thm, width=150)
-                            thm=overviews.resize(qlk,thm,width=150)
-                            md['quicklook']=os.path.basename(qlk)
-                            md['thumbnail']=os.path.basename(thm)
-                            #md['quicklook']=utilities.uncpath(qlk)
-                            #md['thumbnail']=utilities.uncpath(thm)
-                            logger.info('Generated overviews from %s' % Crawler.file)
-                    except Exception as err:
-                        logger.error('%s\n%s' % (Crawler.file, utilities.ExceptionInfo()))
+                        logger.debug('Attempting to open %s'%Crawler.file)
+                        row,rec=records.get(ds.guid,(None,None))
+                        stats=manifest.filestats(ds.filelist)
+                        result=extract(ds,Crawler.file,xlsx,logger,rec,getovs,mediaid,Crawler.remaining(),fields,Overviews is not None)
+                        if result:
+                            row=write(result,ExcelWriter,ShapeWriter,records,logger)
+                            if row is not None:
+                                Manifest.add(ds.guid,row,result['metadata'],Crawler.file,stats)
+                                if result['overviews']:
+                                    Overviews.add(result['overviews'],result,row,stats,ExcelWriter,ShapeWriter,Manifest,records,logger)
+                        elif rec:
+                            Manifest.update(ds.guid,Crawler.file,stats)
+                    except NotImplementedError as err:
+                        logger.warn('%s: %s' % (Crawler.file, str(err)))
                         logger.debug(utilities.ExceptionInfo(10))
-                    try:
-                        ExcelWriter.WriteRecord(md)
                     except Exception as err:
                         logger.error('%s\n%s' % (Crawler.file, utilities.ExceptionInfo()))
                         logger.debug(utilities.ExceptionInfo(10))
-                    try:
-                        ShapeWriter.WriteRecord(geom,md)
-                    except Exception as err:
-                        logger.error('%s\n%s' % (Crawler.file, utilities.ExceptionInfo()))
-                        logger.debug(utilities.ExceptionInfo(10))
-
-            except NotImplementedError as err:
-                logger.warn('%s: %s' % (Crawler.file, str(err)))
-                logger.debug(utilities.ExceptionInfo(10))
-            except Exception as err:
-                logger.error('%s\n%s' % (Crawler.file, utilities.ExceptionInfo()))
-                logger.debug(utilities.ExceptionInfo(10))
+                    if Overviews is not None:Overviews.poll()
+                    save(Crawler.file)
+            if Overviews is not None:
+                logger.info('Waiting for overview images...')
+                Overviews.close()
+        finally:
+            if Overviews is not None:Overviews.terminate() #Only needed if the crawl was interrupted
         then=time.time()
         logger.debug(then-now)
         #Check for files that couldn't be opened
         for file,err,dbg in Crawler.errors:
            logger.error('%s\n%s' % (file, err))
            logger.debug(dbg)
+           Manifest.error(file,err,dbg)
 
         if Crawler.filecount == 0:
             logger.info("No data found")
@@ -235,6 +281,472 @@ def execute(dir, xlsx, logger, mediaid=None, update=False, getovs=False, recurse
         #del ExcelWriter
         del ShapeWriter
 
+    #The spreadsheet has been saved, so the manifest is up to date
+    Manifest.checkpoint(xlsx)
+    Manifest.close()
+
+def extract(ds, f, xlsx, logger, record=None, getovs=False, mediaid=None, remaining='', fields=None, defer=False):
+    """ Extract metadata from a dataset and generate its overview images
+
+        @type  ds:       C{formats.Dataset}
+        @param ds:       The dataset
+        @type  f:        C{str}
+        @param f:        The file the dataset was opened from
+        @type  xlsx:     C{str}
+        @param xlsx:     Excel spreadsheet the metadata will be written to
+        @type  logger:   C{progresslogger.ProgressLogger}
+        @param logger:   Logger
+        @type  record:   C{dict}
+        @param record:   The dataset's record from a previous crawl, if updating
+        @type  getovs:   C{boolean}
+        @param getovs:   Generate overview (quicklook/thumbnail) images
+        @type  mediaid:  C{str}
+        @param mediaid:  CD/DVD media ID
+        @type  remaining:C{str}
+        @param remaining:Number of files remaining, for logging
+        @type  fields:   C{list}
+        @param fields:   Only extract these metadata fields, defaults to all fields
+        @type  defer:    C{boolean}
+        @param defer:    Don't generate the overview images, return an L{OverviewQueue} job for them instead
+        @return:  C{dict} containing the file, guid, metadata, extent and overview job (or None), or None if the
+                  record from the previous crawl didn't need updating
+    """
+    fi=ds.fileinfo
+    fi['filepath']=utilities.uncpath(fi['filepath'])
+    fi['filelist']='|'.join(utilities.uncpath(ds.filelist))
+    #qlk=utilities.uncpath(os.path.join(os.path.dirname(xlsx),'%s.%s.qlk.jpg'%(fi['filename'],fi['guid'])))
+    #thm=utilities.uncpath(os.path.join(os.path.dirname(xlsx),'%s.%s.thm.jpg'%(fi['filename'],fi['guid'])))
+    qlk=os.path.join(os.path.dirname(xlsx),'%s.%s.qlk.jpg'%(fi['filename'],fi['guid']))
+    thm=os.path.join(os.path.dirname(xlsx),'%s.%s.thm.jpg'%(fi['filename'],fi['guid']))
+
+    if record is not None:
+        #Issue 35: if it's not modified, but we've asked for overview images and it doesn't already have them....
+        if not ismodified(record,fi,os.path.dirname(xlsx)) and (record['quicklook'] or not getovs):
+            logger.info('Metadata did not need updating for %s, %s files remaining' % (f,remaining))
+            return None
+        if record['quicklook'] and os.path.exists(record['quicklook']):getovs=False #Don't update overview
+
+    md=ds.metadata
+    geom=ds.extent
+    md.update(fi)
+    if record is None:
+        if mediaid:md.update({'mediaid':mediaid})
+        logger.info('Extracted metadata from %s, %s files remaining' % (f,remaining))
+    else:
+        logger.info('Updated metadata for %s, %s files remaining' % (f,remaining))
+    overviews=None
+    try:
+        if getovs and defer:overviews=(f,qlk,thm,ds.getoverviewsource())
+        elif getovs:
+            #Render the quicklook once and resize it in memory for the thumbnail
+            qlk,thm=ds.getoverview([qlk,thm], width=[800,150])
+            md['quicklook']=os.path.basename(qlk)
+            md['thumbnail']=os.path.basename(thm)
+            #md['quicklook']=utilities.uncpath(qlk)
+            #md['thumbnail']=utilities.uncpath(thm)
+            if record is None:logger.info('Generated overviews from %s' % f)
+            else:logger.info('Updated overviews for %s' % f)
+    except Exception as err:
+        logger.error('%s\n%s' % (f, utilities.ExceptionInfo()))
+        logger.debug(utilities.ExceptionInfo(10))
+
+    if fields is not None:fields=list(fields)+['mediaid','quicklook','thumbnail']
+    return {'file':f, 'guid':ds.guid, 'metadata':ds.getmetadata(fields), 'extent':geom, 'overviews':overviews}
+
+def write(result, ExcelWriter, ShapeWriter, records, logger):
+    """ Write (or update) a record returned by L{extract}
+
+        @type  result:      C{dict}
+        @param result:      The result from L{extract}
+        @type  ExcelWriter: C{utilities.ExcelWriter}
+        @param ExcelWriter: Spreadsheet writer
+        @type  ShapeWriter: C{geometry.ShapeWriter}
+        @param ShapeWriter: Shapefile writer
+        @type  records:     C{dict}
+        @param records:     (row, record) tuples from a previous crawl keyed by guid
+        @type  logger:      C{progresslogger.ProgressLogger}
+        @param logger:      Logger
+        @return:  C{int} spreadsheet row of the record, or None if it couldn't be written
+    """
+    f,md,geom=result['file'],result['metadata'],result['extent']
+    row=None
+    if result['guid'] in records:
+        row,rec=records[result['guid']]
+        try:
+            ExcelWriter.UpdateRecord(md,row)
+        except Exception,err:
+            logger.error('%s\n%s' % (f, utilities.ExceptionInfo()))
+            logger.debug(utilities.ExceptionInfo(10))
+        try:
+            ShapeWriter.UpdateRecord(geom,md,'guid="%s"'%rec['guid'])
+        except Exception,err:
+            logger.error('%s\n%s' % (f, utilities.ExceptionInfo()))
+            logger.debug(utilities.ExceptionInfo(10))
+    else:
+        try:
+            row=ExcelWriter.WriteRecord(md)
+        except Exception as err:
+            logger.error('%s\n%s' % (f, utilities.ExceptionInfo()))
+            logger.debug(utilities.ExceptionInfo(10))
+        try:
+            ShapeWriter.WriteRecord(geom,md)
+        except Exception as err:
+            logger.error('%s\n%s' % (f, utilities.ExceptionInfo()))
+            logger.debug(utilities.ExceptionInfo(10))
+    return row
+
+def writeoverviews(job, images, err, result, row, stats, ExcelWriter, ShapeWriter, Manifest, records, logger):
+    """ Fill in the quicklook and thumbnail of a record written by L{write} once its overview images have been generated,
+        this is the L{OverviewQueue} callback.
+
+        @type  job:         C{tuple}
+        @param job:         The overview job from L{extract}
+        @type  images:      C{dict}
+        @param images:      The result from L{_overviews}
+        @type  err:         C{tuple}
+        @param err:         None or the error if the worker process crashed
+        @type  result:      C{dict}
+        @param result:      The result from L{extract}
+        @type  row:         C{int}
+        @param row:         Spreadsheet row of the record
+        @type  stats:       C{list}
+        @param stats:       Result of L{manifest.filestats} for the dataset's filelist
+        @type  Manifest:    C{manifest.Manifest}
+        @param Manifest:    Crawl manifest
+        @note: See L{write} for the other arguments
+    """
+    if err is not None:
+        logger.error('%s\n%s' % (job[0], err[0]))
+        logger.debug(err[1])
+        return
+    for level,msg in images['messages']:
+        getattr(logger,level)(msg)
+    if not images['quicklook']:return
+    f,md,geom=result['file'],result['metadata'],result['extent']
+    md['quicklook']=images['quicklook']
+    md['thumbnail']=images['thumbnail']
+    if result['guid'] in records:guid=records[result['guid']][1]['guid']
+    else:guid=md['guid']
+    try:
+        ExcelWriter.UpdateRecord(md,row)
+    except Exception,err:
+        logger.error('%s\n%s' % (f, utilities.ExceptionInfo()))
+        logger.debug(utilities.ExceptionInfo(10))
+    try:
+        ShapeWriter.UpdateRecord(geom,md,'guid="%s"'%guid)
+    except Exception,err:
+        logger.error('%s\n%s' % (f, utilities.ExceptionInfo()))
+        logger.debug(utilities.ExceptionInfo(10))
+    Manifest.add(result['guid'],row,md,f,stats)
+
+def extractall(Crawler, xlsx, ExcelWriter, ShapeWriter, Manifest, records, logger, workers, getovs=False, mediaid=None, checkpoint=None, threaded=False, fields=None, Overviews=None):
+    """ Open the files returned by a Crawler and extract their metadata in worker processes (or threads).
+
+        Results are written by this process in the same order as a serial crawl.
+        A file that was sent to a worker before an earlier dataset claimed it
+        (i.e. it's in that dataset's filelist) has its result discarded, as it
+        wouldn't have been opened by a serial crawl.
+
+        @type  Crawler:     C{crawler.Crawler}
+        @param Crawler:     The crawler
+        @type  Manifest:    C{manifest.Manifest}
+        @param Manifest:    Crawl manifest
+        @type  workers:     C{int}
+        @param workers:     Number of worker processes
+        @type  checkpoint:  C{function}
+        @param checkpoint:  Function called with the file path after each result is written
+        @type  threaded:    C{boolean}
+        @param threaded:    Use worker threads instead of processes
+        @type  fields:      C{list}
+        @param fields:      Only extract these metadata fields, defaults to all fields
+        @type  Overviews:   C{OverviewQueue}
+        @param Overviews:   Queue the overview images are generated by, if None they're generated by the metadata workers
+        @note: See L{execute} and L{write} for the other arguments
+    """
+    inflight=set()
+    claimed=set()
+    def tasks():
+        while True:
+            f,filestat=Crawler.nextfile()
+            inflight.add(f)
+            yield f,filestat,xlsx,getovs,mediaid,Crawler.remaining(),fields,Overviews is not None
+
+    #The workers only need enough of the previous records to check if they need updating
+    recordfields=('guid','datemodified','filelist','quicklook','metadatadate')
+    previous=dict([(guid,dict([(k,rec[k]) for k in recordfields])) for guid,(row,rec) in records.items()])
+
+    if threaded:Pool=utilities.ThreadPool
+    else:Pool=utilities.WorkerPool
+    with Pool(workers,_initworker,(previous,geometry.debug,not threaded)) as pool:
+        for args,result,err in pool.imap(_extract,tasks()):
+            f=args[0]
+            inflight.discard(f)
+            if f in claimed:
+                #Already in an earlier dataset's filelist
+                claimed.remove(f)
+                continue
+            if err is None:
+                if result['filelist'] is not None:
+                    Crawler.claim(result['filelist'])
+                    for c in inflight.intersection(result['filelist']):
+                        claimed.add(c)
+                        Crawler.filecount-=1
+                for level,msg in result['messages']:
+                    getattr(logger,level)(msg)
+                err=result.get('error')
+            if err is not None:
+                #Couldn't open it (or the worker process crashed)
+                Crawler.filecount-=1
+                Crawler.errors.append((f,err[0],err[1]))
+            elif result['record']:
+                row=write(result['record'],ExcelWriter,ShapeWriter,records,logger)
+                if row is not None:
+                    Manifest.add(result['guid'],row,result['record']['metadata'],f,result['stats'])
+                    if result['record']['overviews']:
+                        Overviews.add(result['record']['overviews'],result['record'],row,result['stats'],
+                                      ExcelWriter,ShapeWriter,Manifest,records,logger)
+            elif result['stats'] and result['guid'] in records:
+                Manifest.update(result['guid'],f,result['stats'])
+            if Overviews is not None:Overviews.poll()
+            if checkpoint is not None:checkpoint(f)
+
+class OverviewQueue(object):
+    ''' Generate overview images in a separate pool of worker processes (or threads).
+
+        Rendering overview images takes seconds, extracting metadata usually takes milliseconds,
+        so records are written as soon as their metadata is extracted and their overview jobs
+        are put on a bounded queue. L{add} blocks while the queue is full, so the crawl can't
+        get too far ahead of the overview workers.
+
+        Finished jobs are passed to the callback by L{add}, L{poll} and L{close}, i.e. in the
+        thread that's writing the records, so the callback can update the spreadsheet.
+
+        Example:
+            >>> def done(job,result,error,context):print job[0],result
+            >>> Overviews=OverviewQueue(2,done,logger)
+            >>> Overviews.add((f,qlk,thm,None),context)
+            >>> Overviews.poll()
+            >>> Overviews.close()
+    '''
+    def __init__(self,workers,callback,logger,queuesize=None,threaded=False,interval=30):
+        ''' A pool of overview workers fed from a bounded queue.
+
+            @type    workers:   C{int}
+            @param   workers:   Number of worker processes
+            @type    callback:  C{function}
+            @param   callback:  Function called with the job, the result of L{_overviews}, the error
+                                (see L{utilities.WorkerPool.imap}) and the context args passed to L{add}
+            @type    logger:    C{progresslogger.ProgressLogger}
+            @param   logger:    Logger for the status line
+            @type    queuesize: C{int}
+            @param   queuesize: Maximum number of jobs waiting for a worker, defaults to 4 x workers
+            @type    threaded:  C{boolean}
+            @param   threaded:  Use worker threads instead of processes
+            @type    interval:  C{int}
+            @param   interval:  Seconds between status lines
+        '''
+        if threaded:Pool=utilities.ThreadPool
+        else:Pool=utilities.WorkerPool
+        self.workers=workers
+        self.callback=callback
+        self.logger=logger
+        self.interval=interval
+        self.queued=0
+        self.done=0
+        self._jobs=Queue.Queue(queuesize or workers*4)
+        self._results=Queue.Queue()
+        self._context=collections.deque() #Results are returned in the order the jobs were added
+        self._status=time.time()
+        self._pool=Pool(workers,_initoverviews,(geometry.debug,not threaded)) #Start the workers in this thread
+        self._thread=threading.Thread(target=self._run)
+        self._thread.daemon=True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for args,result,err in self._pool.imap(_overviews,iter(self._jobs.get,None),self.workers):
+                self._results.put((args,result,err))
+        finally:
+            self._results.put(None)
+
+    def add(self,job,*context):
+        ''' Queue an overview job, waiting (and passing finished jobs to the callback) while the queue is full
+
+            @type    job:     C{tuple}
+            @param   job:     (file, quicklook, thumbnail) from L{extract}
+            @param   context: Other args for the callback
+        '''
+        self._context.append(context)
+        self.queued+=1
+        self._put(job)
+        self.poll()
+
+    def _put(self,job):
+        while True:
+            try:return self._jobs.put(job,True,1)
+            except Queue.Full:self.poll()
+            if not self._thread.is_alive():raise RuntimeError('The overview workers have stopped')
+
+    def poll(self,timeout=0):
+        ''' Pass finished jobs to the callback
+
+            @type    timeout: C{float}
+            @param   timeout: Seconds to wait for a job to finish
+        '''
+        while True:
+            try:item=self._results.get(timeout>0,timeout)
+            except Queue.Empty:break
+            if item is None:break #No more jobs
+            args,result,err=item
+            self.done+=1
+            self.callback(args,result,err,*self._context.popleft())
+        self.status()
+
+    def status(self,force=False):
+        ''' Log a status line with the queue depth, at most every C{interval} seconds'''
+        if not force and time.time()-self._status<self.interval:return
+        self._status=time.time()
+        waiting=self._jobs.qsize()
+        self.logger.info('Overview images: %s queued, %s rendering, %s of %s done'%(
+                          waiting,max(self.queued-self.done-waiting,0),self.done,self.queued))
+
+    def close(self):
+        ''' Wait for the queued jobs to finish and stop the workers'''
+        if self._pool is None:return
+        self._put(None)
+        while self._thread.is_alive():self.poll(1)
+        self.poll()
+        self._pool.close()
+        self._pool=None
+        self.status(True)
+
+    def terminate(self):
+        ''' Stop the workers without waiting for the queued jobs'''
+        if self._pool is None:return
+        self._pool.close()
+        self._pool=None
+        self._context.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if exc_type is None:self.close()
+        else:self.terminate()
+
+class _Messages(list):
+    ''' Collect log messages in a worker process/thread so they can be logged by the main thread in crawl order'''
+    def debug(self,msg):self.append(('debug',msg))
+    def info(self,msg):self.append(('info',msg))
+    def warn(self,msg):self.append(('warn',msg))
+    def error(self,msg):self.append(('error',msg))
+
+_records={}
+_caught=threading.local() #Warnings issued while a worker thread is extracting metadata, see _showwarning
+_lock=threading.Lock()
+def _initworker(records, debug, process=True):
+    ''' Initialise a worker process or thread'''
+    global _records
+    _records=records
+    _initoverviews(debug, process)
+
+def _initoverviews(debug, process=True):
+    ''' Initialise an overview worker process or thread, see L{OverviewQueue}'''
+    geometry.debug=debug
+    if not debug:geometry.gdal.PushErrorHandler( 'CPLQuietErrorHandler' ) #The error handler stack is per thread
+    #The warning filters are process wide, so only change them in a worker process
+    #of our own. Worker threads share the crawler's, which its logger has set up.
+    if process:warnings.simplefilter('always')
+    with _lock:
+        if warnings.showwarning is not _showwarning:
+            _showwarning.default=warnings.showwarning
+            warnings.showwarning=_showwarning
+
+def _showwarning(message, category, filename, lineno, file=None, line=None):
+    ''' Record warnings issued by L{_extract} and L{_overviews} in the thread it's running in.
+        warnings.catch_warnings can't be used as it replaces warnings.showwarning for every thread.'''
+    caught=getattr(_caught,'warnings',None)
+    if caught is not None:caught.append(message)
+    else:_showwarning.default(message, category, filename, lineno, file, line)
+_showwarning.default=warnings.showwarning
+
+def _extract(f, filestat, xlsx, getovs, mediaid, remaining, fields, defer):
+    ''' Open a file and extract metadata from it in a worker process or thread'''
+    messages=_Messages()
+    result={'file':f, 'filelist':None, 'record':None, 'messages':messages}
+    utilities.setstat(f,filestat)
+    _caught.warnings=caught=[]
+    try:
+        messages.debug('Attempting to open %s'%f)
+        try:ds=formats.Open(f)
+        except Exception as err:
+            result['error']=(utilities.ExceptionInfo(),utilities.ExceptionInfo(10))
+            return result
+        result['filelist']=ds.filelist
+        result['guid']=ds.guid
+        result['stats']=manifest.filestats(ds.filelist)
+        try:
+            result['record']=extract(ds,f,xlsx,messages,_records.get(ds.guid),getovs,mediaid,remaining,fields,defer)
+        except NotImplementedError as err:
+            result['stats']=None
+            messages.warn('%s: %s' % (f, str(err)))
+            messages.debug(utilities.ExceptionInfo(10))
+        except Exception as err:
+            result['stats']=None
+            messages.error('%s\n%s' % (f, utilities.ExceptionInfo()))
+            messages.debug(utilities.ExceptionInfo(10))
+        return result
+    finally:
+        _caught.warnings=None
+        utilities.setstat(f,None)
+        for w in caught:messages.warn(str(w))
+
+def _overviews(f, qlk, thm, source=None):
+    ''' Generate a file's overview images in an L{OverviewQueue} worker process or thread.
+        If the job has a source (see L{__dataset__.Dataset.getoverviewsource}) only its gdal.Dataset
+        is opened, otherwise the file is opened by its format driver and its metadata extracted again.'''
+    messages=_Messages()
+    result={'quicklook':None, 'thumbnail':None, 'messages':messages}
+    _caught.warnings=caught=[]
+    try:
+        ds=None
+        if source is not None:
+            name,stretch=source
+            try:ds=geometry.OpenDataset(name)
+            except geometry.GDALError:pass #e.g. a temporary VRT that has been deleted
+        #Render the quicklook once and resize it in memory for the thumbnail
+        if ds is not None:qlk,thm=__dataset__.getoverview(ds,[qlk,thm],[800,150],stretch=stretch)
+        else:qlk,thm=formats.Open(f).getoverview([qlk,thm], width=[800,150])
+        result['quicklook']=os.path.basename(qlk)
+        result['thumbnail']=os.path.basename(thm)
+        messages.info('Generated overviews from %s' % f)
+    except Exception as err:
+        messages.error('%s\n%s' % (f, utilities.ExceptionInfo()))
+        messages.debug(utilities.ExceptionInfo(10))
+    finally:
+        _caught.warnings=None
+        for w in caught:messages.warn(str(w))
+    return result
+
+def overviewsmissing(record,xlsxpath,getovs):
+    ''' Check if a record from a previous metadata crawl needs its overview images (re)generated.
+
+        @type  record:   C{dict}
+        @param record:   The record from a previous crawl.
+        @type  xlsxpath: C{str}
+        @param xlsxpath:  The path to the xlsx that holds the record from the previous crawl
+        @type  getovs:   C{boolean}
+        @param getovs:   Generate overview (quicklook/thumbnail) images
+        @return:  C{boolean}
+    '''
+    if record['quicklook']:
+        if os.path.basename(record['quicklook'])==record['quicklook']:
+            qlk=os.path.join(xlsxpath,record['quicklook'])
+        else:qlk=record['quicklook']
+        return not os.path.exists(qlk)
+    else:
+        return getovs
+
 def ismodified(record,fileinfo,xlsxpath):
     ''' Check if a record from a previous metadata crawl needs to be updated.
 
@@ -375,6 +887,30 @@ def main():
     opt=parser.add_option("--debug", action="store_true", dest="debug",default=False,
                       help="Turn debug output on")
 
+    opt=parser.add_option("--stream", action="store_true", dest="stream",default=False,
+                      help="Extract metadata while still searching for files")
+
+    opt=parser.add_option("--threads", type="int", dest="threads",default=1, metavar="threads",
+                      help="Number of threads used to search directories, useful on network file systems")
+
+    opt=parser.add_option("--workers", type="int", dest="workers",default=1, metavar="workers",
+                      help="Number of processes used to open files and extract metadata")
+
+    opt=parser.add_option("--threaded", action="store_true", dest="threaded",default=False,
+                      help="Use threads instead of processes for --workers and --ovworkers, uses less memory and suits network file systems")
+
+    opt=parser.add_option("--ovworkers", type="int", dest="ovworkers",default=0, metavar="ovworkers",
+                      help="Number of processes used to generate overview images while metadata is extracted, "
+                           "by default (0) they're generated while extracting the metadata of each file")
+
+    opt=parser.add_option("--resume", action="store_true", dest="resume",default=False,
+                      help="Resume an interrupted crawl from its last checkpoint. The directory is searched again, "
+                           "datasets saved at the checkpoint are skipped without opening them")
+
+    opt=parser.add_option("--fields", dest="fields", metavar="fields",default='',
+                      help="Comma separated metadata fields to extract, e.g. srs,epsg,cols,rows for a quick footprint crawl. "
+                           "Defaults to all fields. File info fields (filepath, guid, etc...) are always extracted")
+
     opt=parser.add_option("--keep-alive", action="store_true", dest="keepalive", default=False, help="Keep this dialog box open")
     kaarg=getargs.BoolArg(opt)
     kaarg.tooltip='Do you want to keep this dialog box open after running the metadata crawl so you can run another?'
@@ -386,6 +922,7 @@ def main():
 
     #Parse existing command line args
     optvals,argvals = parser.parse_args()
+    fields=optvals.fields.replace(',',' ').split() or None
     if optvals.dir and optvals.dir[-1]=='"': #Fix C:" issue when called from Explorer context menu
             optvals.dir=optvals.dir[:-1]+'\\'
 
@@ -418,7 +955,7 @@ def main():
                     logger=getlogger(log,name=APP,debug=optvals.debug)
                 keepalive=args.keepalive
                 forceexit=True
-                execute(args.dir,args.xlsx,logger,args.med,args.update,args.ovs,args.recurse,args.archive, args.excludes)
+                execute(args.dir,args.xlsx,logger,args.med,args.update,args.ovs,args.recurse,args.archive, args.excludes, optvals.stream, optvals.threads, optvals.workers, optvals.resume, threaded=optvals.threaded, fields=fields, ovworkers=optvals.ovworkers)
                 forceexit=False
                 hasrun=True
             else:
@@ -429,7 +966,7 @@ def main():
         log=xlsx.replace('.xlsx','.log')
         logger=getlogger(log, name=APP, debug=optvals.debug)
         execute(optvals.dir,xlsx,logger,optvals.med,optvals.update,optvals.ovs,
-                optvals.recurse,optvals.archive,optvals.excludes)
+                optvals.recurse,optvals.archive,optvals.excludes,optvals.stream,optvals.threads,optvals.workers,optvals.resume,threaded=optvals.threaded,fields=fields,ovworkers=optvals.ovworkers)
 
     if logger:
         logger.debug('Shutting down')
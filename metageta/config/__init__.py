@@ -27,7 +27,7 @@ Config file handling
 """
 
 import os, errno
-from appdirs import user_config_dir
+from appdirs import user_config_dir, user_cache_dir
 
 def _mkdirs(path):
     try:
@@ -50,6 +50,18 @@ def get_config_dir():
     return user_conf_dir
 
 
+def get_cache_dir():
+    """
+        Get the user application cache directory, creating it if required.
+
+        @rtype:   C{str}
+        @return:  directory path
+    """
+    user_cache = user_cache_dir('MetaGETA')
+    _mkdirs(user_cache)
+    return user_cache
+
+
 def get_config_file():
     """
         Get the user application config file, creating it if required.
@@ -28,21 +28,26 @@ Example:
     >>> #Loop thru dataset objects returned by Crawler
     >>> for dataset in Crawler:
     >>>     metadata=dataset.metadata
+    >>> #Or start returning datasets before the search has finished
+    >>> for dataset in crawler.Crawler('Some directory to crawl', stream=True):
+    >>>     metadata=dataset.metadata
 
 @todo:
     - Make this faster!!! It's verrry slow on large filesystems...
     - Explore removing regular expression and searching using fnmatch instead
-    - Can this be rewritten to yield files as they're found instead of building a complete list of files first? Probably.
-      However, the multiple loops are there to ensure certain types of files are dealt with first, but perhaps that logic
-      needs to be handled by the formats library
 '''
 
 from metageta import utilities,formats
-import re,os
+import re,os,itertools
+from collections import deque
+
+def _inside(path, directory):
+    ''' Is a path the directory or somewhere below it?'''
+    return path==directory or path.startswith(directory.rstrip(os.sep)+os.sep)
 
 class Crawler:
     ''' Iterator for metadata crawling'''
-    def __init__(self,dir, recurse=True, archive=False, excludes=[]):
+    def __init__(self,dir, recurse=True, archive=False, excludes=[], stream=False, threads=1, skip=None):
         ''' Iterator for metadata crawling
 
             @type  dir: C{str}
@@ -53,36 +58,46 @@ class Crawler:
             @param   archive: Look in zip/gzip archives
             @type    excludes: C{list}
             @param   excludes: List of glob style file/directory exclusion pattern/s
+            @type    stream: C{bool}
+            @param   stream: Return datasets while the directory search is still running.
+                             Files are prioritised per directory instead of across the whole tree,
+                             so format specific datasets are still returned before default format
+                             datasets found in the same directory.
+            @type    threads: C{int}
+            @param   threads: Number of threads used to list directories. Values > 1 can speed up
+                              searching network file systems. Files are still returned in the same order.
+            @type    skip: C{function}
+            @param   skip: Function called with each file path, its stat result (or None) and a dict of
+                           the stat results of the files still queued, before the file is opened.
+                           Return the filelist of a dataset to skip it without opening it, or None.
         '''
 
         #Class vars
         self.errors=[] #A list of files that couldn't be opened. Contains a tuple with file name, error info, debug info
+        self.stream=stream
+        self.skip=skip
+        self.searching=stream #Is the directory search still running?
+        self.file=''
 
-        format_regex  = formats.format_regex
         dir=utilities.uncpath(utilities.realpath(utilities.normcase(utilities.encode(dir))))
-        #Build a dict of matching files and regexes then sort according to the priority of the regex formats
-        fileformats={}
-        for f in utilities.rglob(dir,'|'.join(format_regex), True, re.IGNORECASE,
-                                 recurse=recurse, archive=archive, excludes=excludes,
-                                 onerror=self.onerror, followlinks=False):
-            #Don't return existing overviews
-            if f[-7:] in ('qlk.jpg','thm.jpg'):continue
-            #Use utf-8 encoding to fix Issue 20
-            if f[:4]=='/vsi':f=utilities.encode(f)
-            else:f=utilities.realpath(utilities.normcase(utilities.encode(f)))
-            for r in format_regex: #This is so we always return _default_ format datasets last.
-                if re.search(r,os.path.basename(f),re.IGNORECASE):
-                    if fileformats.has_key(r):fileformats[r].append(f)
-                    else:fileformats[r]=[f]
-                    break
-        files=[]
-        for r in format_regex:
-            if fileformats.has_key(r):files.extend(fileformats[r])
+        found=self.__search__(dir, recurse, archive, excludes, threads)
+        self._root=dir
+        self._recurse=recurse
+        self._searchdir=dir #The directory the search is up to (streaming mode only)
 
-        #Class vars
-        self.files=files
-        self.file=''
-        self.filecount=len(self.files)
+        #Work queue. self.files keeps the processing order, self._queued holds the files that
+        #are still to be processed so they can be claimed by another dataset without a linear search
+        self.files=deque()
+        self._queued=set()
+        self._stats={}    #stat results from the directory search for the files in the queue
+        self._claimed=set() #Files already claimed by a dataset that the search hasn't got to yet (streaming mode only)
+        if stream:
+            self._pending=((d,self.__prioritise__([f for r,f in files])) for d,files in
+                           itertools.groupby(found,lambda found:found[0]))
+            self.filecount=0
+        else:
+            self.__queue__(self.__prioritise__(f for d,f in found))
+            self.filecount=len(self._queued)
 
     def __iter__(self):
         return self
@@ -91,33 +106,75 @@ class Crawler:
         ''' @rtype:  C{Dataset}
             @return: Return the next Dataset or raise StopIteration
         '''
-        #Have we finished?
-        if len(self.files) == 0:
-            raise StopIteration
-
-        #Get the first file
-        self.file=self.files.pop(0)
-        try:
-            #Open it
-            ds=formats.Open(self.file)
-
-            #Remove any files in our filelist that occur in the dataset's filelist and decrement the filecount
-            for f in ds.filelist:
-                if f in self.files:
-                    self.files.remove(f)
-                    self.filecount-=1
-            #Fin!
-            return ds
-        except Exception as e:
-            #decrement the filecount and append to the errors list
-            self.filecount-=1
-            e.filename = self.file
-            self.onerror(e)
-            #Skip to the next file so we don't stop the iteration
-            #Exceptions here will keep recursing until we find a
-            #file we can open or run out of files.
-            return self.next()
+        while True:
+            f,filestat=self.nextfile()
+            utilities.setstat(f,filestat)
+            try:
+                #Open it
+                ds=formats.Open(f)
+
+                #Remove any files in our filelist that occur in the dataset's filelist
+                self.claim(ds.filelist)
+                #Fin!
+                return ds
+            except Exception as e:
+                #decrement the filecount and append to the errors list
+                self.filecount-=1
+                e.filename = f
+                self.onerror(e)
+                #Skip to the next file so we don't stop the iteration
+            finally:
+                utilities.setstat(f,None)
+
+    def nextfile(self):
+        ''' Get the next file to open, without opening it.
+
+            Use this instead of iterating over the Crawler if the files are to be opened elsewhere
+            (e.g. in another process). Call L{claim} with the dataset's filelist after it's opened.
+
+            @rtype:  C{tuple}
+            @return: (filepath, stat result or None) or raise StopIteration
+        '''
+        while True:
+            #Get the first file that hasn't been claimed by another dataset
+            while self.files and self.files[0] not in self._queued:
+                self.files.popleft()
+
+            #Have we finished?
+            if not self.files and not self.__nextdir__():
+                raise StopIteration
+
+            self.file=self.files.popleft()
+            self._queued.discard(self.file)
+            filestat=self._stats.pop(self.file,None)
+            if self.skip is not None:
+                filelist=self.skip(self.file,filestat,self._stats)
+                if filelist is not None:
+                    self.claim(filelist)
+                    continue
+            return self.file,filestat
+
+    def claim(self, filelist):
+        ''' Remove the files in a dataset's filelist from the work queue and decrement the filecount
+
+            @type  filelist: C{list}
+            @param filelist: The dataset's filelist
+        '''
+        for f in filelist:
+            if f in self._queued:
+                self._queued.remove(f) #Left in self.files, it's skipped when it gets to the front
+                self._stats.pop(f,None)
+                self.filecount-=1
+            elif self.searching and not self.__searched__(f) and self.__priority__(f) is not None:
+                #Not found yet, skip it when the search gets there
+                self._claimed.add(f)
 
+    def remaining(self):
+        ''' @rtype:  C{str}
+            @return: Number of files remaining, suffixed with "+" if the search is still running
+        '''
+        if self.searching:return '%s+'%len(self._queued)
+        else:return str(len(self._queued))
 
     def onerror(self, e):
         self.errors.append((e.filename,
@@ -125,3 +182,90 @@ class Crawler:
                            utilities.ExceptionInfo(10))
                           )
 
+    def __search__(self, dir, recurse, archive, excludes, threads):
+        ''' Generate the directories and normalised paths of files matching any of the format
+            regexes and keep their stat results for L{utilities.FileInfo}'''
+        for root,f,entry in utilities.rscandir(dir,'|'.join(formats.format_regex), True, re.IGNORECASE,
+                                 recurse=recurse, archive=archive, excludes=excludes,
+                                 onerror=self.onerror, followlinks=False, threads=threads, roots=True):
+            #Don't return existing overviews
+            if f[-7:] in ('qlk.jpg','thm.jpg'):continue
+            #Use utf-8 encoding to fix Issue 20
+            if entry is None:f=utilities.encode(f) #/vsi archive member
+            else:
+                #dir is already a real path and we don't follow directory links,
+                #so only file links need resolving
+                f=utilities.normcase(utilities.encode(f))
+                if entry.is_symlink():f=utilities.realpath(f)
+                try:self._stats[f]=entry.stat()
+                except OSError:pass #Broken link, let the driver report it
+            yield utilities.normcase(utilities.encode(root)),f
+
+    def __searched__(self, f):
+        ''' Has the search already been through the directory a file is in (or will it never get there)?
+
+            The search lists directories depth first, in the order L{utilities.walk} returns them,
+            so that's the current directory, its parents and anything listed before them.
+        '''
+        if f.startswith('/vsi'):return True #Archive members are found along with the rest of their archive
+        d=os.path.dirname(f)
+        if _inside(self._searchdir,d):return True
+        if not self._recurse or not _inside(d,self._root):return True #Never will
+        if _inside(d,self._searchdir):return False
+
+        #Compare the branches of the two directories below the parent they have in common
+        dirs,current=d.split(os.sep),self._searchdir.split(os.sep)
+        i=0
+        while dirs[i]==current[i]:i+=1
+        try:names=[os.path.normcase(entry.name) for entry in utilities.listdir(os.sep.join(dirs[:i])+os.sep)]
+        except OSError:return False
+        try:return names.index(dirs[i])<names.index(current[i])
+        except ValueError:return True #Doesn't exist
+
+    def __priority__(self, f):
+        ''' Index of the first format regex that matches a file, or None if none match'''
+        return formats.priority(f)
+
+    def __prioritise__(self, files):
+        ''' Sort files according to the priority of the regex formats.
+            This is so we always return _default_ format datasets last.'''
+        fileformats={}
+        for f in files:
+            i=self.__priority__(f)
+            if i is None:
+                self._stats.pop(f,None)
+                continue
+            if fileformats.has_key(i):fileformats[i].append(f)
+            else:fileformats[i]=[f]
+        files=[]
+        for i in sorted(fileformats):
+            files.extend(fileformats[i])
+        return files
+
+    def __queue__(self, files):
+        ''' Append files to the work queue, ignoring duplicates'''
+        for f in files:
+            if f not in self._queued:
+                self._queued.add(f)
+                self.files.append(f)
+
+    def __nextdir__(self):
+        ''' Queue the files from the next directory that has any unclaimed files (streaming mode only).
+
+            @rtype:  C{bool}
+            @return: True if more files were queued
+        '''
+        while self.searching:
+            try:self._searchdir,files=self._pending.next()
+            except StopIteration:
+                self.searching=False
+                self._claimed.clear()
+                break
+            self.__queue__([f for f in files if f not in self._claimed])
+            for f in self._claimed.intersection(files):self._stats.pop(f,None)
+            if self._claimed:
+                #Forget the files the search has now got past, they won't be found again
+                self._claimed=set(f for f in self._claimed if not self.__searched__(f))
+            self.filecount+=len(self._queued)
+            if self._queued:return True
+        return False
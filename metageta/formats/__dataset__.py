@@ -29,7 +29,7 @@ Defines the metadata fields and populates some basic info
 
 import os,time,sys,glob,time,math, uuid
 import UserDict
-from metageta import utilities, geometry, overviews
+from metageta import utilities, geometry, overviews, spatialreferences
 
 
 #Import fieldnames
@@ -78,6 +78,26 @@ class Dataset(object):
     # ==================== #
     # Public Class Methods
     # ==================== #
+    def getmetadata(self,fields=None):
+        '''
+        Get a copy of some (or all) of the metadata, e.g. for a quick inventory crawl.
+
+        Costly fields are deferred by the format drivers (see L{idict.defer}), so fields
+        that aren't selected are never computed. File info fields (filepath, guid, etc...)
+        are always included.
+
+        @type  fields: C{list}
+        @param fields: metadata field names or None for all fields
+        @rtype:        C{dict}
+        @return:       all the metadata fields, those that weren't selected are empty
+        '''
+        md=self.metadata
+        if fields is None:return dict(md)
+        fields=set(fields)
+        for field in fields:
+            if field not in md:raise KeyError('Unknown metadata field "%s"'%field)
+        return dict([(field,md[field] if field in fields or field in self.fileinfo else '') for field in md])
+
     def getoverview(self,outfile=None,width=800,format='JPG'):
         '''
         Generate overviews for generic imagery
@@ -92,97 +112,38 @@ class Dataset(object):
         @type  outfile: string
         @param outfile: a filepath to the output overview image. If supplied, format is determined from the file extension
         @type  width:   integer
-        @param width:   image width
+        @param width:   image width, or a list of widths (with a list of outfiles) to generate several
+                        overview images from one render. See L{overviews.getoverviews}.
         @type  format:  string
         @param format:  format to generate overview image, one of ['JPG','PNG','GIF','BMP','TIF']. Not required if outfile is supplied.
 
         @return:
             - B{filepath} (if outfile is supplied) B{OR}
             - B{binary image data} (if outfile is not supplied)
+            - or a B{list} of them if a list of widths is supplied
         '''
 
-        md=self.metadata
         ds=self._gdaldataset
         if not ds:raise AttributeError, 'No GDALDataset object available, overview image can not be generated'
+        return getoverview(ds,outfile,width,format,self._stretch)
 
-        #Don't rely on the metadata as self._gdaldataset might be a custom VRT
-        ##nbands=md['nbands']
-        ##cols=md['cols']
-        ##rows=md['rows']
-        ##nbits=md['nbits']
-        rb=ds.GetRasterBand(1)
-        nbands=ds.RasterCount
-        cols=ds.RasterXSize
-        rows=ds.RasterYSize
-        nbits=gdal.GetDataTypeSize(rb.DataType)
-        datatype=gdal.GetDataTypeName(rb.DataType)
-        stretch_type=None
-        stretch_args=None
-        rgb_bands = {}
-
-        #Check for pre-defined stretch
-        if self._stretch:
-            try:stretch_type,rgb_bands,stretch_args=self._stretch
-            except ValueError:stretch_type,rgb_bands=self._stretch
-        else:
-            #Check for pre-defined rgb bands, if 8 bit - assume they don't need stretching
-            for i in range(1,nbands+1):
-                gci=ds.GetRasterBand(i).GetRasterColorInterpretation()
-                if   gci == gdal.GCI_RedBand:
-                    rgb_bands[0]=i
-                elif gci == gdal.GCI_GreenBand:
-                    rgb_bands[1]=i
-                elif gci == gdal.GCI_BlueBand:
-                    rgb_bands[2]=i
-                if len(rgb_bands)==3:
-                    rgb_bands=rgb_bands[0],rgb_bands[1],rgb_bands[2] #Make a list from the dict
-                    if nbits == 8:
-                        stretch_type='NONE'
-                        stretch_args=[]
-                    else:
-                        stretch_type='STDDEV'
-                        stretch_args=[2]
-                    break
-
-        #Set some defaults
-        if stretch_type is None or stretch_args is None:
-            if nbands < 3:
-                #Default - assume greyscale
-                #stretch_type='PERCENT'
-                #stretch_args=[2,98]
-                stretch_type='STDDEV'
-                stretch_args=[2]
-                rgb_bands=[1]
-                #But check if there's an attribute table or colour table
-                #and change the stretch type to colour table
-                if datatype in ['Byte', 'Int16', 'UInt16']:
-                    ct=rb.GetColorTable()
-                    at=rb.GetDefaultRAT()
-                    min,max=rb.ComputeRasterMinMax()
-                    if ct and ct.GetCount() > 0 and min>=0: #GDAL doesn't like colourtables with negative values
-                            stretch_type='COLOURTABLE'
-                            stretch_args=[]
-                    elif at and at.GetRowCount() > 0 and at.GetRowCount() < 256:
-                        stretch_type='RANDOM'
-                        stretch_args=[]
+    def getoverviewsource(self):
+        '''
+        Get what's needed to generate overviews from this dataset's gdal.Dataset without opening
+        the dataset and extracting its metadata again, e.g. in another process. See L{getoverview}.
 
-            elif nbands == 3:
-                #Assume RGB
-                if nbits > 8:
-                    stretch_type='PERCENT'
-                    stretch_args=[2,98]
-                else:
-                    stretch_type='NONE'
-                    stretch_args=[]
-                if len(rgb_bands) < 3:rgb_bands=[1,2,3]
-            elif nbands >= 4:
-                stretch_type='PERCENT'
-                stretch_args=[2,98]
-                #stretch_type='STDDEV'
-                #stretch_args=[2]
-                if len(rgb_bands) < 3:rgb_bands=[3,2,1]
-        if not rgb_bands:rgb_bands=[1]
-        return overviews.getoverview(ds,outfile,width,format,rgb_bands,stretch_type,*stretch_args)
+        @rtype:  C{tuple}
+        @return: (gdal.Open name or VRT XML,L{_stretch}) or None if the driver generates its own overviews
+                 or the gdal.Dataset can't be opened again (e.g. it's held in memory)
+        '''
+        ds=self._gdaldataset
+        if not ds or self.getoverview.im_func is not Dataset.getoverview.im_func:return None
+        name=ds.GetDescription()
+        if os.path.exists(name) or (name[:4]=='/vsi' and name[:8]!='/vsimem/'):return name,self._stretch
+        if ds.GetDriver().ShortName=='VRT':
+            xml=''.join(ds.GetMetadata('xml:VRT') or [])
+            if xml and '/vsimem/' not in xml and 'relativeToVRT="1"' not in xml:return xml,self._stretch
+        return None
 
     # ===================== #
     # Private Class Methods
@@ -199,11 +160,11 @@ class Dataset(object):
         f=self.fileinfo['filepath']
         files=[]
         try:
-            files=glob.glob(os.path.splitext(f)[0]+'.*')
+            files=utilities.glob(os.path.splitext(f)[0]+'.*')
             if os.path.exists(os.path.splitext(f)[0]):files.append(os.path.splitext(f)[0])
             hdr_dir=os.path.join(os.path.split(f)[0], 'headers') #Cause ACRES creates a 'headers' directory
             if os.path.exists(hdr_dir):
-                files.extend(glob.glob(os.path.join(hdr_dir,'*')))
+                files.extend(utilities.glob(os.path.join(hdr_dir,'*')))
         except:pass # Need to handle errors when dealing with an VRT XML string better...
 
         if self._gdaldataset:
@@ -244,8 +205,7 @@ class Dataset(object):
                 self._metadata=idict(self._metadata) #We don't want any fields added/deleted
                 self.__getmetadata__()
                 #Pretty print the SRS
-                srs=osr.SpatialReference(self._metadata['srs'])
-                self._metadata['srs']=srs.ExportToPrettyWkt()
+                self._metadata['srs']=spatialreferences.GetPrettyWkt(self._metadata['srs'])
                 #if self._metadata['compressionratio'] > 10000 and self._metadata['filetype'] != 'VRT/Virtual Raster': #Possibly a dodgy JP2 that will grash GDAL and therefore python...
                 #    raise IOError, 'Unable to extract metadata from %s\nFile may be corrupt' % self.fileinfo['filepath']
 
@@ -293,13 +253,158 @@ class Dataset(object):
 
         return locals()
 
+def getoverview(ds,outfile=None,width=800,format='JPG',stretch=None):
+    ''' Generate overviews from a gdal.Dataset, choosing the bands and stretch if they aren't given.
+        See L{Dataset.getoverview}.
+
+        @type  ds:      C{gdal.Dataset}
+        @param ds:      The dataset
+        @type  stretch: C{tuple}
+        @param stretch: (stretch_type,rgb_bands,stretch_args) or None, see L{Dataset._stretch}
+        @note: See L{Dataset.getoverview} for the other arguments
+    '''
+    #Don't rely on the metadata as the dataset might be a custom VRT
+    ##nbands=md['nbands']
+    ##cols=md['cols']
+    ##rows=md['rows']
+    ##nbits=md['nbits']
+    rb=ds.GetRasterBand(1)
+    nbands=ds.RasterCount
+    cols=ds.RasterXSize
+    rows=ds.RasterYSize
+    nbits=gdal.GetDataTypeSize(rb.DataType)
+    datatype=gdal.GetDataTypeName(rb.DataType)
+    stretch_type=None
+    stretch_args=None
+    rgb_bands = {}
+
+    #Check for pre-defined stretch
+    if stretch:
+        try:stretch_type,rgb_bands,stretch_args=stretch
+        except ValueError:stretch_type,rgb_bands=stretch
+    else:
+        #Check for pre-defined rgb bands, if 8 bit - assume they don't need stretching
+        for i in range(1,nbands+1):
+            gci=ds.GetRasterBand(i).GetRasterColorInterpretation()
+            if   gci == gdal.GCI_RedBand:
+                rgb_bands[0]=i
+            elif gci == gdal.GCI_GreenBand:
+                rgb_bands[1]=i
+            elif gci == gdal.GCI_BlueBand:
+                rgb_bands[2]=i
+            if len(rgb_bands)==3:
+                rgb_bands=rgb_bands[0],rgb_bands[1],rgb_bands[2] #Make a list from the dict
+                if nbits == 8:
+                    stretch_type='NONE'
+                    stretch_args=[]
+                else:
+                    stretch_type='STDDEV'
+                    stretch_args=[2]
+                break
+
+    #Set some defaults
+    if stretch_type is None or stretch_args is None:
+        if nbands < 3:
+            #Default - assume greyscale
+            #stretch_type='PERCENT'
+            #stretch_args=[2,98]
+            stretch_type='STDDEV'
+            stretch_args=[2]
+            rgb_bands=[1]
+            #But check if there's an attribute table or colour table
+            #and change the stretch type to colour table
+            if datatype in ['Byte', 'Int16', 'UInt16']:
+                ct=rb.GetColorTable()
+                at=rb.GetDefaultRAT()
+                #Only compute the min if there's a colour table, and from the overview level that will be read
+                if isinstance(width,(list,tuple)):widest=max(width)
+                else:widest=width
+                if ct and ct.GetCount() > 0 and overviews.GetBandMinMax(ds,1,widest)[0]>=0: #GDAL doesn't like colourtables with negative values
+                        stretch_type='COLOURTABLE'
+                        stretch_args=[]
+                elif at and at.GetRowCount() > 0 and at.GetRowCount() < 256:
+                    stretch_type='RANDOM'
+                    stretch_args=[]
+
+        elif nbands == 3:
+            #Assume RGB
+            if nbits > 8:
+                stretch_type='PERCENT'
+                stretch_args=[2,98]
+            else:
+                stretch_type='NONE'
+                stretch_args=[]
+            if len(rgb_bands) < 3:rgb_bands=[1,2,3]
+        elif nbands >= 4:
+            stretch_type='PERCENT'
+            stretch_args=[2,98]
+            #stretch_type='STDDEV'
+            #stretch_args=[2]
+            if len(rgb_bands) < 3:rgb_bands=[3,2,1]
+    if not rgb_bands:rgb_bands=[1]
+    return overviews.getoverview(ds,outfile,width,format,rgb_bands,stretch_type,*stretch_args)
+
 class idict(UserDict.IterableUserDict):
     '''An immutable dictionary.
        Modified from http://code.activestate.com/recipes/498072/
        to inherit UserDict.IterableUserDict
+
+       Values can also be deferred, i.e computed when they're first read, see L{defer}.
     '''
+    def __init__(self, dict=None, **kwargs):
+        self._deferred={}
+        UserDict.IterableUserDict.__init__(self, dict, **kwargs)
+
+    def defer(self, key, func, *args):
+        '''Compute a (costly) value when it's first read instead of now.
+           Setting the value first means func is never called.
+
+           @type  key:  C{str}
+           @param key:  an existing key
+           @type  func: C{function}
+           @param func: function that returns the value when called with args
+        '''
+        if key not in self.data:raise KeyError("Can't add keys")
+        self._deferred[key]=(func,args)
+
+    def __getitem__(self, key):
+        if key in self._deferred:
+            func,args=self._deferred.pop(key)
+            self.data[key]=func(*args)
+        return self.data[key]
+
+    def __resolve__(self):
+        for key in self._deferred.keys():self[key]
+
+    def items(self):
+        self.__resolve__()
+        return self.data.items()
+
+    def values(self):
+        self.__resolve__()
+        return self.data.values()
+
+    def iteritems(self):
+        self.__resolve__()
+        return self.data.iteritems()
+
+    def itervalues(self):
+        self.__resolve__()
+        return self.data.itervalues()
+
+    def copy(self):
+        self.__resolve__()
+        c=UserDict.IterableUserDict.copy(self)
+        c._deferred={}
+        return c
+
+    def __repr__(self):
+        self.__resolve__()
+        return repr(self.data)
+
     def __setitem__(self, key, val):
         if key in self.data.keys():
+            self._deferred.pop(key,None)
             self.data[key]=val
         else:raise KeyError("Can't add keys")
 
@@ -81,7 +81,6 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
-gdal.AllRegister()
 
 class Dataset(__dataset__.Dataset):
     '''Default Dataset class.
@@ -100,11 +99,9 @@ class Dataset(__dataset__.Dataset):
         '''
         if not f:f=self.fileinfo['filepath']
         try:
-            cwd=os.path.abspath(os.curdir)
-            if os.path.exists(f) and os.path.dirname(f):
-                p=os.path.split(f)[0]
-                os.chdir(p)
-            if not self._gdaldataset:self._gdaldataset= geometry.OpenDataset(f) #in case we're subclassed and there's already a dataset open
+            #Resolve relative VRT source paths against the VRT's directory rather than changing the
+            #current working directory, which would affect every thread in the process
+            if not self._gdaldataset:self._gdaldataset= geometry.OpenDataset(geometry.ResolveVRTSources(f)) #in case we're subclassed and there's already a dataset open
             if self._gdaldataset:
                 driver=self._gdaldataset.GetDriver().ShortName
                 if driver[0:3]=='HDF':raise NotImplementedError, 'HDF files are not yet implemented except by custom formats'
@@ -116,8 +113,9 @@ class Dataset(__dataset__.Dataset):
                 self.metadata['srs']= self._gdaldataset.GetProjection()
                 if not self.metadata['srs'] and self._gdaldataset.GetGCPCount() > 0:
                     self.metadata['srs'] = self._gdaldataset.GetGCPProjection()
-                self.metadata['epsg'] = spatialreferences.IdentifyAusEPSG(self.metadata['srs'])
-                self.metadata['units'] = spatialreferences.GetLinearUnitsName(self.metadata['srs'])
+                epsg,units,prettywkt = spatialreferences.IdentifySRS(self.metadata['srs'])
+                self.metadata['epsg'] = epsg
+                self.metadata['units'] = units
 
                 geotransform = self._gdaldataset.GetGeoTransform()
                 if geotransform == (0, 1, 0, 0, 0, 1):
@@ -134,14 +132,7 @@ class Dataset(__dataset__.Dataset):
                 ext.append([gcps[0].GCPX, gcps[0].GCPY])#Add the 1st point to close the polygon)
 
                 #Reproject corners to lon,lat
-                geom = geometry.GeomFromExtent(ext)
-                src_srs=osr.SpatialReference()
-                src_srs.ImportFromWkt(self.metadata['srs'])
-                tgt_srs=osr.SpatialReference()
-                tgt_srs.ImportFromEPSG(4326)
-                geom=geometry.ReprojectGeom(geom,src_srs,tgt_srs)
-                points=geom.GetGeometryRef(0) #geom.GetBoundary()
-                ext=[[points.GetX(i),points.GetY(i)] for i in range(0,points.GetPointCount())]
+                ext=geometry.ReprojectPoints(ext,self.metadata['srs'],4326)
 
                 self.metadata['cellx'],self.metadata['celly']=geometry.CellSize(geotransform)
                 self.metadata['rotation']=geometry.Rotation(geotransform)
@@ -171,22 +162,13 @@ class Dataset(__dataset__.Dataset):
                                 self._gdaldataset.GetRasterBand(i).SetNoDataValue(nodata)
                 else:raise IOError,'No valid rasterbands found.'
 
-                metadata=self._gdaldataset.GetMetadata()
-                self.metadata['metadata']='\n'.join(['%s: %s' %(m,metadata[m]) for m in metadata])
-                self.metadata['filesize']=sum([os.path.getsize(tmp) for tmp in self.filelist])
-                if self.metadata['filesize']>0:self.metadata['compressionratio']=int((self.metadata['nbands']*self.metadata['cols']*self.metadata['rows']*(self.metadata['nbits']/8.0))/self.metadata['filesize'])
-                if self.metadata['compressionratio'] > 0:
-                    try:
-                        if driver[0:3]=='JP2':
-                            self.metadata['compressiontype']="JPEG2000"
-                        elif driver[0:3]=='ECW':
-                            self.metadata['compressiontype']="ECW"
-                        else:
-                            mdis=self._gdaldataset.GetMetadata('IMAGE_STRUCTURE')
-                            #self.metadata['compressiontype']=mdis['IMAGE_STRUCTURE']
-                            self.metadata['compressiontype']=mdis['COMPRESSION']
-                    except: self.metadata['compressiontype']='Unknown'
-                else: self.metadata['compressiontype']='None'
+                #These can be slow (lots of GDAL metadata, lots of related files on a network share...)
+                #so they're only computed when they're read, and not at all if they're not selected
+                nbytes=self.metadata['nbands']*self.metadata['cols']*self.metadata['rows']*(self.metadata['nbits']/8.0)
+                self.metadata.defer('metadata',self.__gdalmetadata__,self._gdaldataset)
+                self.metadata.defer('filesize',self.__filesize__)
+                self.metadata.defer('compressionratio',self.__compressionratio__,nbytes)
+                self.metadata.defer('compressiontype',self.__compressiontype__,self._gdaldataset,driver,nbytes)
                 self.extent=ext
             else:
                 errmsg=gdal.GetLastErrorMsg()
@@ -194,5 +176,36 @@ class Dataset(__dataset__.Dataset):
 
         finally: #Cleanup
             gdal.ErrorReset()
-            os.chdir(cwd)
+
+    def __gdalmetadata__(self,ds):
+        '''All of a GDAL dataset's default domain metadata items'''
+        metadata=ds.GetMetadata()
+        return '\n'.join(['%s: %s' %(m,metadata[m]) for m in metadata])
+
+    def __filesize__(self):
+        '''Total size of the dataset's files'''
+        if getattr(self,'_filesize',None) is None:
+            self._filesize=sum([os.path.getsize(tmp) for tmp in self.filelist])
+        return self._filesize
+
+    def __compressionratio__(self,nbytes):
+        '''Uncompressed (nbytes) to file size ratio'''
+        filesize=self.__filesize__()
+        if filesize>0:return int(nbytes/filesize)
+        else:return ''
+
+    def __compressiontype__(self,ds,driver,nbytes):
+        '''Compression type, if the dataset is compressed'''
+        if self.__compressionratio__(nbytes) > 0:
+            try:
+                if driver[0:3]=='JP2':
+                    return "JPEG2000"
+                elif driver[0:3]=='ECW':
+                    return "ECW"
+                else:
+                    mdis=ds.GetMetadata('IMAGE_STRUCTURE')
+                    #return mdis['IMAGE_STRUCTURE']
+                    return mdis['COMPRESSION']
+            except: return 'Unknown'
+        else: return 'None'
 
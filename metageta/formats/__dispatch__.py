@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+'''
+Format dispatch index
+=====================
+Matches a file path against the regular expressions of every format driver in a single pass
+and returns the drivers that may be able to open it, in the order they should be tried.
+
+Regular expressions that only match a file extension (e.g. C{r'\.tif$'} or C{r'.*\.asc$'})
+are looked up in an extension dictionary. All other regular expressions are combined into
+one pattern of lookahead assertions with a named group per expression, so a single
+C{re.match} call reports every expression that matches.
+
+B{Example}:
+    >>> index=Dispatcher([('envi',[r'\.hdr$']),('__default__',[r'\.tif$',r'\.img$'])])
+    >>> index.candidates('/data/scene.hdr')
+    ['envi']
+    >>> index.priority('/data/scene.img')
+    2
+'''
+
+import re as _re
+
+_extension=_re.compile(r'^(?:\^?\.\*)?\\\.(\w+)\$$')
+_maxgroups=90 #Older versions of the re module only support 100 named groups per pattern
+
+class Dispatcher(object):
+    '''Format dispatch index'''
+    def __init__(self,drivers):
+        ''' Build the dispatch index
+
+            @type  drivers: C{list}
+            @param drivers: List of (driver name, [regular expressions]) tuples in the order
+                            the drivers should be tried.
+        '''
+        self.drivers=[d for d,r in drivers]
+        self.regexes=[]  #Unique regexes in priority order
+        self._regexdrivers=[] #Driver names for each regex
+        for driver,regexes in drivers:
+            for r in regexes:
+                if r in self.regexes:
+                    self._regexdrivers[self.regexes.index(r)].append(driver)
+                else:
+                    self.regexes.append(r)
+                    self._regexdrivers.append([driver])
+
+        self._extensions={} #{'.ext':[regex index,...]}
+        patterns=[]
+        for i,r in enumerate(self.regexes):
+            exts=self.__extensions__(r)
+            if exts:
+                for ext in exts:self._extensions.setdefault(ext,[]).append(i)
+            else:patterns.append('(?:(?=(?P<r%s>.*?(?:%s)))|)'%(i,r))
+
+        self._patterns=[]
+        for i in range(0,len(patterns),_maxgroups):
+            self._patterns.append(_re.compile(''.join(patterns[i:i+_maxgroups]),_re.IGNORECASE))
+
+    def __extensions__(self,regex):
+        ''' Get the file extension/s a regex matches if it only matches a file extension
+
+            @rtype:  C{list}
+            @return: List of lower case extensions (inc. "."), empty if the regex isn't a simple extension match
+        '''
+        exts=[]
+        if '(' in regex or '[' in regex:return exts
+        for r in regex.split('|'):
+            m=_extension.match(r)
+            if not m:return []
+            exts.append('.'+m.group(1).lower())
+        return exts
+
+    def matches(self,f):
+        ''' Get the regular expressions that match a file path
+
+            @type  f: C{str}
+            @param f: File path
+            @rtype:   C{list}
+            @return:  Sorted indices of the matching regexes in L{regexes}
+        '''
+        i=f.rfind('.')
+        ext=f[i:].lower()
+        if i<0 or '/' in ext or '\\' in ext:matches=[]
+        else:matches=list(self._extensions.get(ext,[]))
+
+        for rx in self._patterns:
+            m=rx.match(f)
+            matches.extend(int(g[1:]) for g,v in m.groupdict().iteritems() if v is not None)
+
+        return sorted(matches)
+
+    def candidates(self,f):
+        ''' Get the drivers that match a file path
+
+            @type  f: C{str}
+            @param f: File path
+            @rtype:   C{list}
+            @return:  Names of the matching drivers, in the order they should be tried
+        '''
+        drivers=set()
+        for i in self.matches(f):drivers.update(self._regexdrivers[i])
+        return [d for d in self.drivers if d in drivers]
+
+    def priority(self,f):
+        ''' Get the priority of a file path, i.e. the index of the first regex that matches it
+
+            @type  f: C{str}
+            @param f: File path
+            @rtype:   C{int}
+            @return:  Index in L{regexes} or None if no regex matches
+        '''
+        matches=self.matches(f)
+        if matches:return matches[0]
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Header file parser
+==================
+Parses the ODL style C{key = value} headers used by Landsat MTL, EO-1 ALI/Hyperion MTL
+and DigitalGlobe IMD files, as well as ENVI headers, in a single pass into nested L{Group}s.
+
+    - C{GROUP = name}/C{BEGIN_GROUP = name} ... C{END_GROUP} start and end a nested group
+    - C{END} (or C{END;}) ends the header
+    - Quotes and trailing semicolons are stripped from values
+    - C{( a, b, ...)} lists, which may span lines, are parsed into tuples of strings
+    - C{{ ... }} ENVI values, which may span lines, are kept as is (sans braces)
+
+Values are not converted when the header is parsed, use L{Group.typed} to get numbers.
+
+B{Example}:
+    >>> hdr=read('LC80910862013101LGN01_MTL.txt')
+    >>> hdr.group('PRODUCT_METADATA')['SPACECRAFT_ID']
+    'LANDSAT_8'
+    >>> hdr.group('IMAGE_ATTRIBUTES').typed('CLOUD_COVER')
+    12.34
+'''
+
+try:
+    from collections import OrderedDict
+except:
+    from metageta.ordereddict import OrderedDict
+
+from metageta import geometry
+
+class Group(OrderedDict):
+    ''' A group of header values and nested groups, in file order'''
+
+    def group(self,name):
+        ''' Find a nested group, at any depth
+
+            @type    name: C{str}
+            @param   name: Group name
+            @rtype:        L{Group}
+            @return:       The first group (depth first) with that name
+            @raise KeyError: If there's no group with that name
+        '''
+        for key,value in self.iteritems():
+            if isinstance(value,Group):
+                if key==name:return value
+                try:return value.group(name)
+                except KeyError:pass
+        raise KeyError(name)
+
+    def typed(self,key,default=None):
+        ''' Get a value converted to an C{int} or C{float} if it looks like one
+
+            @type    key:     C{str}
+            @param   key:     Value name
+            @param   default: Returned if there's no value with that name
+            @return:          C{int}, C{float}, C{str} or C{tuple} of the same
+        '''
+        try:value=self[key]
+        except KeyError:return default
+        if isinstance(value,tuple):return tuple([_typed(v) for v in value])
+        return _typed(value)
+
+def _typed(value):
+    for type in (int,float):
+        try:return type(value)
+        except (ValueError,TypeError):pass
+    return value
+
+def _value(value):
+    ''' Strip quotes and semicolons from a value and split lists'''
+    value=value.replace('"','').strip().rstrip(';').strip()
+    if value[:1]=='(' and value[-1:]==')':
+        return tuple([v.strip() for v in value[1:-1].split(',') if v.strip()])
+    return value
+
+def parse(text):
+    ''' Parse header text
+
+        @type    text: C{str}
+        @param   text: Header text
+        @rtype:        L{Group}
+        @return:       Header values and groups
+    '''
+    root=Group()
+    groups=[root]
+    lines=iter(text.splitlines())
+    for line in lines:
+        key,sep,value=line.partition('=')
+        key=key.strip()
+        if not sep:
+            if key.upper() in ('END','END;'):break
+            continue #Blank line, comment or the "ENVI" line
+        value=value.strip()
+        upper=key.upper()
+        if upper in ('GROUP','BEGIN_GROUP'):
+            group=Group()
+            groups[-1][_value(value)]=group
+            groups.append(group)
+        elif upper=='END_GROUP':
+            if len(groups)>1:groups.pop()
+        elif value[:1]=='{': #ENVI
+            while '}' not in value:
+                try:value+='\n'+lines.next().strip()
+                except StopIteration:break
+            groups[-1][key]=value.replace('{','').replace('}','').strip(' \t')
+        else:
+            if value[:1]=='(':
+                while not value.rstrip(';').rstrip().endswith(')'):
+                    try:value+=lines.next().strip()
+                    except StopIteration:break
+            groups[-1][key]=_value(value)
+    return root
+
+def read(f):
+    ''' Read and parse a header file
+
+        @type    f: C{str}
+        @param   f: Path to header file, may be a /vsi path
+        @rtype:     L{Group}
+        @return:    Header values and groups, the file contents are in the C{text} attribute
+                    so the file doesn't need to be read again
+    '''
+    if f[:4]=='/vsi':text=geometry.read_vsi(f)
+    else:text=open(f).read()
+    hdr=parse(text)
+    hdr.text=text
+    return hdr
@@ -42,7 +42,8 @@ B{Adding support for another format}:
     - The default Dataset class is useful if GDAL can read your format and you just need to populate some extra fields.
     - Populate appropriate filelist & fileinfo in the __init__ method of your dataset class (if required), do not populate the metadata dict!
     - Populate appropriate metadata and extent variables in the __getmetadata__ method of your dataset class
-    - Your format will be automatically loaded when the formats module is initialised.
+    - Your format will be automatically loaded the first time a file matches one of its regular expressions.
+      The format_regex list must be a literal list of strings so it can be read without importing your driver.
     - Errors should be propagated back up the chain. If you can't handle a certain file and for some reason you don't want an error to get raised (eg. the ENVI driver (*.hdr) doesn't handle ESRI bil/flt headers (*.hdr)) then raise NotImplementedError which will be ignored in lib.formats.Open()
     - If you want some info to get logged by the application and then continue processing (e.g the image doesn't have a projection defined, etc...) then use the warnings.warn("Some message") method - don't forget to import the warnings module!
     - Date/Time formats must follow follow AS ISO 8601-2007 (see: U{http://www.anzlic.org.au/metadata/guidelines/Index.html?date_and_datetime.htm})
@@ -82,6 +83,9 @@ B{Class hierarchy}::
         |----getoverview(outfile=None,width=800,format='JPG'))
         |    #generate thumbnails and quicklooks
         |
+        |----getmetadata(fields=None)
+        |    #copy of the metadata, only computing the selected fields
+        |
         |----__new__(file)
         |    #Initialise the class object and populate fileinfo
         |
@@ -135,12 +139,14 @@ B{Class hierarchy}::
 '''
 
 from glob import glob as _glob
-import os.path as _path, re as _re, sys as _sys, imp as _imp, warnings as _warn
+import os as _os, os.path as _path, re as _re, sys as _sys, imp as _imp, warnings as _warn
+import ast as _ast, cPickle as _pickle
 import __fields__
+import __dispatch__
 from metageta import utilities
 
 #Private
-__formats__={}
+__formats__={} #Format drivers that have been imported, or None if they couldn't be
 
 #Public
 format_regex=[]
@@ -149,24 +155,85 @@ fields=__fields__.fields
 '''List of metadata fields that can be populated'''
 
 debug=False
-#Dynamically load all formats
-for _lib in sorted(_glob(_path.join(__path__[0],'[a-z]*.py'))):
-    _lib=_path.splitext(_path.basename(_lib))[0]
+
+def _readregex(path):
+    ''' Read a driver's format_regex list from its source without importing it, or None if it isn't a literal list'''
+    with open(path,'rU') as reader:source=reader.read()
+    for node in _ast.parse(source,path).body:
+        if isinstance(node,_ast.Assign) and [getattr(t,'id',None) for t in node.targets]==['format_regex']:
+            try:return list(_ast.literal_eval(node.value))
+            except ValueError:return None
+
+def _drivers():
+    ''' Get the (name, regexes) of the custom format drivers (in name order) and the default driver.
+
+        The regexes are read from the driver source files, which is much quicker than importing
+        them (and GDAL etc...). They're cached on disk until a driver is added, removed or modified.
+    '''
+    libs=sorted(_glob(_path.join(__path__[0],'[a-z]*.py')))+[_path.join(__path__[0],'__default__.py')]
+    libs=[(_path.splitext(_path.basename(lib))[0],lib) for lib in libs]
+    signature=[(name,_os.stat(lib).st_mtime) for name,lib in libs]
+
     try:
-        #import custom format and add to the list of formats
-        __formats__[_lib]=__import__('%s.%s'%(__name__,_lib), fromlist=[__name__])
+        from metageta import config
+        cache=_path.join(config.get_cache_dir(),'drivers.cache')
+        with open(cache,'rb') as reader:cached=_pickle.load(reader)
+        if cached['signature']==signature:return cached['drivers']
+    except Exception:cached=None
+
+    drivers=[]
+    for name,lib in libs:
+        try:regexes=_readregex(lib)
+        except SyntaxError:regexes=None #Let the import report it
+        if regexes is None:
+            driver=_driver(name)
+            if driver is None:continue
+            regexes=driver.format_regex
+        drivers.append((name,regexes))
 
-        #append module _format_regex & fields to lists
-        format_regex.extend([r for r in __formats__[_lib].format_regex if not r in format_regex])
-    #except:pass
+    try:
+        with open(cache,'wb') as writer:_pickle.dump({'signature':signature,'drivers':drivers},writer,2)
+    except Exception:pass #Not fatal, we'll just have to read them again next time
+    return drivers
+
+def _driver(name):
+    ''' Import a format driver the first time it's needed, or None if it can't be imported'''
+    try:return __formats__[name]
+    except KeyError:pass
+    try:
+        __formats__[name]=__import__('%s.%s'%(__name__,name), fromlist=[__name__])
     except:
+        __formats__[name]=None
         _warn.showwarning=_warn._show_warning #Fix Ft overwrite
-        _warn.warn('Unable to import %s\n%s' % (_lib, utilities.ExceptionInfo()))
+        _warn.warn('Unable to import %s\n%s' % (name, utilities.ExceptionInfo()))
+    return __formats__[name]
 
-#import generic formats (eg. GeoTiff, JP2, etc...)
-import __default__
-#append module _format_regex to list of format regexes
-format_regex.extend([_r for _r in __default__.format_regex if not _r in format_regex])
+#Build the format dispatch index once, custom formats are tried (in name order) before generic formats (eg. GeoTiff, JP2, etc...)
+#Drivers are only imported when a file matches one of their regexes
+_loaded=_drivers()
+for _lib,_regexes in _loaded:
+    format_regex.extend([_r for _r in _regexes if not _r in format_regex])
+_index=__dispatch__.Dispatcher(_loaded)
+
+def candidates(f):
+    ''' Get the names of the format drivers that may be able to open a file.
+
+        @type  f: C{str}
+        @param f: a filepath to the dataset.
+        @rtype:   C{list}
+        @return:  driver names in the order they are tried by L{Open}
+    '''
+    return _index.candidates(f)
+
+def priority(f):
+    ''' Get the priority of a file, lower values should be opened first.
+
+        @type  f: C{str}
+        @param f: a filepath to the dataset.
+        @rtype:   C{int}
+        @return:  index of the first regex in L{format_regex} that matches or None if no regex matches.
+    '''
+    return _index.priority(f)
 
 def Open(f):
     ''' Open an image with the appropriate driver.
@@ -183,40 +250,22 @@ def Open(f):
     f=utilities.encode(f) #Issue 20
     #f=utilities.normcase(utilities.uncpath(utilities.realpath(f)))
 
-    #Try custom formats
-    for lib in __formats__:
-        fr='|'.join(__formats__[lib].format_regex)
-        rx=_re.compile(fr, _re.IGNORECASE)
-        if rx.search(f):
-            try:
-                ds=__formats__[lib].Dataset(f)
-                return ds
-            except NotImplementedError:
-                pass #Used when a format driver can't open a file, but doesn't want to raise an error
-            except Exception as err:
-                if debug:
-                    errinfo=utilities.FormatTraceback(_sys.exc_info()[2],10)
-                    errargs=[arg for arg in err.args]
-                    errargs.append(errinfo)
-                    err.args=tuple(errargs)
-                errors.append(err)
-
-    #Try default formats
-    try:
-        fr='|'.join(__default__.format_regex)
-        rx=_re.compile(fr, _re.IGNORECASE)
-        if rx.search(f):
-            ds=__default__.Dataset(f)
+    #Try custom formats then default formats
+    for lib in _index.candidates(f):
+        driver=_driver(lib)
+        if driver is None:continue
+        try:
+            ds=driver.Dataset(f)
             return ds
-    except NotImplementedError:
-        pass #Used when a format driver can't open a file, but doesn't want to raise an error
-    except Exception as err:
-        if debug:
-            errinfo=utilities.FormatTraceback(_sys.exc_info()[2],10)
-            errargs=[arg for arg in err.args]
-            errargs.append(errinfo)
-            err.args=tuple(errargs)
-        errors.append(err)
+        except NotImplementedError:
+            pass #Used when a format driver can't open a file, but doesn't want to raise an error
+        except Exception as err:
+            if debug:
+                errinfo=utilities.FormatTraceback(_sys.exc_info()[2],10)
+                errargs=[arg for arg in err.args]
+                errargs.append(errinfo)
+                err.args=tuple(errargs)
+            errors.append(err)
 
     #Couldn't open file, raise the last error in the stack
     if len(errors) > 0: raise errors[-1]
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+'''
+Streaming XML reader
+====================
+Extracts only the elements and attributes a driver asks for from XML metadata documents with
+C{lxml.etree.iterparse}. Elements are freed as soon as they have been parsed (unless they're part of
+a match), so memory use depends on the size of the matched elements rather than the size of the document (e.g. the multi-megabyte DIMAP documents delivered with
+SPOT 6/7 and Pleiades imagery).
+
+Paths are a simple subset of XPath:
+    - C{/Root/Child/Name} matches elements from the document root
+    - C{//Child/Name} matches elements at any depth
+    - C{.../@name} matches an attribute of those elements
+
+Namespaces are ignored. Matched elements are detached copies, so they can be queried with relative
+XPath as usual, e.g. C{element.xpath('string(IMAGING_DATE)')}.
+
+B{Example}:
+    >>> xml=read('METADATA.DIM',{'sceneid':'/Dimap_Document/Dataset_Id/DATASET_NAME',
+    ...                          'version':'//METADATA_FORMAT/@version',
+    ...                          'scenes':'//Scene_Source'}, stop='Data_Strip')
+    >>> xml.string('sceneid')
+    'SCENE 5 J 406-411 03/04/27 00:48:09 2 T'
+    >>> [scene.xpath('string(IMAGING_DATE)') for scene in xml['scenes']]
+    ['2003-04-27']
+'''
+
+import copy, re
+from lxml import etree
+
+class Elements(dict):
+    ''' Elements and attribute values matching each path, keyed by path name, in document order'''
+
+    def string(self,name,default=''):
+        ''' Get the string value (as per XPath C{string()}) of the first match
+
+            @type    name:    C{str}
+            @param   name:    Path name
+            @param   default: Returned if nothing matched
+            @rtype:           C{str}
+        '''
+        values=self.get(name)
+        if not values:return default
+        if isinstance(values[0],basestring):return values[0]
+        return values[0].xpath('string()')
+
+    def number(self,name):
+        ''' Get the numeric value (as per XPath C{number()}) of the first match
+
+            @type    name: C{str}
+            @param   name: Path name
+            @rtype:        C{float}
+            @return:       The value or NaN if nothing matched or it isn't a number
+        '''
+        try:return float(self.string(name))
+        except ValueError:return float('nan')
+
+def read(f,paths,stop=None):
+    ''' Read the elements and attributes matching some paths from an XML file
+
+        @type    f:     C{str}
+        @param   f:     Path to the XML file
+        @type    paths: C{dict}
+        @param   paths: Paths keyed by name
+        @type    stop:  C{str}
+        @param   stop:  Stop reading at the first element with this tag (in upper, lower or the
+                        given case), the rest of the document is not read
+        @rtype:         L{Elements}
+        @return:        A list of matches for each path name. The root element's tag is in the C{root}
+                        attribute. Use L{text} if the document text is needed as well.
+    '''
+    #Index the paths by their last tag so each element is only checked against paths it could match
+    compiled={}
+    for name,path in paths.items():
+        attr=None
+        if '/@' in path:path,attr=path.rsplit('/@',1)
+        steps=path.lstrip('/').split('/')
+        compiled.setdefault(steps[-1],[]).append((name,steps,path[:2]=='//',attr))
+
+    elements=Elements([(name,[]) for name in paths])
+    elements.root=None
+    if stop:stops=set([stop,stop.upper(),stop.lower()])
+    found=dict([(name,[]) for name in paths]) #(position,match) tuples
+    stack=[]   #Tags of the open elements
+    matches=[] #Position and matching path names of the open elements
+    keep=0     #Number of open elements that are being copied, their children mustn't be freed
+    position=0 #Number of elements started, matches are sorted on this so they're in document order
+    with open(f,'rb') as reader:
+        for event,element in etree.iterparse(reader,events=('start','end')):
+            if event=='start':
+                tag=_localname(element.tag)
+                if elements.root is None:elements.root=tag
+                if stop and tag in stops:break
+                stack.append(tag)
+                position+=1
+                matched=[]
+                for name,steps,anywhere,attr in compiled.get(tag,[]):
+                    if (stack[-len(steps):] if anywhere else stack)!=steps:continue
+                    if attr is None:matched.append(name)
+                    elif attr in element.attrib:found[name].append((position,element.get(attr)))
+                if matched:keep+=1
+                matches.append((position,matched))
+            else:
+                stack.pop()
+                start,matched=matches.pop()
+                if matched:
+                    keep-=1
+                    for name in matched:found[name].append((start,copy.deepcopy(element)))
+                if not keep:
+                    #Free the element and the ones before it, they've all been parsed
+                    element.clear()
+                    while element.getprevious() is not None:del element.getparent()[0]
+    for name in found:elements[name]=[match for start,match in sorted(found[name],key=lambda match:match[0])]
+    return elements
+
+def text(f,stop=None,root=None,size=65536):
+    ''' Read the text of an XML file, e.g. to store the metadata document in a record
+
+        @type    f:    C{str}
+        @param   f:    Path to the XML file
+        @type    stop: C{str}
+        @param   stop: Stop reading at the first element with this tag (case insensitive),
+                       the rest of the document is not read
+        @type    root: C{str}
+        @param   root: Root element tag to close the document with if it is cut short at C{stop},
+                       e.g. L{Elements}.root
+        @rtype:        C{str}
+    '''
+    if stop:pattern=re.compile(r'<(?:[\w.-]+:)?%s[\s/>]'%re.escape(stop),re.I)
+    overlap=len(stop or '')+64 #Long enough for a namespace prefix, in case the tag is split across reads
+    chunks,tail=[],''
+    with open(f,'rb') as reader:
+        for data in iter(lambda:reader.read(size),''):
+            data=tail+data
+            match=stop and stop.lower() in data.lower() and pattern.search(data) #Skip the regex if it can't match
+            if match:
+                chunks.append(data[:match.start()])
+                text=''.join(chunks)
+                if root:text='%s\n</%s>\n'%(text.rstrip(),root)
+                return text
+            chunks.append(data[:-overlap])
+            tail=data[-overlap:]
+    chunks.append(tail)
+    return ''.join(chunks)
+
+def _localname(tag):
+    ''' Tag without its namespace'''
+    return tag.rpartition('}')[2]
@@ -44,7 +44,7 @@ import __dataset__
 # import other modules (use "_"  prefix to import privately)
 import sys, os, re, glob, time, math, string
 from metageta import utilities, geometry
-from landsat_mtl import parseheader
+import __header__
 
 try:
     from osgeo import gdal
@@ -56,13 +56,12 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
-gdal.AllRegister()
 
 class Dataset(__dataset__.Dataset):
     '''Subclass of base Dataset class'''
     def __init__(self,f):
         if f[:4]=='/vsi':raise NotImplementedError #GDAL (as at 1.11.3) doesn't support VSI access to ALI rasters
-        self.filelist=glob.glob(os.path.dirname(f)+'/*') #Assume raw data - all files in current dir belong to this dataset.
+        self.filelist=utilities.glob(os.path.dirname(f)+'/*') #Assume raw data - all files in current dir belong to this dataset.
 
     def __getmetadata__(self):
         '''Read Metadata for recognised EO1 ALI (L1G & L1R) & Hyperion (L1R) images as GDAL doesn't'''
@@ -192,7 +191,7 @@ class Dataset(__dataset__.Dataset):
             #create multispectral only _gdaldatset for overview generation
             #Get all the data files and mosaic the strips
             #strips=[s for s in utilities.rglob(os.path.dirname(f),r'\.m[1-4]r$',True,re.I,False)]
-            strips=glob.glob(os.path.join(os.path.dirname(f),'*.m[1-4]r'))
+            strips=utilities.glob(os.path.join(os.path.dirname(f),'*.m[1-4]r'))
             strips.sort();strips.reverse() #west->east = *.m4r-m1
             scols=(int(multicols)+30)/4 # +30 handles the 10 pixel overlap
             xoff=10
@@ -369,45 +368,33 @@ class Dataset(__dataset__.Dataset):
             self.nrows=','.join(self.nrows)
 
             met=f.lower().replace('_hdf.l1g','_mtl.l1g')
-            md={}
-            for line in open(met, 'r'):
-                line=line.replace('"','')
-                line=[l.strip() for l in line.split('=')]
-                if line[0]=='END':         #end of the metadata file
-                    break
-                elif line[0]=='GROUP':     #start of a metadata group
-                    if line[1]!='L1_METADATA_FILE':
-                        group = line[1]
-                        md[group]={}
-                elif line[0]=='END_GROUP': #end of a metadata group
-                    pass
-                else:                     #metadata value
-                    md[group][line[0]]=line[1]
-
-            uly=float(md['PRODUCT_METADATA']['PRODUCT_UL_CORNER_LAT'])
-            ulx=float(md['PRODUCT_METADATA']['PRODUCT_UL_CORNER_LON'])
-            ury=float(md['PRODUCT_METADATA']['PRODUCT_UR_CORNER_LAT'])
-            urx=float(md['PRODUCT_METADATA']['PRODUCT_UR_CORNER_LON'])
-            lry=float(md['PRODUCT_METADATA']['PRODUCT_LR_CORNER_LAT'])
-            lrx=float(md['PRODUCT_METADATA']['PRODUCT_LR_CORNER_LON'])
-            lly=float(md['PRODUCT_METADATA']['PRODUCT_LL_CORNER_LAT'])
-            llx=float(md['PRODUCT_METADATA']['PRODUCT_LL_CORNER_LON'])
+            md=__header__.read(met)
+            product=md.group('PRODUCT_METADATA')
+
+            uly=float(product['PRODUCT_UL_CORNER_LAT'])
+            ulx=float(product['PRODUCT_UL_CORNER_LON'])
+            ury=float(product['PRODUCT_UR_CORNER_LAT'])
+            urx=float(product['PRODUCT_UR_CORNER_LON'])
+            lry=float(product['PRODUCT_LR_CORNER_LAT'])
+            lrx=float(product['PRODUCT_LR_CORNER_LON'])
+            lly=float(product['PRODUCT_LL_CORNER_LAT'])
+            llx=float(product['PRODUCT_LL_CORNER_LON'])
             self.geoext=[[ulx,uly],[urx,ury],[lrx,lry],[llx,lly],[ulx,uly]]
             self.prjext=self.geoext
 
-            self.metadata['imgdate']=md['PRODUCT_METADATA']['ACQUISITION_DATE']
-            self.metadata['resampling']=md['PROJECTION_PARAMETERS']['RESAMPLING_OPTION']
-            try:self.metadata['viewangle']=float(md['PRODUCT_PARAMETERS']['SENSOR_LOOK_ANGLE'])
+            self.metadata['imgdate']=product['ACQUISITION_DATE']
+            self.metadata['resampling']=md.group('PROJECTION_PARAMETERS')['RESAMPLING_OPTION']
+            try:self.metadata['viewangle']=float(md.group('PRODUCT_PARAMETERS')['SENSOR_LOOK_ANGLE'])
             except:pass #Exception raised if value == 'UNAVAILABLE'
-            try:self.metadata['sunazimuth']=float(md['PRODUCT_PARAMETERS']['SUN_AZIMUTH'])
+            try:self.metadata['sunazimuth']=float(md.group('PRODUCT_PARAMETERS')['SUN_AZIMUTH'])
             except:pass #Exception raised if value == 'UNAVAILABLE'
-            try:self.metadata['sunelevation']=float(md['PRODUCT_PARAMETERS']['SUN_ELEVATION'])
+            try:self.metadata['sunelevation']=float(md.group('PRODUCT_PARAMETERS')['SUN_ELEVATION'])
             except:pass #Exception raised if value == 'UNAVAILABLE'
 
             #EPSG:32601: WGS 84 / UTM zone 1N
             #EPSG:32701: WGS 84 / UTM zone 1S
             srs=osr.SpatialReference()
-            zone=int(md['UTM_PARAMETERS']['ZONE_NUMBER'])
+            zone=int(md.group('UTM_PARAMETERS')['ZONE_NUMBER'])
             if zone > 0:epsg=32600 + zone #North
             else:       epsg=32700 - zone #South
             srs.ImportFromEPSG(epsg)
@@ -424,7 +411,7 @@ class Dataset(__dataset__.Dataset):
             ncols=[]
             nrows=[]
             nbands=0
-            bands=glob.glob(os.path.join(os.path.dirname(f),'eo1*_b*.tif'))
+            bands=utilities.glob(os.path.join(os.path.dirname(f),'eo1*_b*.tif'))
             for band in bands:
                 band=geometry.OpenDataset(band)
                 ncols.append(str(band.RasterXSize))
@@ -453,54 +440,42 @@ class Dataset(__dataset__.Dataset):
             self.ncols=','.join(ncols)
             self.nrows=','.join(nrows)
             met=f
-            md={}
-            for line in open(met, 'r'):
-                line=line.replace('"','')
-                line=[l.strip() for l in line.split('=')]
-                if line[0]=='END':         #end of the metadata file
-                    break
-                elif line[0]=='GROUP':     #start of a metadata group
-                    if line[1]!='L1_METADATA_FILE':
-                        group = line[1]
-                        md[group]={}
-                elif line[0]=='END_GROUP': #end of a metadata group
-                    pass
-                else:                     #metadata value
-                    md[group][line[0]]=line[1]
-
-            uly=float(md['PRODUCT_METADATA']['PRODUCT_UL_CORNER_LAT'])
-            ulx=float(md['PRODUCT_METADATA']['PRODUCT_UL_CORNER_LON'])
-            ury=float(md['PRODUCT_METADATA']['PRODUCT_UR_CORNER_LAT'])
-            urx=float(md['PRODUCT_METADATA']['PRODUCT_UR_CORNER_LON'])
-            lry=float(md['PRODUCT_METADATA']['PRODUCT_LR_CORNER_LAT'])
-            lrx=float(md['PRODUCT_METADATA']['PRODUCT_LR_CORNER_LON'])
-            lly=float(md['PRODUCT_METADATA']['PRODUCT_LL_CORNER_LAT'])
-            llx=float(md['PRODUCT_METADATA']['PRODUCT_LL_CORNER_LON'])
+            md=__header__.read(met)
+            product=md.group('PRODUCT_METADATA')
+
+            uly=float(product['PRODUCT_UL_CORNER_LAT'])
+            ulx=float(product['PRODUCT_UL_CORNER_LON'])
+            ury=float(product['PRODUCT_UR_CORNER_LAT'])
+            urx=float(product['PRODUCT_UR_CORNER_LON'])
+            lry=float(product['PRODUCT_LR_CORNER_LAT'])
+            lrx=float(product['PRODUCT_LR_CORNER_LON'])
+            lly=float(product['PRODUCT_LL_CORNER_LAT'])
+            llx=float(product['PRODUCT_LL_CORNER_LON'])
             self.geoext=[[ulx,uly],[urx,ury],[lrx,lry],[llx,lly],[ulx,uly]]
 
-            uly=float(md['PRODUCT_METADATA']['PRODUCT_UL_CORNER_MAPY'])
-            ulx=float(md['PRODUCT_METADATA']['PRODUCT_UL_CORNER_MAPX'])
-            ury=float(md['PRODUCT_METADATA']['PRODUCT_UR_CORNER_MAPY'])
-            urx=float(md['PRODUCT_METADATA']['PRODUCT_UR_CORNER_MAPX'])
-            lry=float(md['PRODUCT_METADATA']['PRODUCT_LR_CORNER_MAPY'])
-            lrx=float(md['PRODUCT_METADATA']['PRODUCT_LR_CORNER_MAPX'])
-            lly=float(md['PRODUCT_METADATA']['PRODUCT_LL_CORNER_MAPY'])
-            llx=float(md['PRODUCT_METADATA']['PRODUCT_LL_CORNER_MAPX'])
+            uly=float(product['PRODUCT_UL_CORNER_MAPY'])
+            ulx=float(product['PRODUCT_UL_CORNER_MAPX'])
+            ury=float(product['PRODUCT_UR_CORNER_MAPY'])
+            urx=float(product['PRODUCT_UR_CORNER_MAPX'])
+            lry=float(product['PRODUCT_LR_CORNER_MAPY'])
+            lrx=float(product['PRODUCT_LR_CORNER_MAPX'])
+            lly=float(product['PRODUCT_LL_CORNER_MAPY'])
+            llx=float(product['PRODUCT_LL_CORNER_MAPX'])
             self.prjext=[[ulx,uly],[urx,ury],[lrx,lry],[llx,lly],[ulx,uly]]
 
-            self.metadata['imgdate']=md['PRODUCT_METADATA']['ACQUISITION_DATE']
-            self.metadata['resampling']=md['PROJECTION_PARAMETERS']['RESAMPLING_OPTION']
-            try:self.metadata['viewangle']=float(md['PRODUCT_PARAMETERS']['SENSOR_LOOK_ANGLE'])
+            self.metadata['imgdate']=product['ACQUISITION_DATE']
+            self.metadata['resampling']=md.group('PROJECTION_PARAMETERS')['RESAMPLING_OPTION']
+            try:self.metadata['viewangle']=float(md.group('PRODUCT_PARAMETERS')['SENSOR_LOOK_ANGLE'])
             except:pass #Exception raised if value == 'UNAVAILABLE'
-            try:self.metadata['sunazimuth']=float(md['PRODUCT_PARAMETERS']['SUN_AZIMUTH'])
+            try:self.metadata['sunazimuth']=float(md.group('PRODUCT_PARAMETERS')['SUN_AZIMUTH'])
             except:pass #Exception raised if value == 'UNAVAILABLE'
-            try:self.metadata['sunelevation']=float(md['PRODUCT_PARAMETERS']['SUN_ELEVATION'])
+            try:self.metadata['sunelevation']=float(md.group('PRODUCT_PARAMETERS')['SUN_ELEVATION'])
             except:pass #Exception raised if value == 'UNAVAILABLE'
 
             #EPSG:32601: WGS 84 / UTM zone 1N
             #EPSG:32701: WGS 84 / UTM zone 1S
             srs=osr.SpatialReference()
-            zone=int(md['UTM_PARAMETERS']['ZONE_NUMBER'])
+            zone=int(md.group('UTM_PARAMETERS')['ZONE_NUMBER'])
             if zone > 0:epsg=32600 + zone #North
             else:       epsg=32700 - zone #South
             srs.ImportFromEPSG(epsg)
@@ -509,53 +484,54 @@ class Dataset(__dataset__.Dataset):
             self.metadata['epsg']= str(epsg)
 
     def hyp_l1t(self,f):
-        md = parseheader(f)
+        md = __header__.read(f)
+        product=md.group('PRODUCT_METADATA')
 
-        self.metadata['level']=md['PRODUCT_METADATA']['PRODUCT_TYPE']
+        self.metadata['level']=product['PRODUCT_TYPE']
         self.metadata['sceneid']=self.metadata['filename'].split('_')[0].upper()
         self.metadata['filetype'] = 'GTiff/GeoTIFF'
         self.metadata['satellite']= 'EO1'
-        self.metadata['sensor']= md['PRODUCT_METADATA']['SENSOR_ID']
+        self.metadata['sensor']= product['SENSOR_ID']
 
-        bands=glob.glob(os.path.join(os.path.dirname(f),'eo1*_b*.tif'))
+        bands=utilities.glob(os.path.join(os.path.dirname(f),'eo1*_b*.tif'))
         band=geometry.OpenDataset(bands[0])
         self.ncols=band.RasterXSize
         self.nrows=band.RasterYSize
         self.nbands=len(bands)
 
-        uly=float(md['PRODUCT_METADATA']['PRODUCT_UL_CORNER_LAT'])
-        ulx=float(md['PRODUCT_METADATA']['PRODUCT_UL_CORNER_LON'])
-        ury=float(md['PRODUCT_METADATA']['PRODUCT_UR_CORNER_LAT'])
-        urx=float(md['PRODUCT_METADATA']['PRODUCT_UR_CORNER_LON'])
-        lry=float(md['PRODUCT_METADATA']['PRODUCT_LR_CORNER_LAT'])
-        lrx=float(md['PRODUCT_METADATA']['PRODUCT_LR_CORNER_LON'])
-        lly=float(md['PRODUCT_METADATA']['PRODUCT_LL_CORNER_LAT'])
-        llx=float(md['PRODUCT_METADATA']['PRODUCT_LL_CORNER_LON'])
+        uly=float(product['PRODUCT_UL_CORNER_LAT'])
+        ulx=float(product['PRODUCT_UL_CORNER_LON'])
+        ury=float(product['PRODUCT_UR_CORNER_LAT'])
+        urx=float(product['PRODUCT_UR_CORNER_LON'])
+        lry=float(product['PRODUCT_LR_CORNER_LAT'])
+        lrx=float(product['PRODUCT_LR_CORNER_LON'])
+        lly=float(product['PRODUCT_LL_CORNER_LAT'])
+        llx=float(product['PRODUCT_LL_CORNER_LON'])
         self.geoext=[[ulx,uly],[urx,ury],[lrx,lry],[llx,lly],[ulx,uly]]
 
-        uly=float(md['PRODUCT_METADATA']['PRODUCT_UL_CORNER_MAPY'])
-        ulx=float(md['PRODUCT_METADATA']['PRODUCT_UL_CORNER_MAPX'])
-        ury=float(md['PRODUCT_METADATA']['PRODUCT_UR_CORNER_MAPY'])
-        urx=float(md['PRODUCT_METADATA']['PRODUCT_UR_CORNER_MAPX'])
-        lry=float(md['PRODUCT_METADATA']['PRODUCT_LR_CORNER_MAPY'])
-        lrx=float(md['PRODUCT_METADATA']['PRODUCT_LR_CORNER_MAPX'])
-        lly=float(md['PRODUCT_METADATA']['PRODUCT_LL_CORNER_MAPY'])
-        llx=float(md['PRODUCT_METADATA']['PRODUCT_LL_CORNER_MAPX'])
+        uly=float(product['PRODUCT_UL_CORNER_MAPY'])
+        ulx=float(product['PRODUCT_UL_CORNER_MAPX'])
+        ury=float(product['PRODUCT_UR_CORNER_MAPY'])
+        urx=float(product['PRODUCT_UR_CORNER_MAPX'])
+        lry=float(product['PRODUCT_LR_CORNER_MAPY'])
+        lrx=float(product['PRODUCT_LR_CORNER_MAPX'])
+        lly=float(product['PRODUCT_LL_CORNER_MAPY'])
+        llx=float(product['PRODUCT_LL_CORNER_MAPX'])
         self.prjext=[[ulx,uly],[urx,ury],[lrx,lry],[llx,lly],[ulx,uly]]
 
-        self.metadata['imgdate']=md['PRODUCT_METADATA']['ACQUISITION_DATE']
-        self.metadata['resampling']=md['PROJECTION_PARAMETERS']['RESAMPLING_OPTION']
-        try:self.metadata['viewangle']=float(md['PRODUCT_PARAMETERS']['SENSOR_LOOK_ANGLE'])
+        self.metadata['imgdate']=product['ACQUISITION_DATE']
+        self.metadata['resampling']=md.group('PROJECTION_PARAMETERS')['RESAMPLING_OPTION']
+        try:self.metadata['viewangle']=float(md.group('PRODUCT_PARAMETERS')['SENSOR_LOOK_ANGLE'])
         except:pass #Exception raised if value == 'UNAVAILABLE'
-        try:self.metadata['sunazimuth']=float(md['PRODUCT_PARAMETERS']['SUN_AZIMUTH'])
+        try:self.metadata['sunazimuth']=float(md.group('PRODUCT_PARAMETERS')['SUN_AZIMUTH'])
         except:pass #Exception raised if value == 'UNAVAILABLE'
-        try:self.metadata['sunelevation']=float(md['PRODUCT_PARAMETERS']['SUN_ELEVATION'])
+        try:self.metadata['sunelevation']=float(md.group('PRODUCT_PARAMETERS')['SUN_ELEVATION'])
         except:pass #Exception raised if value == 'UNAVAILABLE'
 
         #EPSG:32601: WGS 84 / UTM zone 1N
         #EPSG:32701: WGS 84 / UTM zone 1S
         srs=osr.SpatialReference()
-        zone=int(md['UTM_PARAMETERS']['ZONE_NUMBER'])
+        zone=int(md.group('UTM_PARAMETERS')['ZONE_NUMBER'])
         if zone > 0:epsg=32600 + zone #North
         else:       epsg=32700 - zone #South
         srs.ImportFromEPSG(epsg)
@@ -56,7 +56,64 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
-gdal.AllRegister()
+
+#Volume, leader and image file record layouts, byte positions are from the format specifications
+_palsar_filedescriptor=utilities.RecordLayout({ #PALSAR volume file descriptor record
+    'npointers':     (161,164,int)   #Number of file pointers
+})
+_palsar_text=utilities.RecordLayout({ #PALSAR volume text record
+    'prodspec':      (17,56)         #Product type specifier
+})
+_palsar_datasetsummary=utilities.RecordLayout({ #PALSAR leader data set summary record
+    'sceneid':       (21,52),
+    'imgdate':       (69,100),
+    'nbands':        (389,392,int),  #SAR Channels
+    'wavelength':    (501,516),      #Radar wavelength
+    'viewangle':     (1839,1854)     #Nominal offnadir angle
+})
+_palsar_mapprojection=utilities.RecordLayout({ #PALSAR leader map projection data record
+    'ncols':         (61,76,int),
+    'nrows':         (77,92,int),
+    'cellsize':      (93,124),       #metres
+    'rotation':      (125,140,float),#Orientation at output scene centre
+    'projdesc':      (413,444),
+    'utmzone':       (477,480),
+    'falsenorthing': (497,512),
+    'upscentrelon':  (625,640),
+    'upscentrelat':  (641,656),
+    'upsscale':      (657,672),
+    'centrelon':     (737,752),      #Mercator and LCC
+    'centrelat':     (753,768),
+    'stdparallel1':  (769,784),      #LCC
+    'stdparallel2':  (785,800),
+    'latlons':       (1073,1200)     #UL-LR lat/lons
+})
+_sceneheader=utilities.RecordLayout({ #AVNIR-2/PRISM leader scene header record
+    'procinfo':      (21,36),        #Processing level
+    'sceneid':       (37,52),
+    'sceneid1B2':    (197,212),
+    'rotation':      (277,292,float),#Orientation Angle NNN.N = degrees
+    'orbit':         (357,372),      #Ascending/descending orbit
+    'viewangle':     (373,388),
+    'imgdate':       (401,408),
+    'sensorbands':   (443,452),      #Sensor type and bands
+    'sunangles':     (453,466),      #Sun elevation and azimuth
+    'orientation':   (467,478),      #Processing info
+    'nbands':        (1413,1428),
+    'ncols':         (1429,1444),
+    'nrows':         (1445,1460),
+    'resampling':    (1541,1556),
+    'latlons':       (1733,1860)     #Lat/Lon extent
+})
+_mapprojection=utilities.RecordLayout({ #AVNIR-2/PRISM leader map projection (scene-related) ancillary record
+    'hemisphere':    (93,96),
+    'utmzone':       (97,108),
+    'rotation':      (205,220,float),#Orientation Angle NNN.N = radians
+    'cellsize':      (541,572)
+})
+_imagedescriptor=utilities.RecordLayout({ #AVNIR-2/PRISM image file descriptor record
+    'prefix':        (187,192)       #Number of bytes of prefix data per record
+})
 
 class Dataset(__default__.Dataset): 
     '''Subclass of default Dataset class'''
@@ -66,7 +123,7 @@ class Dataset(__default__.Dataset):
         if f[:4]=='/vsi':raise NotImplementedError
         self.filelist=[r for r in utilities.rglob(os.path.dirname(f))]
         self._led=f
-        try:self._vol=glob.glob(os.path.dirname(f) + '/[Vv][Oo][Ll]*')[0] #volume file
+        try:self._vol=utilities.glob(os.path.dirname(f) + '/[Vv][Oo][Ll]*')[0] #volume file
         except:self._vol=False
 
         img_regex=[
@@ -114,20 +171,18 @@ class Dataset(__default__.Dataset):
             2 File pointer    360 (3-6 records = N+2 where N is number of polarization)
             3 Text            360
             '''
-            meta = open(vol,'rb').read()
-
-            #File descriptor record
-            offset = 0
+            with utilities.mapfile(vol) as meta:
+                #File descriptor record
+                offset = 0
 
-            #Number of file pointers        
-            npointers=int(utilities.readbinary(meta,offset,161,164))
+                #Number of file pointers
+                npointers=_palsar_filedescriptor.read(meta,offset)['npointers']
 
-            #Text record
-            offset = 360*(npointers+1)
+                #Text record
+                offset = 360*(npointers+1)
 
-            #Product type specifier
-            start,stop = 17,56
-            prodspec = utilities.readbinary(meta,offset,start,stop)[8:] #Strip of the "'PRODUCT:" string
+                #Product type specifier
+                prodspec = _palsar_text.read(meta,offset)['prodspec'][8:] #Strip of the "'PRODUCT:" string
             if prodspec[1:4] != '1.5':raise Exception, 'ALOS PALSAR Level %s not yet implemented' % level
             if prodspec[0]=='H':self.metadata['mode']='Fine (high resolution) mode'
             elif prodspec[0]=='W':self.metadata['mode']='ScanSAR (wide observation) mode'
@@ -154,60 +209,47 @@ class Dataset(__default__.Dataset):
             8 Calibration data        13212
             9 Facility related        Variable
             '''
-            meta = open(led,'rb').read()
+            with utilities.mapfile(led) as meta:
+                summary=_palsar_datasetsummary.read(meta,720)       #Data set summary, after the 720 byte file descriptor
+                mapproj=_palsar_mapprojection.read(meta,720+4096)   #Map projection data
 
-            #File descriptor
-            offset = 0
-            
             #Data set summary
-            offset = 720
             #Scene ID
-            start,stop = 21,52
-            sceneid = utilities.readbinary(meta,offset,start,stop)
+            sceneid = summary['sceneid']
             #Image date
-            start,stop = 69,100
-            #imgdate=utilities.readbinary(meta,offset,start,stop)[0:14]#Strip off time
+            #imgdate=summary['imgdate'][0:14]#Strip off time
             #self.metadata['imgdate'] = time.strftime(utilities.dateformat,time.strptime(imgdate,'%Y%m%d')) #ISO 8601
-            imgdate=utilities.readbinary(meta,offset,start,stop)[0:14] #Keep time, strip off milliseconds
+            imgdate=summary['imgdate'][0:14] #Keep time, strip off milliseconds
             self.metadata['imgdate'] = time.strftime(utilities.datetimeformat,time.strptime(imgdate,'%Y%m%d%H%M%S'))            #SAR Channels
-            start,stop = 389,392
-            nbands = int(utilities.readbinary(meta,offset,start,stop))
+            nbands = summary['nbands']
             
             #Radar wavelength
-            start,stop = 501,516
-            wavelen = utilities.readbinary(meta,offset,start,stop)
+            wavelen = summary['wavelength']
             extra_md['wavelength']=wavelen
             
             #Nominal offnadir angle
-            start,stop = 1839,1854
-            self.metadata['viewangle'] = utilities.readbinary(meta,offset,start,stop)
+            self.metadata['viewangle'] = summary['viewangle']
 
             #Map projection data
-            offset += 4096
             #Cols & rows
-            start,stop = 61,76
-            ncols = int(utilities.readbinary(meta,offset,start,stop))
-            start,stop = 77,92
-            nrows = int(utilities.readbinary(meta,offset,start,stop))
+            ncols = mapproj['ncols']
+            nrows = mapproj['nrows']
             #cell sizes (metres)
-            start,stop = 93,124
-            ypix,xpix = map(float,utilities.readbinary(meta,offset,start,stop).split())
+            ypix,xpix = map(float,mapproj['cellsize'].split())
 
 
             #Orientation at output scene centre
-            start,stop = 125,140
-            rot = math.radians(float(utilities.readbinary(meta,offset,start,stop)))
+            rot = math.radians(mapproj['rotation'])
             #GeogCS
             src_srs=osr.SpatialReference()
             #src_srs.SetGeogCS('GRS 1980','GRS 1980','GRS 1980',6378137.00000,298.2572220972)
             src_srs.SetWellKnownGeogCS( "WGS84" )
             #Proj CS
-            start,stop = 413,444
-            projdesc = utilities.readbinary(meta,offset,start,stop)
+            projdesc = mapproj['projdesc']
             epsg=0#default
             if projdesc == 'UTM-PROJECTION':
-                nZone = int(utilities.readbinary(meta,offset,477,480))
-                dfFalseNorthing = float(utilities.readbinary(meta,offset,497,512))
+                nZone = int(mapproj['utmzone'])
+                dfFalseNorthing = float(mapproj['falsenorthing'])
                 if dfFalseNorthing > 0.0:
                     bNorth=False
                     epsg=32700+nZone
@@ -217,19 +259,19 @@ class Dataset(__default__.Dataset):
                 src_srs.ImportFromEPSG(epsg)
                 #src_srs.SetUTM(nZone,bNorth) #generates WKT that osr.SpatialReference.AutoIdentifyEPSG() doesn't return an EPSG for
             elif projdesc == 'UPS-PROJECTION':
-                dfCenterLon = float(utilities.readbinary(meta,offset,625,640))
-                dfCenterLat = float(utilities.readbinary(meta,offset,641,656))
-                dfScale = float(utilities.readbinary(meta,offset,657,672))
+                dfCenterLon = float(mapproj['upscentrelon'])
+                dfCenterLat = float(mapproj['upscentrelat'])
+                dfScale = float(mapproj['upsscale'])
                 src_srs.SetPS(dfCenterLat,dfCenterLon,dfScale,0.0,0.0) 	
             elif projdesc == 'MER-PROJECTION':
-                dfCenterLon = float(utilities.readbinary(meta,offset,737,752))
-                dfCenterLat = float(utilities.readbinary(meta,offset,753,768))
+                dfCenterLon = float(mapproj['centrelon'])
+                dfCenterLat = float(mapproj['centrelat'])
                 src_srs.SetMercator(dfCenterLat,dfCenterLon,0,0,0)
             elif projdesc == 'LCC-PROJECTION':
-                dfCenterLon = float(utilities.readbinary(meta,offset,737,752))
-                dfCenterLat = float(utilities.readbinary(meta,offset,753,768))
-                dfStdP1 = float(utilities.readbinary(meta,offset,769,784))
-                dfStdP2 = float(utilities.readbinary(meta,offset,785,800))
+                dfCenterLon = float(mapproj['centrelon'])
+                dfCenterLat = float(mapproj['centrelat'])
+                dfStdP1 = float(mapproj['stdparallel1'])
+                dfStdP2 = float(mapproj['stdparallel2'])
                 src_srs.SetLCC(dfStdP1,dfStdP2,dfCenterLat,dfCenterLon,0,0)
             srs=src_srs.ExportToWkt()
             if not epsg:epsg = spatialreferences.IdentifyAusEPSG(srs)
@@ -237,7 +279,7 @@ class Dataset(__default__.Dataset):
 
             #UL-LR coords
             ##ext=[float(coord)*1000 for coord in utilities.readbinary(meta,offset,945,1072).split()] #Get lat/lon instead of eastings/northings
-            ext=[float(coord) for coord in utilities.readbinary(meta,offset,1073,1200).split()]
+            ext=[float(coord) for coord in mapproj['latlons'].split()]
             uly,ulx,ury,urx,lry,lrx,lly,llx=ext
             ext=[[ulx,uly],[urx,ury],[lrx,lry],[llx,lly],[ulx,uly]] #last xy pair closes the poly
 
@@ -264,16 +306,14 @@ class Dataset(__default__.Dataset):
                 level='ORTHOCORRECTED'
                 __default__.Dataset.__getmetadata__(self, self._imgs[0])
 
-            meta = open(led,'rb').read()
             recordlength = 4680
-
-            #Record 2 - Scene header record
-            record=2
+            with utilities.mapfile(led) as meta:
+                scene=_sceneheader.read(meta,(2-1)*recordlength) #Record 2 - Scene header record
+                if not tif:mapproj=_mapprojection.read(meta,(3-1)*recordlength) #Record 3 - Map projection (scene-related) ancillary record
 
             #Processing level
             if not tif:
-                start,stop = 21,36
-                procinfo = utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+                procinfo = scene['procinfo']
                 level=procinfo[1:4]
                 #if level != '1B2':raise Exception, 'Level %s PRISM is not supported' % level
                 self.metadata['level']==procinfo[1:4]
@@ -281,9 +321,8 @@ class Dataset(__default__.Dataset):
                 if opt!='':level+='-'+opt
 
             #SceneID
-            if level[0:3] == '1B2':start,stop = 197,212
-            else:start,stop = 37,52
-            sceneid = utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+            if level[0:3] == '1B2':sceneid = scene['sceneid1B2']
+            else:sceneid = scene['sceneid']
 
             #Lat/Lon of scene center
             ##if level[0:3] == '1B2':start,stop = 245,276
@@ -296,30 +335,24 @@ class Dataset(__default__.Dataset):
             ##cenrow, cencol=map(float,utilities.readbinary(meta,(record-1)*recordlength,start,stop).split())
 
             #Orientation Angle NNN.N = degrees
-            start,stop = 277,292
-            rot = float(utilities.readbinary(meta,(record-1)*recordlength,start,stop))
+            rot = scene['rotation']
 
             #Ascending/descendit orbit
-            start,stop = 357,372
-            orbit = utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+            orbit = scene['orbit']
 
             #view, sun elevation and azimuth angles
-            start,stop = 373,388
-            self.metadata['viewangle'] = utilities.readbinary(meta,(record-1)*recordlength,start,stop)
-            start,stop = 453,466
-            sunangles = utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+            self.metadata['viewangle'] = scene['viewangle']
+            sunangles = scene['sunangles']
             self.metadata['sunelevation'] = sunangles[6:9].strip()
             self.metadata['sunazimuth']   = sunangles[11:].strip()
 
             #Image aquisition date
-            start,stop = 401,408
-            imgdate = utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+            imgdate = scene['imgdate']
             imgdate = time.strptime(imgdate,'%d%b%y') #DDMmmYY
             self.metadata['imgdate'] = time.strftime(utilities.dateformat,imgdate) #ISO 8601 
 
             #Sensor type and bands
-            start,stop = 443,452
-            sensor,bands=utilities.readbinary(meta,(record-1)*recordlength,start,stop).split()
+            sensor,bands=scene['sensorbands'].split()
             if sensor=='PSM':
                 self.metadata['sensor']='PRISM'
                 if sceneid[5] == 'N':  extra_md['SENSOR DIRECTION']='Nadir 35km'
@@ -332,49 +365,39 @@ class Dataset(__default__.Dataset):
 
             #Processing info
             if not tif:
-                start,stop = 467,478
-                procinfo = utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+                procinfo = scene['orientation']
                 orient=procinfo[-1]
                 if orient=='G':self.metadata['orientation']='Map oriented'
                 else:self.metadata['orientation']='Path oriented'
 
                 #No. bands
-                start,stop = 1413,1428
-                nbands = int(utilities.readbinary(meta,(record-1)*recordlength,start,stop))
+                nbands = int(scene['nbands'])
 
                 #No. cols
-                start,stop = 1429,1444
-                ncols = float(utilities.readbinary(meta,(record-1)*recordlength,start,stop))
+                ncols = float(scene['ncols'])
 
                 #No. rows
-                start,stop = 1445,1460
-                nrows = float(utilities.readbinary(meta,(record-1)*recordlength,start,stop))
+                nrows = float(scene['nrows'])
 
             #Resampling
-            start,stop = 1541,1556
-            res = utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+            res = scene['resampling']
             if   res=='NNNNN':self.metadata['resampling']=''      #Raw (L1A,L1B1)
             elif res=='YNNNN':self.metadata['resampling']='NN'    #Nearest neighbour
             elif res=='NYNNN':self.metadata['resampling']='BL'    #Bi-linear
             elif res=='NNYNN':self.metadata['resampling']='CC'    #Cubic convolution
             
             #Lat/Lon extent
-            start,stop = 1733,1860
-            coords = utilities.readbinary(meta,(record-1)*recordlength,start,stop).split()
+            coords = scene['latlons'].split()
             uly,ulx,ury,urx,lly,llx,lry,lrx = map(float, coords)
             ext=[[ulx,uly],[urx,ury],[lrx,lry],[llx,lly],[ulx,uly]]
 
             if not tif:
                 #Record 3
-                record=3
-
                 #Hemisphere
-                start,stop = 93,96
-                hemi = utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+                hemi = mapproj['hemisphere']
 
                 #UTM Zone - revisit if we get polarstereographic projection products
-                start,stop = 97,108
-                utm = utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+                utm = mapproj['utmzone']
                 if hemi=='1': #South
                     epsg=int('327%s' % utm) #Assume WGS84
                 else:         #North
@@ -389,12 +412,10 @@ class Dataset(__default__.Dataset):
                 ##cenx = float(utilities.readbinary(meta,(record-1)*recordlength,start,stop)) * 1000 #(Easting - km)
 
                 #Orientation Angle NNN.N = radians
-                start,stop = 205,220
-                rot = float(utilities.readbinary(meta,(record-1)*recordlength,start,stop))
+                rot = mapproj['rotation']
 
                 #Pixel size (x)
-                start,stop=541,572
-                xpix,ypix=map(float,utilities.readbinary(meta,(record-1)*recordlength,start,stop).split())
+                xpix,ypix=map(float,mapproj['cellsize'].split())
 
                 #Get extent of scene
                 ##xmin=(cenx+xpix/2)-(cencol*xpix)
@@ -441,10 +462,7 @@ class Dataset(__default__.Dataset):
                 self._imgs.sort()
                 img=self._imgs[0]
                 meta = open(img,'rb').read(1024)
-                start,stop = 187,192
-                record=1
-                recordlength=0
-                offset=utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+                offset=_imagedescriptor.read(meta)['prefix']
                 #don't use ALOS provided no. cols, as it doesn't include 'dummy' pixels
                 #vrt=geometry.CreateRawRasterVRT(self._imgs,self.metadata['cols'],self.metadata['rows'],self.metadata['datatype'],offset,byteorder='MSB')
                 vrt=geometry.CreateRawRasterVRT(self._imgs,offset,nrows,self.metadata['datatype'],offset,byteorder='MSB')
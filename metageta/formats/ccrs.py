@@ -46,7 +46,28 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
-gdal.AllRegister()
+
+#Leader file record layouts, byte positions are from the format specification
+_recordlength=4320 #LS 5
+_sceneheader=utilities.RecordLayout({ #Record 2 - Scene header record
+    'sceneid':     (37,52),
+    'imgdate':     (117,148),
+    'pathrow':     (165,180),
+    'satellite':   (309,324),
+    'orbit':       (357,372), #Ascending/descending flag
+    'level':       (1573,1588),
+    'bands':       (1653,1659)
+})
+_mapprojection=utilities.RecordLayout({ #Record 3 - Map projection (scene-related) ancillary record
+    'ncols':       (333,348,float),
+    'nrows':       (349,364,float),
+    'cellsize':    (365,396),
+    'projection':  (397,412),
+    'rotation':    (445,460,float),
+    'sunelevation':(605,620,float),
+    'sunazimuth':  (621,636,float),
+    'latlons':     (765,892)
+})
 
 class Dataset(__dataset__.Dataset): #Subclass of base Dataset class
     def __init__(self,f=None):
@@ -55,9 +76,7 @@ class Dataset(__dataset__.Dataset): #Subclass of base Dataset class
         if f[:4]=='/vsi':raise NotImplementedError
         self.filelist=[r for r in utilities.rglob(os.path.dirname(f))] #everything in this dir and below.
 
-        led=glob.glob(os.path.dirname(f) + '/[Ll][Ee][Aa][Dd]*')[0] #volume file
-
-        meta = open(led,'rb').read()
+        led=utilities.glob(os.path.dirname(f) + '/[Ll][Ee][Aa][Dd]*')[0] #volume file
 
         '''
         metadata has 4 records, each is 4320 (LS) or 6120 (SPOT) bytes long:
@@ -67,10 +86,10 @@ class Dataset(__dataset__.Dataset): #Subclass of base Dataset class
         Radiometric transformation ancillary record.
         '''
 
-        #Record 2 - Scene header record
-        record=2
-        recordlength=4320 #LS 5
-        satellite=utilities.readbinary(meta,(record-1)*recordlength,309,324)
+        with utilities.mapfile(led) as meta:
+            #Record 2 - Scene header record
+            record=2
+            satellite=utilities.readbinary(meta,(record-1)*_recordlength,309,324)
         if not satellite[0:7] == 'LANDSAT':
             raise NotImplementedError #This error gets ignored in __init__.Open()
     def __getmetadata__(self,f=None):
@@ -78,9 +97,7 @@ class Dataset(__dataset__.Dataset): #Subclass of base Dataset class
         if not f:f=self.fileinfo['filepath']
         self._gdaldataset = geometry.OpenDataset(f)
 
-        led=glob.glob(os.path.dirname(f) + '/[Ll][Ee][Aa][Dd]*')[0] #volume file
-
-        meta = open(led,'rb').read()
+        led=utilities.glob(os.path.dirname(f) + '/[Ll][Ee][Aa][Dd]*')[0] #volume file
 
         '''
         metadata has 4 records, each is 4320 (LS) or 6120 (SPOT) bytes long:
@@ -89,71 +106,55 @@ class Dataset(__dataset__.Dataset): #Subclass of base Dataset class
         Map projection (scene-related) ancillary record;
         Radiometric transformation ancillary record.
         '''
+        with utilities.mapfile(led) as meta:
+            scene=_sceneheader.read(meta,(2-1)*_recordlength)     #Record 2 - Scene header record
+            mapproj=_mapprojection.read(meta,(3-1)*_recordlength) #Record 3 - Map projection (scene-related) ancillary record
 
-        #Record 2 - Scene header record
-        record=2
-        recordlength=4320 #LS 5
-        satellite=utilities.readbinary(meta,(record-1)*recordlength,309,324)
+        satellite=scene['satellite']
             
         #Scene ID, path/row & image date/time
-        start,stop=37,52
-        sceneid=utilities.readbinary(meta,(record-1)*recordlength,start,stop)
-        start,stop=165,180
-        pathrow=utilities.readbinary(meta,(record-1)*recordlength,start,stop)[1:]
-        start,stop=117,148
-        imgdate=utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+        sceneid=scene['sceneid']
+        pathrow=scene['pathrow'][1:]
+        imgdate=scene['imgdate']
         self.metadata['imgdate']=time.strftime(utilities.datetimeformat,time.strptime(imgdate[0:14],'%Y%m%d%H%M%S')) #ISO 8601 
         
         #Ascending/descending flag
-        start,stop=357,372
-        if utilities.readbinary(meta,(record-1)*recordlength,start,stop) == 'D':self.metadata['orbit']='Descending'
+        if scene['orbit'] == 'D':self.metadata['orbit']='Descending'
         else:self.metadata['orbit']='Ascending'
 
         #Processing level
-        start,stop=1573,1588
-        self.metadata['level']=utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+        self.metadata['level']=scene['level']
 
         #Bands
-        start,stop=1653,1659
         bands=[]
-        actbands=utilities.readbinary(meta,(record-1)*recordlength,start,stop)
+        actbands=scene['bands']
         for i in range(0,7): #Loop thru the 7 LS 5 bands
             if actbands[i]=='1':bands.append(str(i+1))
             self._gdaldataset.GetRasterBand(i+1).SetNoDataValue(0)
         
         #Record 3 - Map projection (scene-related) ancillary record
-        record=3
-
         #Bands, rows & columns and rotation
         nbands = int(self._gdaldataset.RasterCount)
-        start,stop=333,348
-        ncols=float(utilities.readbinary(meta,(record-1)*recordlength,start,stop))
-        start,stop=349,364
-        nrows=float(utilities.readbinary(meta,(record-1)*recordlength,start,stop))
-        start,stop =  445,460
-        self.metadata['rotation']=float(utilities.readbinary(meta,(record-1)*recordlength,start,stop))
+        ncols=mapproj['ncols']
+        nrows=mapproj['nrows']
+        self.metadata['rotation']=mapproj['rotation']
         if abs(self.metadata['rotation']) < 1:
             self.metadata['orientation']='Map oriented'
             self.metadata['rotation']=0.0
         else:self.metadata['orientation']='Path oriented'
 
         #Sun elevation and azimuth
-        start,stop=605,620
-        self.metadata['sunelevation']=float(utilities.readbinary(meta,(record-1)*recordlength,start,stop))
-        start,stop=621,636
-        self.metadata['sunazimuth']=float(utilities.readbinary(meta,(record-1)*recordlength,start,stop))
+        self.metadata['sunelevation']=mapproj['sunelevation']
+        self.metadata['sunazimuth']=mapproj['sunazimuth']
         
         #geometry.CellSizes
-        start,stop = 365,396
-        (cellx,celly) = map(float,utilities.readbinary(meta,(record-1)*recordlength,start,stop).split())
-        start,stop = 397,412
-        projection = utilities.readbinary(meta,(record-1)*recordlength,start,stop).split()
+        (cellx,celly) = map(float,mapproj['cellsize'].split())
+        projection = mapproj['projection'].split()
         datum = projection[0]
         zone = projection[1]
 
         # lat/lons
-        start,stop =  765,892
-        coords = utilities.readbinary(meta,(record-1)*recordlength,start,stop).split()
+        coords = mapproj['latlons'].split()
         uly,ulx,ury,urx,lry,lrx,lly,llx = map(float, coords)
         ext=[[ulx,uly],[urx,ury],[lrx,lry],[llx,lly],[ulx,uly]]
         
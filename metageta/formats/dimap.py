@@ -40,11 +40,12 @@ format_regex=[r'(?<!vol_list)\.dim$',       #DIMAP - any *.dim (excluding vol_li
 #import base dataset modules
 #import __dataset__
 import __default__
+import __xml__
 
 # import other modules
-import sys, os, re, glob, time, math, string
+import sys, os, re, glob, time, math, string, uuid
+from xml.sax.saxutils import escape
 from metageta import utilities, geometry
-from lxml import etree
 
 try:
     from osgeo import gdal
@@ -56,7 +57,35 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
-gdal.AllRegister()
+
+_paths={
+    'version':'//METADATA_FORMAT/@version',
+    'quicklook':'//DATASET_QL_PATH/@href',
+    #DIMAP V1
+    'v1_sceneid':'/Dimap_Document/Dataset_Id/DATASET_NAME',
+    'v1_bands':'/Dimap_Document/Spectral_Band_Info/BAND_DESCRIPTION',
+    'v1_datafile':'/Dimap_Document/Data_Access/Data_File/DATA_FILE_PATH/@href',
+    'v1_scenes':'//Scene_Source',
+    'v1_processing':'/Dimap_Document/Data_Processing',
+    #DIMAP V2
+    'v2_sceneid':'/Dimap_Document/Dataset_Identification/DATASET_NAME',
+    'v2_ncols':'//NCOLS',
+    'v2_nrows':'//NROWS',
+    'v2_nbands':'//NBANDS',
+    'v2_nbits':'//NBITS',
+    'v2_red':'//RED_CHANNEL',
+    'v2_green':'//GREEN_CHANNEL',
+    'v2_blue':'//BLUE_CHANNEL',
+    'v2_tiled':'//DATA_FILE_TILES',
+    'v2_ntiles':'//NTILES_COUNT',
+    'v2_datafiles':'//Data_File',
+    'v2_datafile':'//DATA_FILE_PATH/@href',
+    'v2_sources':'//Source_Identification',
+    'v2_geometry':'//Located_Geometric_Values',
+    'v2_level':'//Processing_Information/Product_Settings/PROCESSING_LEVEL',
+    'v2_resampling':'//Processing_Information/Product_Settings/Sampling_Settings/RESAMPLING_KERNEL',
+}
+'''XML paths the driver reads, the rest of the document is skipped'''
 
 class Dataset(__default__.Dataset):
     '''Subclass of __default__.Dataset class so we get a load of metadata populated automatically'''
@@ -67,17 +96,12 @@ class Dataset(__default__.Dataset):
             raise NotImplementedError
         '''Open the dataset'''
         if not f:f=self.fileinfo['filepath']
-        self.filelist=[r for r in glob.glob('%s/*'%os.path.dirname(f))]
+        self.filelist=[r for r in utilities.glob('%s/*'%os.path.dirname(f))]
 
-        #dom=etree.parse(f) #Takes tooo long to parse the whole file, so just read as far as we need...
-        strxml=''
-        for line in open(f, 'r'):
-            if line.upper().strip()=='<DATA_STRIP>':break
-            else: strxml+=line
-        if not '</Dimap_Document>' in strxml:strxml+='</Dimap_Document>'
-        self._dom=etree.fromstring(strxml)
+        #Parsing the whole file takes tooo long, so just stream through as far as we need...
+        self._xml=__xml__.read(f,_paths,stop='Data_Strip')
 
-        self.dimap_version=map(int, self._dom.xpath('string(//*/METADATA_FORMAT/@version)').split('.'))
+        self.dimap_version=map(int, self._xml.string('version').split('.'))
         if self.dimap_version[0]>2:
             import warnings
             warnings.warn('DIMAP V%s is not supported'%self.dimap_version[0])
@@ -94,40 +118,32 @@ class Dataset(__default__.Dataset):
             self.v2(f)
 
     def v1(self,f=None):
-        dom = self._dom
-        self.metadata['sceneid'] = dom.xpath('string(/Dimap_Document/Dataset_Id/DATASET_NAME)')
-        bands=dom.xpath('/Dimap_Document/Spectral_Band_Info/BAND_DESCRIPTION')
-        self.metadata['bands']=','.join([band.xpath('string(.)') for band in bands])
+        xml = self._xml
+        self.metadata['sceneid'] = xml.string('v1_sceneid')
+        self.metadata['bands']=','.join([band.xpath('string(.)') for band in xml['v1_bands']])
 
         try:__default__.Dataset.__getmetadata__(self, f) #autopopulate basic metadata
         except geometry.GDALError,err: #Work around reading images with lowercase filenames when
                                        #the DATA_FILE_PATH is uppercase
                                        # - eg samba filesystems which get converted to lowercase
 
-            dfp=dom.xpath('/Dimap_Document/Data_Access/Data_File/DATA_FILE_PATH')[0]
-            fn=utilities.encode(dfp.xpath('string(@href)')) #XML is unicode, gdal.Open doesn't like unicode
+            fn=utilities.encode(xml.string('v1_datafile')) #XML is unicode, gdal.Open doesn't like unicode
             if not os.path.dirname(fn):fn=os.path.join(os.path.dirname(f),fn)
             exists,img=utilities.exists(fn,True)
             if exists and not os.path.exists(fn):
-                import tempfile
-                tmpfd,tmpfn=tempfile.mkstemp(suffix='.dim',prefix='metadata')
-                dfp.set('href',img)
-                tmpfo=os.fdopen(tmpfd,'w')
-                tmpfo.write(etree.tostring(dom))
-                tmpfo.flush()
-                tmpfo.close()
-                cwd=os.path.abspath(os.curdir)
-                tmp=os.path.split(tmpfn)
-                os.chdir(tmp[0]) #CD to the tmp dir so __default__.Dataset.__getmetadata__ doesn't
-                __default__.Dataset.__getmetadata__(self, tmp[1])
-                gdalmd=self._gdaldataset.GetMetadata()
-                self._gdaldataset=geometry.OpenDataset(img)
-                self._gdaldataset.SetMetadata(gdalmd)
-                os.unlink(tmpfn)
-                os.chdir(cwd)
+                #Point a copy of the DIMAP document at the real image in memory (not in a temp file)
+                dim='/vsimem/metadata%s.dim'%uuid.uuid4().hex
+                href=re.compile(r'(<DATA_FILE_PATH\s[^>]*href\s*=\s*["\'])[^"\']*')
+                geometry.write_vsi(dim,href.sub(lambda m:m.group(1)+escape(img),open(f).read(),1))
+                try:
+                    __default__.Dataset.__getmetadata__(self, dim)
+                    gdalmd=self._gdaldataset.GetMetadata()
+                    self._gdaldataset=geometry.OpenDataset(img)
+                    self._gdaldataset.SetMetadata(gdalmd)
+                finally:gdal.Unlink(dim)
             else:raise
         dates={}
-        for src in dom.xpath('//Scene_Source'):
+        for src in xml['v1_scenes']:
             datetime='%sT%s'%(src.xpath('string(IMAGING_DATE)'),src.xpath('string(IMAGING_TIME)'))
             dts=time.mktime(time.strptime(datetime,utilities.datetimeformat))#ISO 8601
             dates[dts]=datetime
@@ -148,41 +164,42 @@ class Dataset(__default__.Dataset):
 
         #Processing, store in lineage field
         lineage=[]
-        for step in dom.find('Data_Processing').getchildren():
-            lineage.append('%s: %s' % (step.tag.replace('_',' '), step.text.replace('_',' ')))
+        for processing in xml['v1_processing']:
+            for step in processing.getchildren():
+                lineage.append('%s: %s' % (step.tag.replace('_',' '), step.text.replace('_',' ')))
         self.metadata['lineage']='\n'.join(lineage)
 
     def v2(self,f=None):
         if not f:f=self.fileinfo['filepath']
-        dom = self._dom
-        self.metadata['sceneid'] = dom.xpath('string(/Dimap_Document/Dataset_Identification/DATASET_NAME)')
+        xml = self._xml
+        self.metadata['sceneid'] = xml.string('v2_sceneid')
         try:
             self._gdaldataset=geometry.OpenDataset(f)
             __default__.Dataset.__getmetadata__(self) #autopopulate basic metadata
         except:
-            ncols=dom.xpath('number(//*/NCOLS)')
-            nrows=dom.xpath('number(//*/NROWS)')
-            nbands=dom.xpath('number(//*/NBANDS)')
-            nbits=dom.xpath('number(//*/NBITS)')
+            ncols=xml.number('v2_ncols')
+            nrows=xml.number('v2_nrows')
+            nbands=xml.number('v2_nbands')
+            nbits=xml.number('v2_nbits')
             if nbits==16:datatype='UInt16'
             else:datatype='Byte'
             if nbands==1:
                 bands=[1]
             else:
-                bands=[int(b[1:]) for b in [dom.xpath('string(//*/RED_CHANNEL)'),
-                                        dom.xpath('string(//*/GREEN_CHANNEL)'),
-                                        dom.xpath('string(//*/BLUE_CHANNEL)')]]
+                bands=[int(b[1:]) for b in [xml.string('v2_red'),
+                                        xml.string('v2_green'),
+                                        xml.string('v2_blue')]]
             self.metadata['bands']=','.join(map(str,bands))
 
-            if dom.xpath('string(//*/DATA_FILE_TILES)')=='true':
+            if xml.string('v2_tiled')=='true':
                 import math
-                ntiles=dom.xpath('number(//*/NTILES)')
-                if dom.xpath('boolean(//*/NTILES_COUNT/@ntiles_x)'):
-                    ntiles_x=dom.xpath('number(//*/NTILES_COUNT/@ntiles_x)')
-                    ntiles_y=dom.xpath('number(//*/NTILES_COUNT/@ntiles_y)')
-                elif dom.xpath('boolean(//*/NTILES_COUNT/@ntiles_C)'):
-                    ntiles_x=dom.xpath('number(//*/NTILES_COUNT/@ntiles_C)')
-                    ntiles_y=dom.xpath('number(//*/NTILES_COUNT/@ntiles_R)')
+                ntiles=xml['v2_ntiles'][0]
+                if ntiles.get('ntiles_x'):
+                    ntiles_x=float(ntiles.get('ntiles_x'))
+                    ntiles_y=float(ntiles.get('ntiles_y'))
+                elif ntiles.get('ntiles_C'):
+                    ntiles_x=float(ntiles.get('ntiles_C'))
+                    ntiles_y=float(ntiles.get('ntiles_R'))
 
                 tile_cols=math.ceil(ncols/ntiles_x)
                 last_tile_cols=tile_cols-(ntiles_x*tile_cols-ncols)
@@ -190,7 +207,7 @@ class Dataset(__default__.Dataset):
                 last_tile_rows=tile_rows-(ntiles_y*tile_rows-nrows)
                 srcrects,dstrects=[],[]
                 files=[]
-                for df in dom.xpath('//*/Data_File'):
+                for df in xml['v2_datafiles']:
                     col=df.xpath('number(@tile_C)')
                     row=df.xpath('number(@tile_R)')
                     datafile=os.path.join(os.path.dirname(f),df.xpath('string(DATA_FILE_PATH/@href)'))
@@ -216,14 +233,14 @@ class Dataset(__default__.Dataset):
                 self._gdaldataset.SetProjection(ds.GetProjection())
 
             else:
-                datafile=os.path.join(os.path.dirname(f),dom.xpath('string(//*/DATA_FILE_PATH/@href)'))
+                datafile=os.path.join(os.path.dirname(f),xml.string('v2_datafile'))
                 exists,datafile=utilities.exists(datafile,True)
                 self._gdaldataset=geometry.OpenDataset(datafile)
 
             __default__.Dataset.__getmetadata__(self)
 
         dates={}
-        for src in dom.xpath('//Source_Identification'):
+        for src in xml['v2_sources']:
             datetime='%sT%s'%(src.xpath('string(//*/IMAGING_DATE)'),src.xpath('string(//*/IMAGING_TIME)')[:8])
             dts=time.mktime(time.strptime(datetime,utilities.datetimeformat))#ISO 8601
             dates[dts]=datetime
@@ -235,23 +252,22 @@ class Dataset(__default__.Dataset):
         self.metadata['satellite']='%s %s' % (src.xpath('string(//*/MISSION)'),src.xpath('string(//*/MISSION_INDEX)'))
         try:self.metadata['sensor']='%s %s' % (src.xpath('string(//*/INSTRUMENT)'),src.xpath('string(//*/INSTRUMENT_INDEX)'))
         except:self.metadata['sensor']='%s' % src.xpath('string(//*/INSTRUMENT)')
+        center=[g for g in xml['v2_geometry'] if g.xpath('string(LOCATION_TYPE)')=='Center']
         try:
-            sunangles=dom.xpath('//*/Located_Geometric_Values[LOCATION_TYPE="Center"]/Solar_Incidences')[0]
+            sunangles=center[0].xpath('Solar_Incidences')[0]
             self.metadata['sunelevation'] = sunangles.xpath('number(SUN_ELEVATION)')
             self.metadata['sunazimuth'] = sunangles.xpath('number(SUN_AZIMUTH)')
         except:pass
         try:
-            self.metadata['viewangle'] = dom.xpath('number(//*/Located_Geometric_Values[LOCATION_TYPE="Center"]/Acquisition_Angles/VIEWING_ANGLE)')
-            self.metadata['satelevation'] = dom.xpath('number(//*/Located_Geometric_Values[LOCATION_TYPE="Center"]/Acquisition_Angles/INCIDENCE_ANGLE)')
-            self.metadata['satazimuth'] = dom.xpath('number(//*/Located_Geometric_Values[LOCATION_TYPE="Center"]/Acquisition_Angles/AZIMUTH_ANGLE)')
+            self.metadata['viewangle'] = center[0].xpath('number(Acquisition_Angles/VIEWING_ANGLE)')
+            self.metadata['satelevation'] = center[0].xpath('number(Acquisition_Angles/INCIDENCE_ANGLE)')
+            self.metadata['satazimuth'] = center[0].xpath('number(Acquisition_Angles/AZIMUTH_ANGLE)')
         except:pass
 
-        try:self.metadata['level'] = dom.xpath('string(//*/Processing_Information/Product_Settings/PROCESSING_LEVEL)')
-        except:pass
-        try:self.metadata['resampling'] = dom.xpath('string(//*/Processing_Information/Product_Settings/Sampling_Settings/RESAMPLING_KERNEL)')
-        except:pass
+        self.metadata['level'] = xml.string('v2_level')
+        self.metadata['resampling'] = xml.string('v2_resampling')
 
-        self.metadata['metadata']=etree.tostring(dom, pretty_print=True)
+        self.metadata['metadata']=__xml__.text(f,'Data_Strip',xml.root)
         #Get cloud cover from MASKS/CLD_*_MSK.GML???
 
 
@@ -282,15 +298,13 @@ class Dataset(__default__.Dataset):
         try:
             #First check for a browse graphic, no point re-inventing the wheel...
             f=self.fileinfo['filepath']
-            #if self.dimap_version[0]==1:
-            #    fp=self._dom.xpath('/Dimap_Document/Dataset_Id/DATASET_QL_PATH')[0]
-            #else:
-            #    fp=self._dom.xpath('/Dimap_Document/Dataset_Identification/DATASET_QL_PATH')[0]
-            fp=self._dom.xpath('string(//*/DATASET_QL_PATH/@href)')
+            fp=self._xml.string('quicklook')
             fn=utilities.encode(fp) #XML is unicode, gdal.Open doesn't like unicode
             browse=os.path.join(os.path.dirname(f),fn)
 
-            if os.path.exists(browse) and gdal.Open(browse).RasterXSize >= width:
+            if isinstance(width,(list,tuple)):widest=max(width)
+            else:widest=width
+            if os.path.exists(browse) and gdal.Open(browse).RasterXSize >= widest:
                 return overviews.resize(browse,outfile,width)
 
         except:pass
@@ -29,6 +29,7 @@ format_regex=[r'\.hdr$']
 #import base dataset modules
 #import __dataset__
 import __default__
+import __header__
 
 # import other modules
 import sys, os,glob
@@ -93,7 +94,8 @@ class Dataset(__default__.Dataset):
                 hdr['file type']+=' Standard'
                 tmph.write('ENVI\n')
                 for key in hdr:
-                    if '\n' in hdr[key]:tmph.write(key+' = {'+hdr[key]+'}\n')
+                    if isinstance(hdr[key],tuple):tmph.write(key+' = {'+', '.join(hdr[key])+'}\n') #A (...) list
+                    elif '\n' in hdr[key]:tmph.write(key+' = {'+hdr[key]+'}\n')
                     else: tmph.write(key+' = '+hdr[key]+'\n')
                 tmph.close()
                 tmpf.write('\x00\x00')
@@ -125,23 +127,4 @@ class Dataset(__default__.Dataset):
             else:raise #not the dodgy SSD files, re-raise the orig. error
             
     def __parseheader__(self):
-        hdr=open(self.fileinfo['filepath']).readlines()
-        md={}
-        i=1 #Skip the ENVI line
-        while True: #Extract all keys and values from the header file into a dictionary
-            line=hdr[i].strip()
-            if line.find('{') > -1:
-                var=[s.strip() for s in line.replace('{','').split('=',1)]
-                if line.find('}') == -1:
-                    i+=1
-                    while True:
-                        line=hdr[i].strip()
-                        var[1] += '\n'+line
-                        if line.find('}') > -1:break
-                        i+=1
-                var[1]=var[1].replace('}','')
-            else:var=[s.strip() for s in line.split('=',1)]
-            md[var[0]]=var[1]
-            i+=1
-            if i >=len(hdr):break
-        return md
+        return __header__.read(self.fileinfo['filepath'])
@@ -37,7 +37,7 @@ import __default__
 
 # import other modules (use "_"  prefix to import privately)
 import sys, os, glob
-from metageta import geometry
+from metageta import geometry, utilities
 
 class Dataset(__default__.Dataset): 
     '''Subclass of __default__.Dataset class so we get a load of metadata populated automatically'''
@@ -72,7 +72,7 @@ class Dataset(__default__.Dataset):
     def getoverview(self,outfile=None,width=800,format='JPG'):
         '''Override the default method if there is a .clr file'''
         from metageta import overviews
-        clr=glob.glob(self.fileinfo['filepath'][:-3]+'[cC][lL][rR]')
+        clr=utilities.glob(self.fileinfo['filepath'][:-3]+'[cC][lL][rR]')
         if clr:
             clr=overviews.ParseColourLUT(clr[0])
             self._stretch=['COLOURTABLELUT',[1],[clr]]
@@ -45,8 +45,8 @@ class Dataset(__default__.Dataset):
         self.__setfileinfo__(f)
         #self.fileinfo['filepath']=f
         #self.fileinfo['filename']=os.path.basename(f)
-        filelist=glob.glob(f+'.*')
-        filelist.extend(glob.glob(f+'/*'))
+        filelist=utilities.glob(f+'.*')
+        filelist.extend(utilities.glob(f+'/*'))
         self.filelist=filelist #Resolves Issue 41 - self.filelist is a property, we can only get or set it, not extend it.
 
     def __getmetadata__(self):
@@ -63,7 +63,7 @@ class Dataset(__default__.Dataset):
         #Check for clr file first
         clr=[self.fileinfo['filepath']+'.[cC][lL][rR]',os.path.join(self.fileinfo['filepath'],'[cC][lL][rR].[aA][dD][fF]')]
         for c in clr:
-            c=glob.glob(c)
+            c=utilities.glob(c)
             if c:
                 clr=overviews.ParseColourLUT(c[0])
                 self._stretch=['COLOURTABLELUT',[1],[clr]]
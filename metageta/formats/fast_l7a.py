@@ -52,7 +52,6 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
-gdal.AllRegister()
 
 class Dataset(__dataset__.Dataset): 
     '''Subclass of base Dataset class'''
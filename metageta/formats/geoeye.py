@@ -46,7 +46,6 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
-gdal.AllRegister()
 
 class Dataset(__default__.Dataset):
     '''Subclass of __default__.Dataset class so we get a load of metadata populated automatically'''
@@ -55,7 +54,7 @@ class Dataset(__default__.Dataset):
         self.mdtxt=open(f).read()
         if 'Source Image Metadata' not in self.mdtxt:raise NotImplementedError
 
-        self.filelist=glob.glob(os.path.join(os.path.dirname(f),'*'))
+        self.filelist=utilities.glob(os.path.join(os.path.dirname(f),'*'))
 
     def __getmetadata__(self):
         '''Read Metadata for a GeoEye format image (IKONOS, GeoEye-1)
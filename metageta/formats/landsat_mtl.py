@@ -31,16 +31,12 @@ format_regex=[r'L.*\_MTL\.txt$']#  - Standard file names
 
 #import base dataset module
 import __default__
+import __header__
 
 # import other modules (use "_"  prefix to import privately)
 import sys, os, re, glob, time, math, string
 from metageta import utilities, geometry, spatialreferences
 
-try:
-    from collections import OrderedDict
-except:
-    from metageta.ordereddict import OrderedDict
-
 try:
     from osgeo import gdal
     from osgeo import gdalconst
@@ -51,20 +47,19 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
-gdal.AllRegister()
 
 class Dataset(__default__.Dataset):
     '''Subclass of __default__.Dataset class so we get a load of metadata populated automatically'''
     def __init__(self,f):
         if f[:4]=='/vsi':raise NotImplementedError
-        self.filelist = glob.glob(os.path.dirname(f)+'/*')
+        self.filelist = utilities.glob(os.path.dirname(f)+'/*')
     def __getmetadata__(self):
         '''Read Metadata for a Landsat Geotiff with Level 1 Metadata format image as GDAL doesn't get it all.'''
         f=self.fileinfo['filepath']
         d=os.path.dirname(f)
         hdr=parseheader(f)
 
-        if hdr['L1_METADATA_FILE'].get('LANDSAT_SCENE_ID'):self.__getnewmetadata__(f,d,hdr)
+        if hdr.group('METADATA_FILE_INFO').get('LANDSAT_SCENE_ID'):self.__getnewmetadata__(f,d,hdr)
         else:self.__getoldmetadata__(f,d,hdr)
 
         md=self.metadata
@@ -81,109 +76,71 @@ class Dataset(__default__.Dataset):
 
     def __getnewmetadata__(self,f,d,hdr):
         '''Read Metadata for a Landsat Geotiff with new (>2012) Level 1 Metadata.'''
+        product=hdr.group('PRODUCT_METADATA')
 
-        #bands=[''.join(fnb.split('_')[3:]).replace('VCID','') for fnb in sorted(hdr['PRODUCT_METADATA'].keys()) if fnb.startswith('FILE_NAME_BAND')]
-        #self.bandfiles=[os.path.join(d,hdr['PRODUCT_METADATA'][fnb]) for fnb in sorted(hdr['PRODUCT_METADATA'].keys()) if fnb.startswith('FILE_NAME_BAND')]
-        bands=[''.join(fnb.split('_')[3:]).replace('VCID','') for fnb in hdr['PRODUCT_METADATA'].keys() if fnb.startswith('FILE_NAME_BAND')]
-        self.bandfiles=[os.path.join(d,hdr['PRODUCT_METADATA'][fnb]) for fnb in hdr['PRODUCT_METADATA'].keys() if fnb.startswith('FILE_NAME_BAND')]
+        #bands=[''.join(fnb.split('_')[3:]).replace('VCID','') for fnb in sorted(product.keys()) if fnb.startswith('FILE_NAME_BAND')]
+        #self.bandfiles=[os.path.join(d,product[fnb]) for fnb in sorted(product.keys()) if fnb.startswith('FILE_NAME_BAND')]
+        bands=[''.join(fnb.split('_')[3:]).replace('VCID','') for fnb in product.keys() if fnb.startswith('FILE_NAME_BAND')]
+        self.bandfiles=[os.path.join(d,product[fnb]) for fnb in product.keys() if fnb.startswith('FILE_NAME_BAND')]
 
         __default__.Dataset.__getmetadata__(self, self.bandfiles[0])
 
         md=self.metadata
-        md['metadata']=open(f).read().replace('\x00','')
-        md['sceneid']=hdr['L1_METADATA_FILE']['LANDSAT_SCENE_ID']
+        md['metadata']=hdr.text.replace('\x00','')
+        md['sceneid']=hdr.group('METADATA_FILE_INFO')['LANDSAT_SCENE_ID']
         md['filetype'] = 'GTIFF/Landsat MTL Geotiff'
 
         md['bands']=','.join(bands)
         md['nbands']=len(bands)
-        md['level']=hdr['PRODUCT_METADATA']['DATA_TYPE']
-        md['imgdate']='%sT%s'%(hdr['PRODUCT_METADATA']['DATE_ACQUIRED'],hdr['PRODUCT_METADATA']['SCENE_CENTER_TIME'][0:8]) #ISO 8601 format, strip off the milliseconds
-        md['satellite']=hdr['PRODUCT_METADATA']['SPACECRAFT_ID']
-        md['sensor']=hdr['PRODUCT_METADATA']['SENSOR_ID']
-        md['demcorrection']=hdr['PRODUCT_METADATA'].get('ELEVATION_SOURCE','') #Level 1G isn't terrain corrected
-        md['resampling']=hdr['PROJECTION_PARAMETERS']['RESAMPLING_OPTION']
-        md['sunazimuth']=hdr['IMAGE_ATTRIBUTES']['SUN_AZIMUTH']
-        md['sunelevation']=hdr['IMAGE_ATTRIBUTES']['SUN_ELEVATION']
-        md['cloudcover']=hdr['IMAGE_ATTRIBUTES']['CLOUD_COVER']
+        md['level']=product['DATA_TYPE']
+        md['imgdate']='%sT%s'%(product['DATE_ACQUIRED'],product['SCENE_CENTER_TIME'][0:8]) #ISO 8601 format, strip off the milliseconds
+        md['satellite']=product['SPACECRAFT_ID']
+        md['sensor']=product['SENSOR_ID']
+        md['demcorrection']=product.get('ELEVATION_SOURCE','') #Level 1G isn't terrain corrected
+        md['resampling']=hdr.group('PROJECTION_PARAMETERS')['RESAMPLING_OPTION']
+        md['sunazimuth']=hdr.group('IMAGE_ATTRIBUTES')['SUN_AZIMUTH']
+        md['sunelevation']=hdr.group('IMAGE_ATTRIBUTES')['SUN_ELEVATION']
+        md['cloudcover']=hdr.group('IMAGE_ATTRIBUTES')['CLOUD_COVER']
 
     def __getoldmetadata__(self,f,d,hdr):
         '''Read Metadata for a Landsat Geotiff with ol (pre 2012) Level 1 Metadata.'''
+        product=hdr.group('PRODUCT_METADATA')
 
-        bands=sorted([i for i in hdr['PRODUCT_METADATA']['BAND_COMBINATION']])
-        if hdr['PRODUCT_METADATA']['SENSOR_ID']=='ETM+': #Landsat 7 has 2 data files for thermal band 6
+        bands=sorted([i for i in product['BAND_COMBINATION']])
+        if product['SENSOR_ID']=='ETM+': #Landsat 7 has 2 data files for thermal band 6
             #Format=123456678
             bands[5]=bands[5].replace('6','61')
             bands[6]=bands[6].replace('6','62')
 
-        self.bandfiles=[os.path.join(d,hdr['PRODUCT_METADATA']['BAND%s_FILE_NAME'%b]) for b in bands]
+        self.bandfiles=[os.path.join(d,product['BAND%s_FILE_NAME'%b]) for b in bands]
 
         __default__.Dataset.__getmetadata__(self, self.bandfiles[0])
 
         md=self.metadata
-        md['metadata']=open(f).read().replace('\x00','')
+        md['metadata']=hdr.text.replace('\x00','')
         md['sceneid']=os.path.basename(d)
         md['filetype'] = 'GTIFF/Landsat MTL Geotiff'
 
         md['bands']=','.join(bands)
         md['nbands']=len(bands)
-        md['level']=hdr['PRODUCT_METADATA']['PRODUCT_TYPE']
-        md['imgdate']='%sT%s'%(hdr['PRODUCT_METADATA']['ACQUISITION_DATE'],hdr['PRODUCT_METADATA']['SCENE_CENTER_SCAN_TIME'][0:8]) #ISO 8601 format, strip off the milliseconds
-        md['satellite']=hdr['PRODUCT_METADATA']['SPACECRAFT_ID']
-        md['sensor']=hdr['PRODUCT_METADATA']['SENSOR_ID']
-        md['demcorrection']=hdr['PRODUCT_METADATA'].get('ELEVATION_SOURCE','') #Level 1G isn't terrain corrected
-        md['resampling']=hdr['PROJECTION_PARAMETERS']['RESAMPLING_OPTION']
-        md['sunazimuth']=hdr['PRODUCT_PARAMETERS']['SUN_AZIMUTH']
-        md['sunelevation']=hdr['PRODUCT_PARAMETERS']['SUN_ELEVATION']
+        md['level']=product['PRODUCT_TYPE']
+        md['imgdate']='%sT%s'%(product['ACQUISITION_DATE'],product['SCENE_CENTER_SCAN_TIME'][0:8]) #ISO 8601 format, strip off the milliseconds
+        md['satellite']=product['SPACECRAFT_ID']
+        md['sensor']=product['SENSOR_ID']
+        md['demcorrection']=product.get('ELEVATION_SOURCE','') #Level 1G isn't terrain corrected
+        md['resampling']=hdr.group('PROJECTION_PARAMETERS')['RESAMPLING_OPTION']
+        md['sunazimuth']=hdr.group('PRODUCT_PARAMETERS')['SUN_AZIMUTH']
+        md['sunelevation']=hdr.group('PRODUCT_PARAMETERS')['SUN_ELEVATION']
 
 def parseheader(f):
-    ''' A simple header parser.
+    ''' Parse a Landsat (or EO-1) MTL header file.
 
         @type    f: C{str}
         @param   f: Path to header file
-        @rtype:   C{dict}
-        @return:  Dictionary
-
-        @todo:This function works for both landsat MTL and Digitalglobe IMD metadata
-              files. Need to fix duplication - digitalglobe driver will need tweaking
-              as it's version of the parser extracts band information.
+        @rtype:     C{__header__.Group}
+        @return:    Nested header groups, use C{product} etc... to get
+                    a group. The file contents are in C{hdr.text}.
     '''
-
-    if f[:4]=='/vsi':
-        lines=iter(geometry.read_vsi(f).splitlines())
-    else:
-        lines=iter(open(f).readlines())
-
-    hdrdata=OrderedDict({})
-    line=lines.next()
-    while line:
-        line=[item.strip() for item in line.replace('"','').split('=')]
-        group=line[0].upper()
-        if group in ['END;','END']:break
-        value=line[1]
-        if group in ['END_GROUP']:pass
-        elif group in ['BEGIN_GROUP','GROUP']:
-            group=value
-            subdata=OrderedDict({})
-            while line:
-                line=lines.next()
-                line = [l.replace('"','').strip() for l in line.split('=')]
-                subgroup=line[0]
-                subvalue=line[1]
-                if subgroup == 'END_GROUP':
-                    break
-                elif line[1] == '(':
-                    while line:
-                        line=lines.next()
-                        line = line.replace('"','').strip()
-                        subvalue+=line
-                        if line[-1:]==';':
-                            subvalue=eval(subvalue.strip(';'))
-                            break
-                else:subvalue=subvalue.strip(';')
-                subdata[subgroup]=subvalue
-            hdrdata[group]=subdata
-        else: hdrdata[group]=value.strip(');')
-        line=lines.next()
-    return hdrdata
+    return __header__.read(f)
 
 
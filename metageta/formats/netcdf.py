@@ -34,7 +34,7 @@ import __default__
 
 # import other modules
 import sys, os, glob
-from metageta import utilities, geometry
+from metageta import utilities, geometry, overviews
 
 try:
     from osgeo import gdal
@@ -46,7 +46,6 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
-gdal.AllRegister()
 
 class Dataset(__default__.Dataset):
     '''Subclass of __default__.Dataset class so we get a load of metadata populated automatically'''
@@ -108,9 +107,11 @@ class Dataset(__default__.Dataset):
         ##sampling".
         ##Calling GetHistogram on such bands causes gdal to segfault.
 
+        if isinstance(width,(list,tuple)):widest=max(width)
+        else:widest=width
         for b in range(1,self.metadata['nbands']+1):
-            band=self._gdaldataset.GetRasterBand(b)
-            dfBandMin,dfBandMax,dfBandMean,dfBandStdDev = band.GetStatistics(1,1)
+            try:dfBandMin,dfBandMax,dfBandMean,dfBandStdDev = overviews.GetBandStatistics(self._gdaldataset,b,widest)
+            except geometry.GDALError:dfBandMean=float('nan')
             if dfBandMean==dfBandMean: #NB: -1.#IND != -1.#IND
                 break
             b=0
@@ -32,6 +32,7 @@ format_regex=[r'[0-9][0-9][A-Z]{3,3}.*\.imd$']
 #import base dataset modules
 import __dataset__
 import __default__
+import __header__
 
 # import other modules (use "_"  prefix to import privately)
 import sys, os, re, glob, time, math, string, fnmatch
@@ -47,7 +48,6 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
-gdal.AllRegister()
 
 class Dataset(__default__.Dataset):
     '''Subclass of __default__.Dataset class so we get a load of metadata populated automatically'''
@@ -75,7 +75,7 @@ class Dataset(__default__.Dataset):
         imddata=self.__getimddata__(f)
         __default__.Dataset.__getmetadata__(self, self.img)
 
-        self.metadata['metadata']=open(f).read()
+        self.metadata['metadata']=imddata.text
 
         if imddata.has_key('IMAGE_1'):imgkey='IMAGE_1'
         else:imgkey='SINGLE_IMAGE_PRODUCT'
@@ -120,9 +120,9 @@ class Dataset(__default__.Dataset):
         if imddata[imgkey].has_key('cloudCover'):
             self.metadata['cloudcover'] = imddata[imgkey]['cloudCover']
         elif imddata[imgkey].has_key('manualCloudCover'):
-            self.metadata['cloudcover'] = max([0, imddata[imgkey]['manualCloudCover']]) #hack for -999 cloud cover
+            self.metadata['cloudcover'] = max([0, imddata[imgkey].typed('manualCloudCover')]) #hack for -999 cloud cover
         elif imddata[imgkey].has_key('autoCloudCover'):
-            self.metadata['cloudcover'] = max([0, imddata[imgkey]['autoCloudCover']])
+            self.metadata['cloudcover'] = max([0, imddata[imgkey].typed('autoCloudCover')])
         if imddata[imgkey].has_key('offNadirViewAngle'):
             self.metadata['viewangle'] = imddata[imgkey]['offNadirViewAngle']
         elif imddata[imgkey].has_key('meanOffNadirViewAngle'):
@@ -141,39 +141,8 @@ class Dataset(__default__.Dataset):
         #Loop thru and parse the IMD file.
         #would be easier to walk the nodes in the XML files, but not all of our QB imagery has this
         #perhaps someone deleted them...?
-        lines=iter(open(f).readlines())
-        imddata={}
-        bands=[]
-        line=lines.next()
-        while line:
-            line=[item.strip() for item in line.replace('"','').split('=')]
-            #line = map(string.strip, lines[i].split('='))
-            group=line[0]
-            if group == 'END;':break
-            value=line[1]
-            if group == 'BEGIN_GROUP':
-                group=value
-                subdata={}
-                if 'BAND_' in group:bands.append(group)
-                while line:
-                    line=lines.next()
-                    line = [l.replace('"','').strip() for l in line.split('=')]
-                    subgroup=line[0]
-                    subvalue=line[1]
-                    if subgroup == 'END_GROUP':break
-                    elif line[1] == '(':
-                        while line:
-                            line=lines.next()
-                            line = line.replace('"','').strip()
-                            subvalue+=line
-                            if line[-1:]==';':
-                                subvalue=eval(subvalue.strip(';'))
-                                break
-                    else:subvalue=subvalue.strip(';')
-                    subdata[subgroup]=subvalue
-                imddata[group]=subdata
-            else: imddata[group]=value.strip(');')
-            line=lines.next()
+        imddata=__header__.read(f)
+        bands=[group for group in imddata if 'BAND_' in group]
         imddata['bands']=bands
         imddata['nbands']=len(bands)
         return imddata
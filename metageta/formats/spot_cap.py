@@ -51,7 +51,45 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
-gdal.AllRegister()
+
+#Leader file record layouts, byte positions are from the format specification
+_recordlength=3960 #SPOT recordlength=3960
+_sceneheader=utilities.RecordLayout({ #Scene header record
+    'sceneid':     (37,52),
+    'cy':          (85,100),   #Latitude of the Scene Centre
+    'cx':          (101,116),  #Longitude of the Scene Centre
+    'uly':         (149,164),
+    'ulx':         (165,180),
+    'ury':         (213,228),
+    'urx':         (229,244),
+    'lly':         (277,292),
+    'llx':         (293,308),
+    'lry':         (341,356),
+    'lrx':         (357,372),
+    'rotation':    (437,452,float),
+    'sunazimuth':  (469,484,float),
+    'sunelevation':(485,500,float),
+    'imgdate':     (581,612),
+    'satellite':   (613,628),
+    'sensor':      (629,644),
+    'mode':        (645,660),
+    'ncols':       (997,1012,int),
+    'nrows':       (1013,1028,int),
+    'nbands':      (1045,1060,int),
+    'bands':       (1061,1316),
+    'level':       (1317,1332),
+    'resampling':  (1365,1380),
+    'cellx':       (1381,1396),
+    'celly':       (1397,1412)
+})
+_ephemeris=utilities.RecordLayout({ #Ancillary "Ephemeris / Attitude" record
+    'viewangle':   (3065,3076,float)
+})
+_mapprojection=utilities.RecordLayout({ #Map projection (scene-related) ancillary record
+    'projection':  (21,52),
+    'ellipsoid':   (57,88),
+    'datum':       (101,132)
+})
 
 class Dataset(__dataset__.Dataset): #Subclass of base Dataset class
     def __init__(self,f=None):
@@ -59,13 +97,11 @@ class Dataset(__dataset__.Dataset): #Subclass of base Dataset class
         if not f:f=self.fileinfo['filepath']
         if f[:4]=='/vsi':raise NotImplementedError
 
-        led=glob.glob(os.path.dirname(f) + '/[Ll][Ee][Aa][Dd]*')[0] #volume file
-        meta = open(led,'rb').read()
-
-        #Record 2 - Scene header record
-        record=2
-        recordlength=3960 #SPOT recordlength=3960 
-        satellite=utilities.readbinary(meta,(record-1)*recordlength,613,628)
+        led=utilities.glob(os.path.dirname(f) + '/[Ll][Ee][Aa][Dd]*')[0] #volume file
+        with utilities.mapfile(led) as meta:
+            #Record 2 - Scene header record
+            record=2
+            satellite=utilities.readbinary(meta,(record-1)*_recordlength,613,628)
         if not satellite[0:4] == 'SPOT':
             raise NotImplementedError #This error gets ignored in __init__.Open()
         self.filelist=[r for r in utilities.rglob(os.path.dirname(f))] #everything in this dir and below.
@@ -75,79 +111,78 @@ class Dataset(__dataset__.Dataset): #Subclass of base Dataset class
         if not f:f=self.fileinfo['filepath']
         self._gdaldataset = geometry.OpenDataset(f)
 
-        led=glob.glob(os.path.dirname(f) + '/[Ll][Ee][Aa][Dd]*')[0] #volume file
-        meta = open(led,'rb').read()
+        led=utilities.glob(os.path.dirname(f) + '/[Ll][Ee][Aa][Dd]*')[0] #volume file
+        with utilities.mapfile(led) as meta:
+            scene=_sceneheader.read(meta,(2-1)*_recordlength)       #Record 2 - Scene header record
+            ephemeris=_ephemeris.read(meta,(3-1)*_recordlength)     #Record 3 - Ancillary "Ephemeris / Attitude" record
+            mapproj=_mapprojection.read(meta,(26-1)*_recordlength)  #Record 26 - Map projection (scene-related) ancillary record
 
         ######################
         # Scene header record
         ######################
-        record=2
-        recordlength=3960 #SPOT recordlength=3960
 
         ##################
         #SCENE PARAMETERS
         ##################
-        sceneid=utilities.readbinary(meta,(record-1)*recordlength,37,52)
-
-        cy=geometry.DMS2DD(utilities.readbinary(meta,(record-1)*recordlength,85,100),'HDDDMMSS') #Latitude of the Scene Centre
-        cx=geometry.DMS2DD(utilities.readbinary(meta,(record-1)*recordlength,101,116),'HDDDMMSS') #Longitude of the Scene Centre
-        uly=geometry.DMS2DD(utilities.readbinary(meta,(record-1)*recordlength,149,164),'HDDDMMSS')
-        ulx=geometry.DMS2DD(utilities.readbinary(meta,(record-1)*recordlength,165,180),'HDDDMMSS')
-        ury=geometry.DMS2DD(utilities.readbinary(meta,(record-1)*recordlength,213,228),'HDDDMMSS')
-        urx=geometry.DMS2DD(utilities.readbinary(meta,(record-1)*recordlength,229,244),'HDDDMMSS')
-        lly=geometry.DMS2DD(utilities.readbinary(meta,(record-1)*recordlength,277,292),'HDDDMMSS')
-        llx=geometry.DMS2DD(utilities.readbinary(meta,(record-1)*recordlength,293,308),'HDDDMMSS')
-        lry=geometry.DMS2DD(utilities.readbinary(meta,(record-1)*recordlength,341,356),'HDDDMMSS')
-        lrx=geometry.DMS2DD(utilities.readbinary(meta,(record-1)*recordlength,357,372),'HDDDMMSS')
+        sceneid=scene['sceneid']
+
+        cy=geometry.DMS2DD(scene['cy'],'HDDDMMSS') #Latitude of the Scene Centre
+        cx=geometry.DMS2DD(scene['cx'],'HDDDMMSS') #Longitude of the Scene Centre
+        uly=geometry.DMS2DD(scene['uly'],'HDDDMMSS')
+        ulx=geometry.DMS2DD(scene['ulx'],'HDDDMMSS')
+        ury=geometry.DMS2DD(scene['ury'],'HDDDMMSS')
+        urx=geometry.DMS2DD(scene['urx'],'HDDDMMSS')
+        lly=geometry.DMS2DD(scene['lly'],'HDDDMMSS')
+        llx=geometry.DMS2DD(scene['llx'],'HDDDMMSS')
+        lry=geometry.DMS2DD(scene['lry'],'HDDDMMSS')
+        lrx=geometry.DMS2DD(scene['lrx'],'HDDDMMSS')
         ext=[[ulx,uly],[urx,ury],[lrx,lry],[llx,lly],[ulx,uly]]
 
         ######################
         #IMAGING PARAMETERS
         ######################
-        self.metadata['rotation']=float(utilities.readbinary(meta,(record-1)*recordlength,437,452))
+        self.metadata['rotation']=scene['rotation']
         if abs(self.metadata['rotation']) < 1:
             self.metadata['orientation']='Map oriented'
             self.metadata['rotation']=0.0
         else:self.metadata['orientation']='Path oriented'
-        self.metadata['sunazimuth']=float(utilities.readbinary(meta,(record-1)*recordlength,469,484))
-        self.metadata['sunelevation']=float(utilities.readbinary(meta,(record-1)*recordlength,485,500))
-        imgdate=utilities.readbinary(meta,(record-1)*recordlength,581,612)
+        self.metadata['sunazimuth']=scene['sunazimuth']
+        self.metadata['sunelevation']=scene['sunelevation']
+        imgdate=scene['imgdate']
         #self.metadata['imgdate']=time.strftime(utilities.dateformat,time.strptime(imgdate[0:8],'%Y%m%d')) #ISO 8601 
         self.metadata['imgdate']=time.strftime(utilities.datetimeformat,time.strptime(imgdate[0:14],'%Y%m%d%H%M%S')) #ISO 8601 
-        satellite=utilities.readbinary(meta,(record-1)*recordlength,613,628)
-        sensor=utilities.readbinary(meta,(record-1)*recordlength,629,644)
-        mode=utilities.readbinary(meta,(record-1)*recordlength,645,660)
+        satellite=scene['satellite']
+        sensor=scene['sensor']
+        mode=scene['mode']
 
         ######################
         #IMAGE PARAMETERS
         ######################
-        ncols=int(utilities.readbinary(meta,(record-1)*recordlength,997,1012))
-        nrows=int(utilities.readbinary(meta,(record-1)*recordlength,1013,1028))
-        nbands=int(utilities.readbinary(meta,(record-1)*recordlength,1045,1060))
-        bands=utilities.readbinary(meta,(record-1)*recordlength,1061,1316).replace(' ',',')
-        self.metadata['level']=utilities.readbinary(meta,(record-1)*recordlength,1317,1332)
-        self.metadata['resampling']=utilities.readbinary(meta,(record-1)*recordlength,1365,1380)
+        ncols=scene['ncols']
+        nrows=scene['nrows']
+        nbands=scene['nbands']
+        bands=scene['bands'].replace(' ',',')
+        self.metadata['level']=scene['level']
+        self.metadata['resampling']=scene['resampling']
         if self.metadata['level']=='1A': #Not geometrically corrected. Cell size isn't really appropriate
             gcps=geometry.ExtentToGCPs(ext,ncols,nrows)
             gt=gdal.GCPsToGeoTransform(gcps)
             cellx,celly=geometry.CellSize(gt)
         else:
-            cellx=float(utilities.readbinary(meta,(record-1)*recordlength,1381,1396))
-            celly=float(utilities.readbinary(meta,(record-1)*recordlength,1397,1412))
+            cellx=float(scene['cellx'])
+            celly=float(scene['celly'])
 
         #################################################
         #Ancillary "Ephemeris / Attitude" record,
         #################################################
-        record=3
-        viewangle=float(utilities.readbinary(meta,(record-1)*recordlength,3065,3076))
+        viewangle=ephemeris['viewangle']
         
         #################################################
         #Map projection (scene-related) ancillary record
         #################################################
-        record=26
-        projection = utilities.readbinary(meta,(record-1)*recordlength,21,52).replace('\x00','')
-        ellipsoid = utilities.readbinary(meta,(record-1)*recordlength,57,88).replace('\x00','')
-        datum = utilities.readbinary(meta,(record-1)*recordlength,101,132).replace('\x00','')
+        projection = mapproj['projection'].replace('\x00','')
+        ellipsoid = mapproj['ellipsoid'].replace('\x00','')
+        datum = mapproj['datum'].replace('\x00','')
 
         if 'UTM' in projection:
             # UTM
@@ -50,7 +50,6 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
-gdal.AllRegister()
 
 class Dataset(__default__.Dataset):
     '''Subclass of base Dataset class'''
@@ -58,7 +57,7 @@ class Dataset(__default__.Dataset):
         if not f:f=self.fileinfo['filepath']
         if f[:4]=='/vsi':raise NotImplementedError
         d=os.path.dirname(f)
-        self.filelist=glob.glob(os.path.join(d,'*'))
+        self.filelist=utilities.glob(os.path.join(d,'*'))
 
         #exclude stuff handled by specialist drivers
         fr='|'.join(alos.format_regex+landsat_mtl.format_regex)
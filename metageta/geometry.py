@@ -25,7 +25,7 @@
            It doesn't just do geometry now...
 '''
 
-import os,math,warnings,tempfile,re
+import os,math,warnings,tempfile,re,threading
 from metageta import utilities
 try:
     from osgeo import gdal
@@ -37,6 +37,10 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
+try:
+    import numpy
+except ImportError:
+    numpy=None #Optional, lists are used instead
 
 debug=False
 
@@ -93,6 +97,7 @@ def OpenDataset(filepath,mode=gdalconst.GA_ReadOnly):
 
     try:gdalDataset = gdal.Open(filepath, mode)
     except:raise GDALError('Unable to open %s'%filepath)
+    if gdalDataset is None:raise GDALError('Unable to open %s'%filepath)
     return gdalDataset
 
 ##def ParseGDALinfo(filepath):
@@ -408,6 +413,142 @@ def ReprojectGeom(geom,src_srs,tgt_srs):
     gdal.ErrorReset()
     return geom
 
+def GetTransformation(src_srs,tgt_srs):
+    ''' Get a coordinate transformation.
+
+        Transformations are cached (per thread, they're not thread safe), as building
+        one for every dataset is expensive and most datasets share a handful of SRSs.
+
+        @type src_srs:  C{osr.SpatialReference/str/int}
+        @param src_srs: OSR SpatialReference object, WKT string or EPSG code
+        @type tgt_srs:  C{osr.SpatialReference/str/int}
+        @param tgt_srs: OSR SpatialReference object, WKT string or EPSG code
+        @rtype:         C{osr.CoordinateTransformation}
+        @return:        Coordinate transformation
+    '''
+    return _transformation(_srskey(src_srs),_srskey(tgt_srs),threading.current_thread().ident)
+
+def ReprojectPoints(points,src_srs,tgt_srs):
+    ''' Reproject points, e.g. the corners of one or many footprints, in a single call.
+
+        @type points:   C{numpy.ndarray/list}
+        @param points:  Array of xy coordinates with shape (npoints,2) or (nfootprints,npoints,2)
+        @type src_srs:  C{osr.SpatialReference/str/int}
+        @param src_srs: OSR SpatialReference object, WKT string or EPSG code
+        @type tgt_srs:  C{osr.SpatialReference/str/int}
+        @param tgt_srs: OSR SpatialReference object, WKT string or EPSG code
+        @rtype:         C{numpy.ndarray/list}
+        @return:        Reprojected xy coordinates, the same type and shape as points.
+                        The points are returned unchanged (with a warning) if either
+                        spatial reference is empty or invalid.
+    '''
+    try:ct=GetTransformation(src_srs,tgt_srs)
+    except GDALError,err:
+        warnings.warn(str(err))
+        return points
+    xy,unflatten=_flatten(points)
+    gdal.ErrorReset()
+    gdal.PushErrorHandler( 'CPLQuietErrorHandler' )
+    try:xy=[(p[0],p[1]) for p in ct.TransformPoints(xy)]
+    finally:
+        err = gdal.GetLastErrorMsg()
+        if err:warnings.warn(err.replace('\n',' '))
+        gdal.PopErrorHandler()
+        gdal.ErrorReset()
+    return unflatten(xy)
+
+def InBounds(points,xmin,ymin,xmax,ymax):
+    ''' Check whether points, e.g. the corners of one or many footprints, are within bounds.
+
+        @type points:   C{numpy.ndarray/list}
+        @param points:  Array of xy coordinates with shape (npoints,2) or (nfootprints,npoints,2)
+        @rtype:         C{boolean/numpy.ndarray/list}
+        @return:        True if all the points are within bounds, or for (nfootprints,npoints,2)
+                        arrays, an array/list of nfootprints booleans
+    '''
+    if numpy is not None:
+        points=numpy.asarray(points,dtype=float)
+        x,y=points[...,0],points[...,1]
+        inbounds=((x>=xmin)&(x<=xmax)&(y>=ymin)&(y<=ymax)).all(axis=-1)
+        if inbounds.ndim:return inbounds
+        return bool(inbounds)
+    if _isfootprints(points):return [InBounds(p,xmin,ymin,xmax,ymax) for p in points]
+    return all([xmin<=float(x)<=xmax and ymin<=float(y)<=ymax for x,y in points])
+
+@utilities.lrucache(64)
+def _transformation(src_srs,tgt_srs,thread):
+    gdal.ErrorReset()
+    try:ct=osr.CoordinateTransformation(_srs(src_srs),_srs(tgt_srs))
+    except (RuntimeError,TypeError,ValueError):ct=None
+    if ct is None or getattr(ct,'this',ct) is None: #Older bindings return an empty transformation
+        raise GDALError('Unable to create a coordinate transformation')
+    return ct
+
+def _srskey(srs):
+    ''' Hashable key for an osr.SpatialReference object, WKT string or EPSG code'''
+    if isinstance(srs,osr.SpatialReference):return srs.ExportToWkt()
+    return srs
+
+def _srs(srs):
+    ''' osr.SpatialReference object from a WKT string or EPSG code'''
+    sr=osr.SpatialReference()
+    try:
+        if isinstance(srs,(int,long)):err=sr.ImportFromEPSG(srs)
+        elif srs:err=sr.ImportFromWkt(srs)
+        else:err=True
+    except (RuntimeError,TypeError):err=True
+    if err:raise GDALError('Invalid spatial reference: %r'%srs)
+    return sr
+
+def _isfootprints(points):
+    try:return hasattr(points[0][0],'__iter__')
+    except (IndexError,TypeError):return False
+
+def _flatten(points):
+    ''' Flatten points to a list of xy pairs.
+        Returns the list and a function to convert a list of xy pairs back to the same type and shape as points.'''
+    if numpy is not None and isinstance(points,numpy.ndarray):
+        shape=points.shape
+        return points.reshape(-1,2).tolist(),lambda xy:numpy.array(xy,dtype=float).reshape(shape)
+    if _isfootprints(points):
+        counts=[len(p) for p in points]
+        def unflatten(xy):
+            footprints,i=[],0
+            for n in counts:
+                footprints.append([list(p) for p in xy[i:i+n]])
+                i+=n
+            return footprints
+        return [list(p) for footprint in points for p in footprint],unflatten
+    return [list(p) for p in points],lambda xy:[list(p) for p in xy]
+
+def ResolveVRTSources(filepath):
+    ''' Make relative VRT source paths independent of the current working directory.
+
+        GDAL resolves source paths in a VRT file relative to the VRT's directory
+        if C{relativeToVRT="1"}, otherwise relative to the current working directory.
+        The latter are resolved against the VRT's directory instead, so datasets can be
+        opened without changing the working directory, which is shared by all threads.
+
+        @type filepath:  C{str}
+        @param filepath: Path to dataset
+        @rtype:          C{str}
+        @return:         VRT XML with absolute source paths if filepath is a VRT file with
+                         relative source paths that aren't C{relativeToVRT="1"}, otherwise filepath
+    '''
+    if filepath[-4:].lower()!='.vrt' or not os.path.isfile(filepath):return filepath
+    from xml.etree import ElementTree
+    try:vrt=ElementTree.parse(filepath).getroot()
+    except Exception:return filepath #Let GDAL report it
+    vrtdir=os.path.dirname(os.path.abspath(filepath))
+    resolved=False
+    for src in vrt.iter('SourceFilename'):
+        path=(src.text or '').strip()
+        if src.get('relativeToVRT','0')=='1' or not path or os.path.isabs(path) or path[:4].lower()=='/vsi':continue
+        src.text=os.path.join(vrtdir,path)
+        resolved=True
+    if not resolved:return filepath
+    return ElementTree.tostring(vrt)
+
 def InvGeoTransform(gt_in):
     '''
      ************************************************************************
@@ -952,6 +1093,16 @@ class ShapeWriter:
                 self.fields[f]=f
         return shp
 
+    def __checkbounds__(self,extent):
+        '''Basic coordinate bounds test. Can't do for projected though'''
+        if self._srs.IsGeographic():
+            if type(extent[0]) is not list and type(extent[0]) is not tuple: #it's a list of xy values
+                xmin,ymin,xmax,ymax=extent
+                extent=[[xmin,ymin],[xmax,ymax]]
+            if not InBounds(extent,-180,-90,180,90):
+                #raise ValueError, 'Invalid extent coordinates'
+                warnings.warn('Invalid extent coordinates')
+
     def WriteRecord(self,extent,attributes):
         '''Write record
 
@@ -962,13 +1113,7 @@ class ShapeWriter:
         '''
         try:
             geom=GeomFromExtent(extent,self._srs)
-            if self._srs.IsGeographic(): #basic coordinate bounds test. Can't do for projected though
-                srs=osr.SpatialReference()
-                srs.ImportFromEPSG(4283)#4326)
-                valid = GeomFromExtent([-180,-90,180,90], srs=srs)
-                if not valid.Contains(geom):
-                    #raise ValueError, 'Invalid extent coordinates'
-                    warnings.warn('Invalid extent coordinates')
+            self.__checkbounds__(extent)
 
             lyr=self._shape.GetLayer(0)
 
@@ -993,13 +1138,7 @@ class ShapeWriter:
         '''
         try:
             geom=GeomFromExtent(extent,self._srs)
-            if self._srs.IsGeographic(): #basic coordinate bounds test. Can't do for projected though
-                srs=osr.SpatialReference()
-                srs.ImportFromEPSG(4283)#4326)
-                valid = GeomFromExtent([-180,-90,180,90], srs=srs)
-                if not valid.Contains(geom):
-                    #raise ValueError, 'Invalid extent coordinates'
-                    warnings.warn('Invalid extent coordinates')
+            self.__checkbounds__(extent)
             lyr=self._shape.GetLayer()
             lyr.SetAttributeFilter(where_clause)
             feat=lyr.GetNextFeature()
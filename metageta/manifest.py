@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+'''
+Crawl manifest, a SQLite database stored alongside the output spreadsheet.
+
+The manifest holds the spreadsheet row of each dataset and the size, modification time
+and inode of every file in its filelist. When updating a previous crawl, this lets
+unchanged datasets be skipped without opening them and avoids reading the previous
+records back out of the spreadsheet.
+
+Changes are only committed by L{Manifest.checkpoint} (or L{Manifest.validate}) after the
+spreadsheet has been saved, so if a crawl dies the manifest still matches the spreadsheet
+from the last checkpoint and the crawl can be resumed from there. Resuming searches the
+whole directory tree again, the datasets saved at the checkpoint are skipped without
+opening them as they're unchanged.
+
+Example:
+    >>> manifest=Manifest('/some/dir/crawl.manifest')
+    >>> if manifest.isvalid('/some/dir/crawl.xlsx'):
+    >>>     for key,row,record in manifest.records():
+    >>>         ...
+    >>> dataset=manifest.unchanged(filepath)
+    >>> if dataset is None: #Open it and extract metadata
+'''
+
+import os
+import sqlite3
+
+#Record fields needed to update a dataset, see L{__runcrawler__.ismodified}
+fields=('guid','filepath','mediaid','datemodified','filelist','quicklook','metadatadate','DELETED')
+
+class Manifest(object):
+    ''' Crawl manifest'''
+    def __init__(self,path):
+        ''' Open or create a crawl manifest.
+
+            @type    path: C{str}
+            @param   path: Path to manifest file
+        '''
+        self.path=path
+        self.active=False #Record the file being opened, see L{opening}
+        self._current=path+'.current'
+        self._db=sqlite3.connect(path)
+        self._db.text_factory=str
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS datasets (
+                key TEXT PRIMARY KEY, file TEXT, row INTEGER,
+                guid TEXT, filepath TEXT, mediaid TEXT, datemodified TEXT, filelist TEXT,
+                quicklook TEXT, metadatadate TEXT, DELETED INTEGER);
+            CREATE INDEX IF NOT EXISTS datasets_file ON datasets (file);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT, key TEXT, size INTEGER, mtime REAL, inode INTEGER);
+            CREATE INDEX IF NOT EXISTS files_key ON files (key);
+            CREATE TABLE IF NOT EXISTS errors (path TEXT PRIMARY KEY, error TEXT, debug TEXT);
+        ''')
+
+    def isvalid(self,xlsx):
+        ''' Does the manifest match the spreadsheet? It won't if the last crawl died before
+            its first checkpoint or the spreadsheet has been edited since.
+
+            @type    xlsx: C{str}
+            @param   xlsx: Path to the spreadsheet
+            @rtype:  C{bool}
+        '''
+        try:return self._get('xlsx')==_signature(xlsx)
+        except OSError:return False
+
+    def invalidate(self):
+        ''' Mark the manifest as not matching the spreadsheet, e.g. while a crawl is running'''
+        self._db.execute('DELETE FROM meta WHERE key=?',('xlsx',))
+        self._db.commit()
+
+    def validate(self,xlsx):
+        ''' Mark the manifest as matching the spreadsheet, call this once the spreadsheet is saved
+
+            @type    xlsx: C{str}
+            @param   xlsx: Path to the spreadsheet
+        '''
+        self._set('xlsx',_signature(xlsx))
+        self._db.commit()
+
+    def checkpoint(self,xlsx):
+        ''' Commit the datasets added since the last checkpoint, call this once the spreadsheet is saved
+
+            @type    xlsx: C{str}
+            @param   xlsx: Path to the spreadsheet
+        '''
+        self.validate(xlsx)
+        self.active=True #There's a checkpoint to resume from now
+
+    def clear(self):
+        ''' Remove all records'''
+        self._db.execute('DELETE FROM datasets')
+        self._db.execute('DELETE FROM files')
+        self._db.execute('DELETE FROM errors')
+        self._db.commit()
+
+    def clearerrors(self):
+        ''' Remove the files that couldn't be opened, so they're tried again'''
+        self._db.execute('DELETE FROM errors')
+        self._db.commit()
+
+    def error(self,f,err,dbg=''):
+        ''' Record a file that couldn't be opened
+
+            @type    f: C{str}
+            @param   f: The file
+            @type    err: C{str}
+            @param   err: Error message
+            @type    dbg: C{str}
+            @param   dbg: Debug message
+        '''
+        self._db.execute('INSERT OR REPLACE INTO errors (path,error,debug) VALUES (?,?,?)',(f,err,dbg))
+
+    def failed(self,f):
+        ''' @rtype:  C{tuple}
+            @return: (error, debug) messages if the file couldn't be opened, or None
+        '''
+        return self._db.execute('SELECT error,debug FROM errors WHERE path=?',(f,)).fetchone()
+
+    def opening(self,f):
+        ''' Note the file that's about to be opened, so L{crashed} can tell which
+            file was being opened if the process dies (e.g. GDAL segfaults).
+            This is written straight to a file and not to the database, so it's
+            not rolled back to the last checkpoint.
+
+            Nothing is written unless the manifest is L{active}, i.e. the crawl is being
+            resumed or has been checkpointed, as the crawl can't be resumed otherwise.
+
+            @type    f: C{str}
+            @param   f: The file
+        '''
+        if not self.active:return
+        with open(self._current,'wb') as current:current.write(f)
+
+    def opened(self):
+        ''' Note that the file passed to L{opening} was opened, so a crash while extracting
+            its metadata (or generating overviews) isn't blamed on opening it.
+        '''
+        if not self.active:return
+        with open(self._current,'wb') as current:pass
+
+    def crashed(self):
+        ''' @rtype:  C{str}
+            @return: The file that was being opened if the last crawl died while opening it, or None
+        '''
+        try:
+            with open(self._current,'rb') as current:f=current.read()
+        except IOError:return None
+        if f and self._db.execute('SELECT 1 FROM datasets WHERE file=?',(f,)).fetchone() is None:return f
+
+    def records(self):
+        ''' @rtype:  C{generator}
+            @return: (key, row, record) tuples, where record is a dict of L{fields}
+        '''
+        cursor=self._db.execute('SELECT key,row,%s FROM datasets ORDER BY row'%','.join(fields))
+        for result in cursor:
+            rec=dict(zip(fields,result[2:]))
+            for field in fields:
+                if rec[field] is None:rec[field]=''
+            yield result[0],result[1],rec
+
+    def unchanged(self,f,filestat=None,stats={}):
+        ''' Look up a dataset that was opened from a file and check that none of
+            the files in its filelist have changed since it was recorded.
+
+            @type    f: C{str}
+            @param   f: File the dataset was opened from, as returned by L{crawler.Crawler.nextfile}
+            @type    filestat: C{os.stat_result}
+            @param   filestat: Stat result of f, if known
+            @type    stats: C{dict}
+            @param   stats: Known stat results keyed by file path, other files are stat'ed
+            @rtype:  C{dict}
+            @return: The record (see L{records}) with the key, row and filelist (as a list of
+                     paths) of the unchanged dataset, or None.
+        '''
+        result=self._db.execute('SELECT key,row,%s FROM datasets WHERE file=? AND NOT DELETED'%','.join(fields),(f,)).fetchone()
+        if result is None:return None
+        files=self._db.execute('SELECT path,size,mtime,inode FROM files WHERE key=?',(result[0],)).fetchall()
+        if not files:return None
+        for path,size,mtime,inode in files:
+            if path==f and filestat is not None:current=filestat
+            else:
+                try:current=stats.get(path) or os.stat(path)
+                except OSError:return None
+            if (current.st_size,current.st_mtime,current.st_ino)!=(size,mtime,inode):return None
+        rec=dict(zip(fields,result[2:]))
+        rec.update(key=result[0],row=result[1],files=[path for path,size,mtime,inode in files])
+        return rec
+
+    def add(self,key,row,record,f=None,filestats=[]):
+        ''' Add or replace a dataset
+
+            @type    key: C{str}
+            @param   key: The dataset guid
+            @type    row: C{int}
+            @param   row: The spreadsheet row of the dataset's record
+            @type    record: C{dict}
+            @param   record: The dataset's record
+            @type    f: C{str}
+            @param   f: File the dataset was opened from
+            @type    filestats: C{list}
+            @param   filestats: Result of L{filestats} for the dataset's filelist
+        '''
+        values=[record.get(field) for field in fields]
+        values[-1]=record.get('DELETED') in (1,'1')
+        self._db.execute('INSERT OR REPLACE INTO datasets (key,file,row,%s) VALUES (?,?,?,%s)'%(
+                         ','.join(fields),','.join('?'*len(fields))),[key,f,row]+values)
+        self.update(key,f,filestats)
+
+    def update(self,key,f,filestats):
+        ''' Record the current state of the files of a dataset that didn't need updating
+
+            @type    key: C{str}
+            @param   key: The dataset guid
+            @type    f: C{str}
+            @param   f: File the dataset was opened from
+            @type    filestats: C{list}
+            @param   filestats: Result of L{filestats} for the dataset's filelist
+        '''
+        if f is not None:self._db.execute('UPDATE datasets SET file=? WHERE key=?',(f,key))
+        self._db.execute('DELETE FROM files WHERE key=?',(key,))
+        self._db.executemany('INSERT INTO files (path,key,size,mtime,inode) VALUES (?,?,?,?,?)',
+                             [(path,key,size,mtime,inode) for path,size,mtime,inode in filestats])
+
+    def delete(self,key):
+        ''' Mark a dataset as deleted
+
+            @type    key: C{str}
+            @param   key: The dataset guid
+        '''
+        self._db.execute('UPDATE datasets SET DELETED=1 WHERE key=?',(key,))
+        self._db.execute('DELETE FROM files WHERE key=?',(key,))
+
+    def close(self):
+        ''' Close the manifest, uncommitted changes are rolled back to the last checkpoint'''
+        self._db.close()
+        if os.path.exists(self._current):os.remove(self._current)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def _get(self,key):
+        result=self._db.execute('SELECT value FROM meta WHERE key=?',(key,)).fetchone()
+        if result is not None:return result[0]
+
+    def _set(self,key,value):
+        self._db.execute('INSERT OR REPLACE INTO meta (key,value) VALUES (?,?)',(key,value))
+
+def filestats(filelist,stats={}):
+    ''' Get the size, modification time and inode of each file in a filelist.
+        Files that can't be stat'ed (e.g. /vsi paths) get None values so they're never unchanged.
+
+        @type    filelist: C{list}
+        @param   filelist: List of file paths
+        @type    stats: C{dict}
+        @param   stats: Known stat results keyed by file path
+        @rtype:  C{list}
+        @return: (path, size, mtime, inode) tuples
+    '''
+    result=[]
+    for path in filelist:
+        try:
+            filestat=stats.get(path) or os.stat(path)
+            result.append((path,filestat.st_size,filestat.st_mtime,filestat.st_ino))
+        except OSError:
+            result.append((path,None,None,None))
+    return result
+
+def _signature(xlsx):
+    filestat=os.stat(xlsx)
+    return '%s|%r'%(filestat.st_size,filestat.st_mtime)
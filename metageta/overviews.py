@@ -36,10 +36,17 @@ except ImportError:
     import gdalconst
     import osr
     import ogr
+try:
+    import numpy
+    from metageta import stretchmath
+except ImportError:
+    numpy=None #Optional, stretches are applied by GDAL VRTs instead
+    stretchmath=None
 from metageta import geometry,utilities
 import sys, os.path, os, csv, re, struct, math, glob, string, time,shutil, tempfile
+import collections, threading, weakref, cPickle as pickle
 
-def getoverview(ds,outfile,width,format,bands,stretch_type,*stretch_args):
+def getoverview(ds,outfile,width,format,bands,stretch_type,*stretch_args,**kwargs):
     '''
     Generate overviews for imagery
 
@@ -48,7 +55,8 @@ def getoverview(ds,outfile,width,format,bands,stretch_type,*stretch_args):
     @type  outfile: C{str}
     @param outfile: a filepath to the output overview image. If supplied, format is determined from the file extension
     @type  width:   C{int}
-    @param width:   output image width
+    @param width:   output image width, or a list of widths (with a list of outfiles) to generate
+                    several overview images from one render, see L{getoverviews}
     @type  format:  C{str}
     @param format:  format to generate overview image, one of ['JPG','PNG','GIF','BMP','TIF']. Not required if outfile is supplied.
     @type  bands:   C{list}
@@ -58,10 +66,95 @@ def getoverview(ds,outfile,width,format,bands,stretch_type,*stretch_args):
                           one of [L{NONE<_stretch_NONE>},L{PERCENT<_stretch_PERCENT>},L{MINMAX<_stretch_MINMAX>},L{STDDEV<_stretch_STDDEV>},L{COLOURTABLE<_stretch_COLOURTABLE>},L{COLOURTABLELUT<_stretch_COLOURTABLELUT>},L{RANDOM<_stretch_RANDOM>},L{UNIQUE<_stretch_UNIQUE>}].
     @type stretch_args:   C{list}
     @param stretch_args:  args to pass to the stretch algorithms
+    @keyword fullres:     Calculate PERCENT and STDDEV stretches from the full resolution image
+                          instead of the overview image (slow), default False
     @rtype:         C{str}
-    @return:        filepath (if outfile is supplied)/binary image data (if outfile is not supplied)
+    @return:        filepath (if outfile is supplied)/binary image data (if outfile is not supplied),
+                    or a list of them if a list of widths is supplied
+    '''
+    if isinstance(width,(list,tuple)):
+        return getoverviews(ds,outfile,width,format,bands,stretch_type,*stretch_args,**kwargs)
+    return getoverviews(ds,[outfile],[width],[format],bands,stretch_type,*stretch_args,**kwargs)[0]
+
+def getoverviews(ds,outfiles,widths,formats,bands,stretch_type,*stretch_args,**kwargs):
+    '''
+    Generate overviews of different sizes for imagery
+
+    The largest overview is rendered once and the smaller ones are resampled from it in memory,
+    so the image isn't read, stretched or decoded again for each size.
+
+    @type  ds:       C{GDALDataset}
+    @param ds:       a GDALDataset object
+    @type  outfiles: C{list}
+    @param outfiles: filepaths to the output overview images (or None), see L{getoverview}
+    @type  widths:   C{list}
+    @param widths:   output image widths
+    @type  formats:  C{list}
+    @param formats:  formats to generate the overview images (or a single format for all of them), see L{getoverview}
+    @note:           See L{getoverview} for the other arguments
+    @rtype:          C{list}
+    @return:         filepaths (for the outfiles supplied)/binary image data (for the outfiles not supplied)
     '''
+    if outfiles is None:outfiles=[None]*len(widths)
+    if not isinstance(formats,(list,tuple)):formats=[formats]*len(widths)
 
+    cols=ds.RasterXSize
+    rows=ds.RasterYSize
+    gt=ds.GetGeoTransform()
+    vrtcols=max(widths)
+    vrtrows=int(math.ceil(vrtcols*float(rows)/cols))
+
+    vrtds=None
+    if numpy is not None and stretch_type.upper() in ('PERCENT','STDDEV')+_lutstretches:
+        vrtds=render(stretch_type,vrtcols,vrtrows,ds,bands,*stretch_args,**kwargs)
+    if vrtds is None:
+        vrtfn=stretch(stretch_type,vrtcols,vrtrows,ds,bands,*stretch_args)
+        vrtds=geometry.OpenDataset(vrtfn)
+        #Read the VRT once, not once for each overview
+        if len(widths)>1:vrtds=gdal.GetDriverByName('MEM').CreateCopy('',vrtds)
+
+    results=[]
+    for outfile,width,format in zip(outfiles,widths,formats):
+        ovrows=int(math.ceil(width*float(rows)/cols))
+        if width==vrtcols:ovds=vrtds
+        else:ovds=_resample(vrtds,width,ovrows)
+        ovgt=(gt[0],cols/float(width)*gt[1],gt[2],gt[3],gt[4],rows/float(ovrows)*gt[5])
+        ovds.SetGeoTransform(ovgt)
+        results.append(_write(ovds,outfile,format,ovgt))
+    return results
+
+def _resample(ds,cols,rows):
+    ''' Resample an in memory overview image to a smaller size
+
+        @type ds:    C{gdal.Dataset}
+        @param ds:   A Byte gdal dataset
+        @type cols:  C{int}
+        @param cols: Number of output columns
+        @type rows:  C{int}
+        @param rows: Number of output rows
+        @rtype:      C{gdal.Dataset}
+        @return:     In memory Byte dataset
+    '''
+    memds=gdal.GetDriverByName('MEM').Create('',cols,rows,ds.RasterCount,gdal.GDT_Byte)
+    for i in range(1,ds.RasterCount+1):
+        data=ds.GetRasterBand(i).ReadRaster(0,0,ds.RasterXSize,ds.RasterYSize,cols,rows,gdal.GDT_Byte)
+        memds.GetRasterBand(i).WriteRaster(0,0,cols,rows,data,cols,rows,gdal.GDT_Byte)
+    return memds
+
+def _write(ovds,outfile,format,ovgt):
+    ''' Write an overview image and its world file
+
+        @type ovds:     C{gdal.Dataset}
+        @param ovds:    The overview image
+        @type outfile:  C{str}
+        @param outfile: a filepath to the output overview image, see L{getoverview}
+        @type format:   C{str}
+        @param format:  format to generate overview image, see L{getoverview}
+        @type ovgt:     C{tuple}
+        @param ovgt:    The overview image geotransform
+        @rtype:         C{str}
+        @return:        filepath (if outfile is supplied)/binary image data (if outfile is not supplied)
+    '''
     #mapping table for file extension -> GDAL format code
     imageformats={'JPG':'JPEG', #JPEG JFIF (.jpg)
                   'PNG':'PNG',  #Portable Network Graphics (.png)
@@ -80,42 +173,134 @@ def getoverview(ds,outfile,width,format,bands,stretch_type,*stretch_args):
         format=os.path.splitext(outfile)[1].replace('.','')                  #overrides "format" arg if supplied
     ovdriver=gdal.GetDriverByName(imageformats.get(format.upper(), 'JPEG'))  #Get format code, default to 'JPEG' if supplied format doesn't match the predefined ones...
 
-    cols=ds.RasterXSize
-    rows=ds.RasterYSize
-    vrtcols=width
-    vrtrows=int(math.ceil(width*float(rows)/cols))
-    gt=ds.GetGeoTransform()
-    vrtpx=cols/float(vrtcols)*gt[1]
-    vrtpy=rows/float(vrtrows)*gt[5]
-    vrtgt=(gt[0],vrtpx,gt[2],gt[3],gt[4],vrtpy)
-
-    vrtfn=stretch(stretch_type,vrtcols,vrtrows,ds,bands,*stretch_args)
-    gdal.UseExceptions()
-    vrtds=gdal.Open(vrtfn, gdal.GA_ReadOnly)
-
-    vrtds.SetGeoTransform(vrtgt)
     if outfile:
-        cpds=ovdriver.CreateCopy(outfile, vrtds)
+        cpds=ovdriver.CreateCopy(outfile, ovds)
         wf_ext=worldfileexts.get(format.upper(), '.jgw')
         open(outfile[:-4]+wf_ext,'w').write('\n'.join([
-            str(vrtgt[1]),
-            str(vrtgt[4]),
-            str(vrtgt[2]),
-            str(vrtgt[5]),
-            str(vrtgt[0] + 0.5 * vrtgt[1] + 0.5 * vrtgt[2]),
-            str(vrtgt[3] + 0.5 * vrtgt[4] + 0.5 * vrtgt[5])]))
+            str(ovgt[1]),
+            str(ovgt[4]),
+            str(ovgt[2]),
+            str(ovgt[5]),
+            str(ovgt[0] + 0.5 * ovgt[1] + 0.5 * ovgt[2]),
+            str(ovgt[3] + 0.5 * ovgt[4] + 0.5 * ovgt[5])]))
 
         if not cpds:raise geometry.GDALError, 'Unable to generate overview image.'
     else:
         fn='/vsimem/%s.%s'%(tempfile._RandomNameSequence().next(),format.lower())
-        cpds=ovdriver.CreateCopy(fn, vrtds)
+        cpds=ovdriver.CreateCopy(fn, ovds)
         if not cpds:raise geometry.GDALError, 'Unable to generate overview image.'
 
-        outfile=read_vsi(fn)
+        outfile=geometry.read_vsi(fn)
         gdal.Unlink(fn)
 
     return outfile
 #========================================================================================================
+#Single pass renderer
+#========================================================================================================
+def render(stretchType,cols,rows,ds,bands,*args,**kwargs):
+    '''Render a stretched overview image in memory.
+
+        Each band is read once at the overview size, from the internal overview (reduced resolution
+        level) nearest the overview size if there is one, see L{GetOverviewBand}. The stretch is
+        calculated from that with numpy and applied in place.
+        This avoids the statistics, histogram and VRT passes over the full resolution image.
+        LUT stretches (COLOURTABLE, COLOURTABLELUT, RANDOM and UNIQUE) are applied to the
+        overview sized band with L{stretchmath.applylut} instead of a VRT C{<LUT>}.
+
+        @type stretchType:  C{str}
+        @param stretchType: PERCENT, STDDEV or a LUT stretch
+        @type cols:         C{int}
+        @param cols:        The number of columns in the overview
+        @type rows:         C{int}
+        @param rows:        The number of rows in the overview
+        @type ds:           C{gdal.Dataset}
+        @param ds:          A gdal dataset object
+        @type bands:        C{[int,...,int]}
+        @param bands:       A list of band numbers to output (in output order). E.g [4,2,1]
+        @param args:        Other args, see L{_stretch_PERCENT}, L{_stretch_STDDEV}, etc...
+        @keyword fullres:   Calculate the stretch from the full resolution band (slow), default False
+        @rtype:             C{gdal.Dataset}
+        @return:            In memory Byte dataset or None if the stretch can't be calculated
+                            and the VRT stretch should be used instead
+    '''
+    if stretchType.upper() in _lutstretches:return _renderlut(stretchType.upper(),cols,rows,ds,bands,*args)
+    limits=globals()['_limits_'+stretchType.upper()]
+    fullres=kwargs.get('fullres',False)
+    data=[]
+    for band in bands:
+        rb=ds.GetRasterBand(band)
+        ovb=GetOverviewBand(rb,cols)
+        buf=ovb.ReadAsArray(0,0,ovb.XSize,ovb.YSize,buf_xsize=cols,buf_ysize=rows)
+        if buf is None or numpy.iscomplexobj(buf):return None
+        key=(band,stretchType.upper(),tuple(args),fullres)
+        bandlimits=_cached(ds,key,lambda:_limits(limits,rb.ReadAsArray() if fullres else buf,rb.GetNoDataValue(),args))
+        if bandlimits is None:return None #No valid values
+
+        dfScaleSrcMin,dfScaleSrcMax=GetDataTypeRange(rb.DataType)
+        dfBandMin,dfBandMax=bandlimits
+        dfScaleSrcMin=max([dfScaleSrcMin, dfBandMin])
+        dfScaleSrcMax=min([dfScaleSrcMax, dfBandMax])
+        if dfScaleSrcMax<=dfScaleSrcMin:return None
+
+        dfScale,dfOffset=GetScaleRatioOffset(dfScaleSrcMin,dfScaleSrcMax,0,255)
+        buf=buf.astype(numpy.float32)
+        buf*=dfScale
+        buf+=dfOffset
+        numpy.clip(buf,0,255,buf)
+        data.append(buf.astype(numpy.uint8))
+
+    return _memdataset(data)
+
+def _renderlut(stretchType,cols,rows,ds,bands,*args):
+    ''' Render a LUT stretch of a single band to RGB, see L{render}'''
+    table=stretchmath.lut(globals()['_lut_'+stretchType](cols,ds,bands,*args))
+    if not len(table):return None
+    ovb=GetOverviewBand(ds.GetRasterBand(bands[0]),cols)
+    buf=ovb.ReadAsArray(0,0,ovb.XSize,ovb.YSize,buf_xsize=cols,buf_ysize=rows)
+    if buf is None or numpy.iscomplexobj(buf):return None
+    return _memdataset(stretchmath.applylut(buf,table))
+_lutstretches=('COLOURTABLE','COLORTABLE','COLOURTABLELUT','COLORTABLELUT','RANDOM','UNIQUE')
+
+def _memdataset(data):
+    ''' Create an in memory Byte dataset from a list of Byte arrays, see L{render}'''
+    rows,cols=data[0].shape
+    memds=gdal.GetDriverByName('MEM').Create('',cols,rows,len(data),gdal.GDT_Byte)
+    for i,buf in enumerate(data):
+        memds.GetRasterBand(i+1).WriteArray(buf)
+    return memds
+
+def _limits(limits,values,nodata,args):
+    ''' Calculate stretch limits from the valid values of a band, see L{render}'''
+    values=values[numpy.isfinite(values)]
+    if nodata is not None:values=values[values!=nodata]
+    if not values.size:return None
+    return limits(values,*args)
+
+def _limits_PERCENT(values,low,high):
+    ''' Min, max percentage stretch limits, see L{_stretch_PERCENT}
+
+        @type values: C{numpy.ndarray}
+        @param values:Valid pixel values
+        @rtype:       C{(float,float)}
+        @return:      Values at the low and high percentiles
+    '''
+    if high <= 1:
+        low=low*100.0
+        high=high*100.0
+    return tuple(numpy.percentile(values,[low,high]))
+
+def _limits_STDDEV(values,std):
+    ''' Standard deviation stretch limits, see L{_stretch_STDDEV}
+
+        @type values: C{numpy.ndarray}
+        @param values:Valid pixel values
+        @rtype:       C{(float,float)}
+        @return:      Mean -/+ std standard deviations
+    '''
+    mean,stddev=values.mean(dtype=numpy.float64),values.std(dtype=numpy.float64)
+    return math.floor(mean-std*stddev),math.ceil(mean+std*stddev)
+
+#========================================================================================================
 #Stretch algorithms
 #========================================================================================================
 def stretch(stretchType,vrtcols,vrtrows,ds,*args):
@@ -210,8 +395,7 @@ def _stretch_PERCENT(vrtcols,vrtrows,ds,bands,low,high):
         nodata=rb.GetNoDataValue()
         nbits=gdal.GetDataTypeSize(rb.DataType)
         dfScaleSrcMin,dfScaleSrcMax=GetDataTypeRange(rb.DataType)
-        try:dfBandMin,dfBandMax,dfBandMean,dfBandStdDev = GetStatistics(rb,1,1)
-        except:dfBandMin,dfBandMax,dfBandMean,dfBandStdDev = GetStatistics(rb,0,1)
+        dfBandMin,dfBandMax,dfBandMean,dfBandStdDev = GetBandStatistics(ds,band,vrtcols)
         dfBandRange=dfBandMax-dfBandMin
         if nbits == 8 or 2 < dfBandRange <= 255:
             nbins=int(math.ceil(dfBandRange))
@@ -223,7 +407,7 @@ def _stretch_PERCENT(vrtcols,vrtrows,ds,bands,low,high):
 
         #hs=rb.GetHistogram(dfBandMin+abs(dfBandMin)*0.0001,dfBandMax-abs(dfBandMax)*0.0001, nbins,include_out_of_range=1,approx_ok=0)
         #hs=rb.GetHistogram(dfBandMin+abs(dfBandMin)*0.0001,dfBandMax-abs(dfBandMax)*0.0001, nbins,include_out_of_range=1,approx_ok=1)
-        hs=rb.GetHistogram(dfBandMin+abs(dfBandMin)*0.0001,dfBandMax-abs(dfBandMax)*0.0001, nbins,include_out_of_range=0,approx_ok=1)
+        hs=GetBandHistogram(ds,band,vrtcols,dfBandMin+abs(dfBandMin)*0.0001,dfBandMax-abs(dfBandMax)*0.0001, nbins,0)
         #Check that outliers haven't really skewed the histogram
         #this is a kludge to workaround datasets with multiple nodata values
         # for j in range(0,10):
@@ -242,8 +426,10 @@ def _stretch_PERCENT(vrtcols,vrtrows,ds,bands,low,high):
         #        else:binsize=(dfBandRange)/nbins
         #     else:break
         try:
-            dfScaleSrcMin=max([dfScaleSrcMin, HistPercentileValue(hs, low, binsize,dfBandMin)])
-            dfScaleSrcMax=min([dfScaleSrcMax, HistPercentileValue(hs, high, binsize,dfBandMin)])
+            if stretchmath is not None:dfLow,dfHigh=stretchmath.percentiles(hs,[low,high],binsize,dfBandMin)
+            else:dfLow,dfHigh=HistPercentileValue(hs, low, binsize,dfBandMin),HistPercentileValue(hs, high, binsize,dfBandMin)
+            dfScaleSrcMin=max([dfScaleSrcMin, dfLow])
+            dfScaleSrcMax=min([dfScaleSrcMax, dfHigh])
             dfScaleDstMin,dfScaleDstMax=0.0,255.0 #Always going to be Byte for output jpegs
             dfScale = (dfScaleDstMax - dfScaleDstMin) / (dfScaleSrcMax - dfScaleSrcMin)
             dfOffset = -1 * dfScaleSrcMin * dfScale + dfScaleDstMin
@@ -282,8 +468,7 @@ def _stretch_MINMAX(vrtcols,vrtrows,ds,bands):
         rb=ds.GetRasterBand(band)
         nodata=rb.GetNoDataValue()
         dfScaleSrcMin,dfScaleSrcMax=GetDataTypeRange(rb.DataType)
-        try:dfBandMin,dfBandMax,dfBandMean,dfBandStdDev = GetStatistics(rb,1,1)
-        except:dfBandMin,dfBandMax,dfBandMean,dfBandStdDev = GetStatistics(rb,0,1)
+        dfBandMin,dfBandMax,dfBandMean,dfBandStdDev = GetBandStatistics(ds,band,vrtcols)
         dfScaleDstMin,dfScaleDstMax=0.0,255.0 #Always going to be Byte for output jpegs
         dfScale = (dfScaleDstMax - dfScaleDstMin) / (dfScaleSrcMax - dfScaleSrcMin)
         dfOffset = -1 * dfScaleSrcMin * dfScale + dfScaleDstMin
@@ -321,8 +506,7 @@ def _stretch_STDDEV(vrtcols,vrtrows,ds,bands,std):
         rb=ds.GetRasterBand(band)
         nodata=rb.GetNoDataValue()
         dfScaleSrcMin,dfScaleSrcMax=GetDataTypeRange(rb.DataType)
-        try: dfBandMin,dfBandMax,dfBandMean,dfBandStdDev = GetStatistics(rb,1,1)
-        except:dfBandMin,dfBandMax,dfBandMean,dfBandStdDev = GetStatistics(rb,0,1)
+        dfBandMin,dfBandMax,dfBandMean,dfBandStdDev = GetBandStatistics(ds,band,vrtcols)
         dfScaleDstMin,dfScaleDstMax=0.0,255.0 #Always going to be Byte for output jpegs
         dfScaleSrcMin=max([dfScaleSrcMin, math.floor(dfBandMean-std*dfBandStdDev)])
         dfScaleSrcMax=min([dfScaleSrcMax, math.ceil(dfBandMean+std*dfBandStdDev)])
@@ -356,6 +540,7 @@ def _stretch_UNIQUE(vrtcols,vrtrows,ds,bands,vals):
         @param bands:  Band number to output. Band numbers are not zero indexed.
         @type vals:    C{list/tuple}
         @param vals:   List of cell values and R,G,B[,A] values e.g [(12, 0,0,0), (25, 255,255,255)]
+                       or a L{stretchmath} LUT array
         @rtype:        C{xml}
         @return:       VRT XML string
     '''
@@ -377,6 +562,10 @@ def _stretch_UNIQUE(vrtcols,vrtrows,ds,bands,vals):
         vrt.append('  </VRTRasterBand>')
     return '\n'.join(vrt)
 
+def _lut_UNIQUE(vrtcols,ds,bands,vals):
+    ''' Unique values LUT, see L{_stretch_UNIQUE}'''
+    return vals
+
 def _stretch_RANDOM(vrtcols,vrtrows,ds,bands):
     ''' Random values stretch.
 
@@ -391,17 +580,22 @@ def _stretch_RANDOM(vrtcols,vrtrows,ds,bands):
 
         @change: 22/01/2010 lpinner fix for U{r2<http://code.google.com/p/metageta/issues/detail?id=2&can=1>}
     '''
+    return _stretch_UNIQUE(vrtcols,vrtrows,ds,bands,_lut_RANDOM(vrtcols,ds,bands))
+
+def _lut_RANDOM(vrtcols,ds,bands):
+    ''' Random values LUT, see L{_stretch_RANDOM}'''
     from random import randint as r
 
-    band=bands[0]
     vals=[]
 
     rb=ds.GetRasterBand(bands[0])
-    min,max=map(int,rb.ComputeRasterMinMax())
+    min,max=map(int,GetBandMinMax(ds,bands[0],vrtcols))
 
     nodata=rb.GetNoDataValue() #Is this kludge required if we include <NoDataValue> in the VRT...?
+    if nodata is not None:nodata=int(nodata)
+    if stretchmath is not None:return stretchmath.randomlut(min,max,nodata)
+
     if nodata is not None:
-        nodata=int(nodata)
         nodatavals=(nodata,255,255,255,0)
         if min>nodata:vals.append(nodatavals)
 
@@ -414,7 +608,7 @@ def _stretch_RANDOM(vrtcols,vrtrows,ds,bands):
     if nodata is not None and nodata > max:
         vals.append(nodatavals)
 
-    return _stretch_UNIQUE(vrtcols,vrtrows,ds,bands,vals)
+    return vals
 
 def _stretch_COLOURTABLE(vrtcols,vrtrows,ds,bands):
     ''' Colour table stretch.
@@ -431,23 +625,34 @@ def _stretch_COLOURTABLE(vrtcols,vrtrows,ds,bands):
         @rtype:        C{xml}
         @return:       VRT XML string
     '''
+    return _stretch_UNIQUE(vrtcols,vrtrows,ds,bands,_lut_COLOURTABLE(vrtcols,ds,bands))
+
+def _lut_COLOURTABLE(vrtcols,ds,bands):
+    ''' Colour table LUT, see L{_stretch_COLOURTABLE}'''
     band=bands[0]
     rb=ds.GetRasterBand(band)
     nodata=rb.GetNoDataValue()
     if nodata is not None:nodata=int(nodata)
     ct=rb.GetColorTable()
-    min,max=map(int,rb.ComputeRasterMinMax())
+    min,max=map(int,GetBandMinMax(ds,band,vrtcols))
     #rat=rb.GetHistogram(min, max, abs(min)+abs(max)+1,include_out_of_range=1,approx_ok=0)
-    rat=rb.GetHistogram(min, max, abs(min)+abs(max)+1,include_out_of_range=1,approx_ok=1)
+    rat=GetBandHistogram(ds,band,vrtcols,min, max, abs(min)+abs(max)+1,1)
     vals=[]
     ct_count=ct.GetCount()
+    if stretchmath is not None:
+        values=numpy.arange(min,max+1)[:len(rat)]
+        counts=numpy.asarray(rat[:len(values)])
+        entries=(counts > 0) & (values < ct_count) #See the bugfix comment below
+        if nodata is not None:entries&=values != nodata
+        vals=stretchmath.lut([[val]+list(ct.GetColorEntry(val)) for val in values[entries].tolist()])
+        return stretchmath.expand(vals,min,min+len(values)-1)
     for val,count in zip(range(min,max+1),rat):
         if val != nodata and count > 0 and val < ct_count: #Bugfix - sometime there are more values than
             ce=[val]                                       #colortable entries which causes gdal to segfault
             ce.extend(ct.GetColorEntry(val))               #http://trac.osgeo.org/gdal/ticket/3271
             vals.append(ce)
         else:vals.append([val,255,255,255,0])
-    return _stretch_UNIQUE(vrtcols,vrtrows,ds,bands,vals)
+    return vals
 ##def _stretch_COLOURTABLE(vrtcols,vrtrows,ds,bands): #gdal doesn't handle esri colour tables with missing or negative values
 ##    vrt=[]
 ##    colours=['Red','Green','Blue']
@@ -464,6 +669,7 @@ def _stretch_COLOURTABLE(vrtcols,vrtrows,ds,bands):
 ##        vrt.append('  </VRTRasterBand>')
 ##    return '\n'.join(vrt)
 _stretch_COLORTABLE=_stretch_COLOURTABLE #Synonym for the norteamericanos
+_lut_COLORTABLE=_lut_COLOURTABLE
 
 def _stretch_COLOURTABLELUT(vrtcols,vrtrows,ds,bands,clr):
     ''' Colour table file LUT stretch.
@@ -484,10 +690,7 @@ def _stretch_COLOURTABLELUT(vrtcols,vrtrows,ds,bands,clr):
         @return:       VRT XML string
     '''
     vrt=[]
-    band=bands[0]
-    rb=ds.GetRasterBand(band)
-    nodata=rb.GetNoDataValue()
-    lut=ColourLUT(clr,rb)
+    lut=_lut_COLOURTABLELUT(vrtcols,ds,bands,clr)
     for iclr,clr in enumerate(['Red','Green','Blue']):
         vrt.append('  <VRTRasterBand dataType="Byte" band="%s">' % str(iclr+1))
         #if nodata is not None:vrt.append('    <NoDataValue>%s</NoDataValue>'%nodata)
@@ -502,17 +705,183 @@ def _stretch_COLOURTABLELUT(vrtcols,vrtrows,ds,bands,clr):
         vrt.append('  </VRTRasterBand>')
     return '\n'.join(vrt)
 _stretch_COLORTABLELUT=_stretch_COLOURTABLELUT #Synonym for the norteamericanos
+
+def _lut_COLOURTABLELUT(vrtcols,ds,bands,clr):
+    ''' Colour table file LUT, see L{_stretch_COLOURTABLELUT}'''
+    return ColourLUT(clr,GetOverviewBand(ds.GetRasterBand(bands[0]),vrtcols))
+_lut_COLORTABLELUT=_lut_COLOURTABLELUT
+#========================================================================================================
+#Band statistics cache
+#========================================================================================================
+def GetBandStatistics(ds,band,width):
+    ''' Get the (approximate if possible) min, max, mean and standard deviation of a band.
+
+        Statistics are calculated from the internal overview nearest the overview image width
+        (see L{GetOverviewBand}) and cached, see L{_cached}.
+
+        @type ds:     C{gdal.Dataset}
+        @param ds:    A gdal dataset object
+        @type band:   C{int}
+        @param band:  Band number (base 1)
+        @type width:  C{int}
+        @param width: Width in pixels of the overview image that will be generated
+        @rtype:       C{[float,float,float,float]}
+        @return:      Min, max, mean and standard deviation
+    '''
+    return _cached(ds,(band,'statistics'),_statistics,GetOverviewBand(ds.GetRasterBand(band),width))
+
+def GetBandMinMax(ds,band,width):
+    ''' Get the min and max of a band, see L{GetBandStatistics}
+
+        @rtype:       C{(float,float)}
+        @return:      Min and max
+    '''
+    return _cached(ds,(band,'minmax'),GetOverviewBand(ds.GetRasterBand(band),width).ComputeRasterMinMax)
+
+def GetBandHistogram(ds,band,width,min,max,buckets,include_out_of_range):
+    ''' Get the (approximate) histogram of a band, see L{GetBandStatistics}
+
+        @type min:     C{float}
+        @param min:    Lower bound of the histogram
+        @type max:     C{float}
+        @param max:    Upper bound of the histogram
+        @type buckets: C{int}
+        @param buckets:Number of histogram buckets
+        @type include_out_of_range: C{int}
+        @param include_out_of_range:Count values outside the bounds in the first and last buckets
+        @rtype:       C{list}
+        @return:      Histogram
+    '''
+    rb=GetOverviewBand(ds.GetRasterBand(band),width)
+    return _cached(ds,(band,'histogram',min,max,buckets,include_out_of_range),rb.GetHistogram,
+                   min,max,buckets,include_out_of_range=include_out_of_range,approx_ok=1)
+
+def _statistics(band):
+    ''' Get approximate band statistics, or exact statistics if GDAL can't approximate them'''
+    try:return GetStatistics(band,1,1)
+    except:return GetStatistics(band,0,1)
+
+def _cached(ds,key,func,*args,**kwargs):
+    ''' Get a value from the band statistics cache, calculating and caching it if required.
+
+        Values are cached in memory and in the user cache directory, keyed on the dataset's files
+        (path, size and modification time) and C{key}, so they're reused in later runs (e.g. when
+        updating or when overviews are regenerated at a different size) and by different stretches.
+        Datasets that aren't files on disk (e.g. in memory VRTs) aren't cached.
+
+        @type ds:    C{gdal.Dataset}
+        @param ds:   A gdal dataset object
+        @type key:   C{tuple}
+        @param key:  Band number, value name and any parameters
+        @type func:  C{function}
+        @param func: Calculates the value, called with args and kwargs
+        @return:     The value
+    '''
+    cache,signature=_statsfile(ds)
+    if cache is None:return func(*args,**kwargs)
+    with _statslock:
+        stats=_loadstats(cache,signature)
+        if key in stats:return stats[key]
+    value=func(*args,**kwargs)
+    with _statslock:
+        stats[key]=value
+        _savestats(cache,signature,stats)
+    return value
+
+def _statsfile(ds):
+    ''' Get the statistics cache file and signature for a dataset, or (None,None) if it can't be cached.
+        They're only worked out once for each dataset object as listing and checking its files isn't cheap.'''
+    try:
+        with _statslock:return _statsfiles[ds]
+    except (KeyError,TypeError):pass
+    statsfile=_getstatsfile(ds)
+    try:
+        with _statslock:_statsfiles[ds]=statsfile
+    except TypeError:pass #Can't be weakly referenced
+    return statsfile
+
+def _getstatsfile(ds):
+    ''' Get the statistics cache file and signature for a dataset, see L{_statsfile}'''
+    try:
+        desc=ds.GetDescription()
+        if not desc or desc[:4]=='/vsi' or desc.lstrip()[:1]=='<':return None,None
+        files=ds.GetFileList()
+        if not files:return None,None
+        signature=[]
+        for f in files:
+            filestat=os.stat(f)
+            signature.append((f,filestat.st_size,filestat.st_mtime))
+        from metageta import config
+        return os.path.join(config.get_cache_dir(),'%s.stats'%utilities.uuid(desc)),(desc,signature)
+    except Exception:return None,None
+
+def _loadstats(cache,signature):
+    ''' Get the cached statistics for a dataset from memory or the cache file'''
+    cached=_stats.pop(cache,None)
+    if cached is None or cached[0]!=signature:
+        try:
+            with open(cache,'rb') as reader:cached=pickle.load(reader)
+            cached=(cached['signature'],cached['stats'])
+            if cached[0]!=signature:raise ValueError
+            os.utime(cache,None) #Recently used, see utilities.prunecache
+        except Exception:cached=(signature,{})
+    _stats[cache]=cached
+    while len(_stats)>maxstats:_stats.popitem(last=False)
+    return cached[1]
+
+def _savestats(cache,signature,stats):
+    ''' Write the cached statistics for a dataset, merging in any added by other processes'''
+    try:
+        try:
+            with open(cache,'rb') as reader:cached=pickle.load(reader)
+            if cached['signature']==signature:
+                for key,value in cached['stats'].items():stats.setdefault(key,value)
+        except Exception:pass
+        tmp='%s.%s.tmp'%(cache,os.getpid())
+        with open(tmp,'wb') as writer:pickle.dump({'signature':signature,'stats':stats},writer,2)
+        if os.name=='nt' and os.path.exists(cache):os.remove(cache)
+        os.rename(tmp,cache)
+        utilities.prunecache('.stats',maxstatsfiles)
+    except Exception:pass #Not fatal, the statistics will just have to be calculated again next time
+
+_stats=collections.OrderedDict() #Cached statistics keyed by cache file, least recently used first
+_statslock=threading.Lock()
+maxstats=64 #Maximum number of datasets to keep statistics for in memory
+maxstatsfiles=1000 #Maximum number of datasets to keep statistics for in the user cache directory
+_statsfiles=weakref.WeakKeyDictionary() #Statistics cache file and signature by dataset, see _statsfile
+
 #========================================================================================================
 #Helper functions
 #========================================================================================================
+def GetOverviewBand(band,width):
+    ''' Get the internal overview (reduced resolution level) of a band nearest to a width.
+
+        JP2, ECW, NITF and tiled GeoTIFF images often have internal overviews, reading
+        (and calculating statistics) from these is much faster than from the full resolution band.
+
+        @type band:   C{gdal.Band}
+        @param band:  A gdal band object
+        @type width:  C{int}
+        @param width: Width in pixels of the overview image that will be generated
+        @rtype:       C{gdal.Band}
+        @return:      The smallest overview that is at least as wide as the overview image,
+                      or the band itself if there isn't one
+    '''
+    best=band
+    for i in range(band.GetOverviewCount()):
+        overview=band.GetOverview(i)
+        if overview is not None and width <= overview.XSize < best.XSize:best=overview
+    return best
 def GetStatistics(band,*args,**kwargs):
-    gdal.UseExceptions()
-    try:
-        stats=band.GetStatistics(*args,**kwargs)
-    except:
-        gdal.DontUseExceptions()
-        raise geometry.GDALError
-    gdal.DontUseExceptions()
+    ''' Get band statistics, raising a L{geometry.GDALError} if they can't be calculated.
+
+        The error is checked for instead of toggling gdal.UseExceptions() as
+        that is process wide and overviews may be generated in several threads at once.
+    '''
+    gdal.ErrorReset() #The last error is per thread
+    try:stats=band.GetStatistics(*args,**kwargs)
+    except RuntimeError:raise geometry.GDALError()
+    if stats is None or gdal.GetLastErrorType()>=gdal.CE_Failure:raise geometry.GDALError()
     return stats
 def GetScaleRatioOffset(dfScaleSrcMin,dfScaleSrcMax,dfScaleDstMin,dfScaleDstMax):
     ''' Calculate data scale and offset
@@ -592,6 +961,7 @@ def HistPercentileValue(inhist, percent, binsize, lowerlimit):
     # Comments and/or additions are welcome (send e-mail to:
     # strang@nmr.mgh.harvard.edu).
     #
+    if stretchmath is not None:return stretchmath.percentiles(inhist,[percent],binsize,lowerlimit)[0]
     if percent > 1:
         percent = percent / 100.0
     targetcf = percent*len(inhist)
@@ -623,6 +993,8 @@ def RATtoLUT(rat):
         if sCol.upper() in ['B','BLUE']:
             rgbcols['B']=iCol
     if sorted(rgbcols.keys()) == ['B', 'G', 'R','VALUE']:
+        if stretchmath is not None and hasattr(rat,'ReadAsArray'): #GDAL 1.11+
+            return stretchmath.ratlut(*[rat.ReadAsArray(rgbcols[c]) for c in ['VALUE','R','G','B']]).tolist()
         clr,vals=[],[]
         for iRow in range(0,rat.GetRowCount()):#+1):
             val=rat.GetValueAsInt(iRow,rgbcols['VALUE'])
@@ -710,6 +1082,7 @@ def ColourLUT(lut,rb):
     nodata=rb.GetNoDataValue()
     min,max=rb.ComputeRasterMinMax()
     rat=rb.GetHistogram(min-0.5,max+0.5,int(max-min+1),0,1)
+    if stretchmath is not None:return stretchmath.histlut(stretchmath.lut(lut),rat,int(min)).tolist()
     vals=[]
     keys=clr.keys()
     for val,count in zip(range(int(min),int(max)+1),rat):
@@ -734,9 +1107,10 @@ def ExpandedColourLUT(lut,rb):
         @rtype:     C{list}
         @return:    A list of one or more [values,r,g,b,a] lists.
     '''
+    dfScaleSrcMin,dfScaleSrcMax=GetDataTypeRange(rb.DataType)
+    if stretchmath is not None:return stretchmath.expand(stretchmath.lut(lut),dfScaleSrcMin,dfScaleSrcMax-1).tolist()
     lut=iter(lut)
     tbl=[]
-    dfScaleSrcMin,dfScaleSrcMax=GetDataTypeRange(rb.DataType)
     rng=range(dfScaleSrcMin,dfScaleSrcMax)
     val,red,green,blue,alpha=[str(v) for v in lut.next()]
     for r in rng:
@@ -763,6 +1137,7 @@ def resize(infile,outfile,width):
         @param outfile:  Path to output image that will be created
         @type width:    C{int}
         @param width:   Width in pixels of output image
+                        or a list of widths (with a list of outfiles), see L{getoverviews}
         @rtype:         C{str}
         @return:        Path to output image that was created
     '''
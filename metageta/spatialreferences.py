@@ -23,7 +23,8 @@
 Spatial reference helper functions
 '''
 
-import os,sys,math
+import os,sys,math,threading
+import cPickle as pickle
 try:
     from osgeo import gdal
     from osgeo import gdalconst
@@ -250,38 +251,41 @@ GCTP_ELLIPSOIDS={'CLARKE1866'         : 0,
 #==============================================================================
 #Functions
 #==============================================================================
+def IdentifySRS(wkt):
+    '''Identify the EPSG code and linear units of an OGC WKT SRS and pretty print it.
+
+        Datasets in a catalogue usually share a handful of spatial references, so results
+        are cached by (whitespace normalised) WKT. The cache is saved in the user cache
+        directory so it's shared by worker processes and later runs.
+
+        @type wkt:  C{str}
+        @param wkt: WKT SRS string
+        @rtype:     C{tuple}
+        @return:    (EPSG code, linear unit code, pretty WKT), see L{IdentifyAusEPSG} and L{GetLinearUnitsName}
+    '''
+    key=_normalise(wkt)
+    with _srslock:
+        if not _srscache:_loadsrscache()
+        try:return _srscache[key]
+        except KeyError:pass
+
+    sw=osr.SpatialReference(wkt)
+    srs=(_identifyepsg(sw),_linearunitsname(sw),sw.ExportToPrettyWkt())
+    del sw
+    with _srslock:
+        _srscache[key]=srs
+        _savesrscache(key,srs)
+    return srs
+
 def IdentifyAusEPSG(wkt):
     '''Identify common EPSG codes used in Australia from OGC WKT
-    
+
         @type wkt:  C{str}
         @param wkt: WKT SRS string
         @rtype:     C{int}
         @return:    EPSG code
     '''
-
-    se=osr.SpatialReference()
-    sw=osr.SpatialReference(wkt)
-    
-    epsg=0
-    if   sw.IsGeographic():epsg=sw.GetAuthorityCode('GEOGCS')
-    elif sw.IsProjected():epsg=sw.GetAuthorityCode('PROJCS')
-    if not epsg:
-        if sw.IsGeographic():
-            for ausepsg in AUS_GEOGCS:
-                epsg=0 #Default return value
-                se.ImportFromEPSG(ausepsg)
-                if se.ExportToUSGS() == sw.ExportToUSGS():#dirty little kludge, doesn't always work...
-                    epsg=ausepsg
-                    break
-        elif sw.IsProjected():
-            for ausepsg in AUS_PROJCS:
-                epsg=0 #Default return value
-                se.ImportFromEPSG(ausepsg)
-                if se.ExportToUSGS() == sw.ExportToUSGS():
-                    epsg=ausepsg
-                    break
-    del se;del sw
-    return int(epsg)
+    return IdentifySRS(wkt)[0]
 
 def GetLinearUnitsName(wkt):
     ''' Identify linear units
@@ -290,8 +294,30 @@ def GetLinearUnitsName(wkt):
         @rtype:     C{str}
         @return:    Linear unit code (m,ft,dd, etc.)
     '''
+    return IdentifySRS(wkt)[1]
 
-    sw=osr.SpatialReference(wkt)
+def GetPrettyWkt(wkt):
+    ''' Pretty print WKT
+        @type wkt:  C{str}
+        @param wkt: WKT SRS string
+        @rtype:     C{str}
+        @return:    Pretty WKT SRS string
+    '''
+    return IdentifySRS(wkt)[2]
+
+def _identifyepsg(sw):
+    epsg=0
+    if   sw.IsGeographic():epsg=sw.GetAuthorityCode('GEOGCS')
+    elif sw.IsProjected():epsg=sw.GetAuthorityCode('PROJCS')
+    if not epsg:
+        if sw.IsGeographic():fingerprints=_AUS_GEOGCS_USGS
+        elif sw.IsProjected():fingerprints=_AUS_PROJCS_USGS
+        else:fingerprints={}
+        if fingerprints:
+            epsg=fingerprints.get(repr(sw.ExportToUSGS()),0) #dirty little kludge, doesn't always work...
+    return int(epsg)
+
+def _linearunitsname(sw):
     name = 'Meter' #Default
     if sw.IsProjected():
         name = sw.GetAttrValue( 'PROJCS|UNIT', 0 ).lower()
@@ -304,6 +330,53 @@ def GetLinearUnitsName(wkt):
         return SRS_UNITS_CONV[name]
     else:
         return name
+
+def _fingerprints(codes):
+    ''' USGS parameters of EPSG codes, used to identify SRSs that don't have an authority code.
+        The first code wins if more than one have the same parameters.'''
+    fingerprints={}
+    se=osr.SpatialReference()
+    for epsg in reversed(codes):
+        try:
+            if se.ImportFromEPSG(epsg)==0:fingerprints[repr(se.ExportToUSGS())]=epsg
+        except RuntimeError:pass #osr.UseExceptions() and no EPSG support files
+    del se
+    return fingerprints
+
+def _normalise(wkt):
+    ''' Strip whitespace from WKT except inside quoted names'''
+    parts=wkt.split('"')
+    parts[::2]=[''.join(part.split()) for part in parts[::2]]
+    return '"'.join(parts)
+
+def _srscachefile():
+    try:
+        from metageta import config
+        return os.path.join(config.get_cache_dir(),'srs.cache')
+    except Exception:return None
+
+def _loadsrscache():
+    try:
+        with open(_srscachefile(),'rb') as reader:cached=pickle.load(reader)
+        if cached['signature']==_signature:_srscache.update(cached['srs'])
+    except Exception:pass #Not fatal, we'll just have to identify the SRSs again
+
+def _savesrscache(key,srs):
+    ''' Add an SRS to the cache file, merging in any added by other processes. Call with L{_srslock} held.'''
+    cache=_srscachefile()
+    if cache is None:return
+    try:
+        try:
+            with open(cache,'rb') as reader:cached=pickle.load(reader)
+            if cached['signature']!=_signature:raise ValueError
+        except Exception:cached={'signature':_signature,'srs':{}}
+        cached['srs'].update(_srscache)
+        tmp='%s.%s.tmp'%(cache,os.getpid())
+        with open(tmp,'wb') as writer:pickle.dump(cached,writer,2)
+        if os.name=='nt' and os.path.exists(cache):os.remove(cache)
+        os.rename(tmp,cache)
+    except Exception:pass #Not fatal
+
 def lon2utmzone(lon):
     ''' Calculate UTM Zone number from a Longitude
         
@@ -313,3 +386,12 @@ def lon2utmzone(lon):
         @return:    UTM Zone
     '''
     return int(math.floor((lon - (-180.0)) / 6.0) + 1)
+
+#==============================================================================
+#Cache
+#==============================================================================
+_AUS_GEOGCS_USGS=_fingerprints(AUS_GEOGCS)
+_AUS_PROJCS_USGS=_fingerprints(AUS_PROJCS)
+_signature=(gdal.VersionInfo(),AUS_GEOGCS,AUS_PROJCS,sorted(SRS_UNITS_CONV.items())) #Cached results are invalid if any of these change
+_srscache={} #Results of IdentifySRS keyed by normalised WKT
+_srslock=threading.Lock() #Guards _srscache and the cache file
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Vectorised stretch calculations
+
+Histogram percentiles and colour lookup tables (LUTs) as numpy arrays, used by the L{overviews} stretches.
+A LUT is an C{(n,5)} integer array of cell value, red, green, blue and alpha rows, sorted by cell value.
+
+@note:This module requires numpy, L{overviews} falls back to pure python if it's not installed.
+'''
+
+import numpy
+
+transparent=(255,255,255,0) #Default colour for values not in a LUT - white/transparent
+
+def percentiles(hist,percents,binsize,lowerlimit):
+    ''' Returns the scores at the given percentiles relative to the distribution given by hist.
+
+        Vectorised version of L{HistPercentileValue<overviews.HistPercentileValue>}
+        that looks up all the percentiles from a single cumulative sum.
+
+        @type hist:         C{list}
+        @param hist:        gdal histogram
+        @type percents:     C{[float,...,float]}
+        @param percents:    percentiles to return scores for, as fractions or percentages (if > 1)
+        @type binsize:      C{float}
+        @param binsize:     width of histogram bins
+        @type lowerlimit:   C{float}
+        @param lowerlimit:  min value of histogram
+        @rtype:             C{numpy.ndarray}
+        @return:            scores at the given percentiles
+    '''
+    hist=numpy.asarray(hist,dtype=numpy.float64)
+    total=hist.sum()
+    if not total:raise ZeroDivisionError('Empty histogram')
+    percents=numpy.asarray(percents,dtype=numpy.float64)
+    percents=numpy.where(percents>1,percents/100.0,percents)
+    cdf=numpy.cumsum(hist)/total
+    i=numpy.minimum(numpy.searchsorted(cdf,percents,side='left'),len(hist)-1)
+    return lowerlimit+binsize*i-binsize
+
+def lut(vals):
+    ''' Convert a list of cell values and R,G,B[,A] values to a LUT
+
+        @type vals:  C{list}
+        @param vals: List of cell values and R,G,B[,A] values (numbers or strings) e.g [(12,0,0,0), ('25','255','255','255','0')]
+        @rtype:      C{numpy.ndarray}
+        @return:     LUT, alpha defaults to 255 (non-transparent)
+    '''
+    if not len(vals):return numpy.zeros((0,5),dtype=numpy.int64)
+    table=numpy.array(vals,dtype=numpy.float64).reshape(len(vals),-1)
+    if table.shape[1]==4:table=numpy.hstack([table,numpy.tile(255.0,(len(table),1))])
+    table=numpy.rint(table).astype(numpy.int64)
+    return table[numpy.argsort(table[:,0],kind='mergesort')]
+
+def expand(table,min,max,fill=transparent):
+    ''' Expand a LUT to every value from min to max
+
+        @type table:  C{numpy.ndarray}
+        @param table: LUT
+        @type min:    C{int}
+        @param min:   Minimum cell value
+        @type max:    C{int}
+        @param max:   Maximum cell value
+        @type fill:   C{(int,int,int,int)}
+        @param fill:  R,G,B,A colour for values that aren't in the LUT
+        @rtype:       C{numpy.ndarray}
+        @return:      LUT with max-min+1 rows
+    '''
+    out=numpy.empty((max-min+1,5),dtype=numpy.int64)
+    out[:,0]=numpy.arange(min,max+1)
+    out[:,1:]=fill
+    table=table[(table[:,0]>=min)&(table[:,0]<=max)]
+    out[table[:,0]-min,1:]=table[:,1:]
+    return out
+
+def histlut(table,hist,min,fill=transparent):
+    ''' Colour the values that occur in a histogram from a LUT
+
+        @type table:  C{numpy.ndarray}
+        @param table: LUT
+        @type hist:   C{list}
+        @param hist:  gdal histogram with one bin for each value from min
+        @type min:    C{int}
+        @param min:   Cell value of the first histogram bin
+        @type fill:   C{(int,int,int,int)}
+        @param fill:  R,G,B,A colour for values that aren't in the LUT
+        @rtype:       C{numpy.ndarray}
+        @return:      LUT of the values with a count > 0
+    '''
+    hist=numpy.asarray(hist)
+    return expand(table,min,min+len(hist)-1,fill)[hist>0]
+
+def randomlut(min,max,nodata=None):
+    ''' Random colour LUT for every value from min to max
+
+        @type min:    C{int}
+        @param min:   Minimum cell value
+        @type max:    C{int}
+        @param max:   Maximum cell value
+        @type nodata: C{int}
+        @param nodata:NoData value, this is white/transparent
+        @rtype:       C{numpy.ndarray}
+        @return:      LUT
+    '''
+    table=numpy.empty((max-min+1,5),dtype=numpy.int64)
+    table[:,0]=numpy.arange(min,max+1)
+    table[:,1:4]=numpy.random.randint(0,256,(len(table),3))
+    table[:,4]=255
+    if nodata is not None:
+        nodatavals=numpy.array([[nodata]+list(transparent)],dtype=numpy.int64)
+        if nodata<min:table=numpy.vstack([nodatavals,table])
+        elif nodata>max:table=numpy.vstack([table,nodatavals])
+        else:table[nodata-min,1:]=transparent
+    return table
+
+def ratlut(values,red,green,blue):
+    ''' Create a LUT from attribute table columns
+
+        Only the first row for each value is used and colours between 0 and 1 are scaled to 0-255.
+
+        @type values: C{numpy.ndarray}
+        @param values:VALUE column
+        @type red:    C{numpy.ndarray}
+        @param red:   Red column
+        @type green:  C{numpy.ndarray}
+        @param green: Green column
+        @type blue:   C{numpy.ndarray}
+        @param blue:  Blue column
+        @rtype:       C{numpy.ndarray}
+        @return:      LUT
+    '''
+    values,first=numpy.unique(numpy.asarray(values,dtype=numpy.int64),return_index=True)
+    table=numpy.empty((len(values),5),dtype=numpy.int64)
+    table[:,0]=values
+    for i,col in enumerate([red,green,blue]):
+        col=numpy.asarray(col,dtype=numpy.float64)[first]
+        table[:,i+1]=numpy.where((col>0)&(col<1),col*255,col).astype(numpy.int64)
+    table[:,4]=255
+    return table
+
+def applylut(data,table):
+    ''' Apply a LUT to an array
+
+        Values between LUT entries are linearly interpolated and values outside
+        the LUT are clamped to the first/last entry, the same as a GDAL VRT C{<LUT>}.
+
+        @type data:   C{numpy.ndarray}
+        @param data:  Cell values
+        @type table:  C{numpy.ndarray}
+        @param table: LUT
+        @rtype:       C{[numpy.ndarray,numpy.ndarray,numpy.ndarray]}
+        @return:      Red, green and blue Byte arrays
+    '''
+    rgb=[]
+    for i in (1,2,3):
+        buf=numpy.interp(data,table[:,0],table[:,i])
+        numpy.clip(numpy.rint(buf,buf),0,255,buf)
+        rgb.append(buf.astype(numpy.uint8))
+    return rgb
@@ -352,7 +352,6 @@ def CreateMEF(outdir,xmlfile,uid,overviews=[],cat=categories['default'],ops=oper
     '''
 
     xmldir=_path.dirname(xmlfile)
-    curdir=_path.abspath(_os.curdir)
     mefdir=mefdir=_tmp.mkdtemp()
     mefpath='%s.mef'%(_path.join(outdir,_path.basename(_path.splitext(xmlfile)[0])))
     try: #
@@ -360,19 +359,16 @@ def CreateMEF(outdir,xmlfile,uid,overviews=[],cat=categories['default'],ops=oper
         #if _path.exists(mefdir):_sh.rmtree(mefdir)
         mef=_zip.ZipFile(mefpath,'w',_zip.ZIP_DEFLATED)
         #_os.mkdir(mefdir)
-        _os.chdir(mefdir)
-        _sh.copy(xmlfile,'metadata.xml')
+        _sh.copy(xmlfile,_path.join(mefdir,'metadata.xml'))
         if overviews:
-            _os.mkdir('public')
+            _os.mkdir(_path.join(mefdir,'public'))
             for f in overviews:
-                _sh.copy(f,_path.join('public',_path.basename(f)))
-        _CreateInfo(uid,overviews,cat,ops)
+                _sh.copy(f,_path.join(mefdir,'public',_path.basename(f)))
+        _CreateInfo(uid,overviews,cat,ops,mefdir)
         #_sh.copy(xmlfile,'metadata.xml')
-        for f in _utilities.rglob('.'):
-            if not _path.isdir(f): mef.write(f)
+        for f in _utilities.rglob(mefdir):
+            if not _path.isdir(f): mef.write(f,_path.relpath(f,mefdir))
     finally:
-        try:_os.chdir(curdir)
-        except:pass
         try:
             mef.close()
             del mef
@@ -382,8 +378,8 @@ def CreateMEF(outdir,xmlfile,uid,overviews=[],cat=categories['default'],ops=oper
 #++++++++++++++++++++++++
 #Private methods
 #++++++++++++++++++++++++
-def _CreateInfo(uid,overviews=[],cat=categories['default'],ops=operations['default']):
-    '''Create MEF info.xml file'''
+def _CreateInfo(uid,overviews=[],cat=categories['default'],ops=operations['default'],outdir=_os.curdir):
+    '''Create MEF info.xml file in outdir'''
     now = _time.strftime('%Y-%m-%dT%H:%M:%S',_time.localtime())
     if overviews:format='partial'
     else:format='simple'
@@ -428,4 +424,4 @@ def _CreateInfo(uid,overviews=[],cat=categories['default'],ops=operations['defau
         parent=_etree.SubElement(root,'private')
 
     #_Dom.PrettyPrint(doc,open('info.xml','w'))
-    open('info.xml', 'w').write(_etree.tostring(root))
+    open(_path.join(outdir,'info.xml'), 'w').write(_etree.tostring(root))
@@ -28,12 +28,20 @@ Utility helper functions
 #========================================================================================================
 import os, sys
 import copy
+import cPickle as _pickle
+import collections
 import fnmatch
+import functools
+import glob as _glob
+import mmap
+import Queue
 import re
 import shutil
+import stat as _stat
 import struct
 import tarfile,zipfile
 import tempfile
+import threading
 import time
 import traceback
 import uuid as _uuid
@@ -41,6 +49,11 @@ import warnings
 
 import openpyxl
 
+try:from os import scandir as _scandir          #Python 3.5+
+except ImportError:
+    try:from scandir import scandir as _scandir #https://pypi.python.org/pypi/scandir
+    except ImportError:_scandir=None
+
 #========================================================================================================
 # Globals
 #========================================================================================================
@@ -52,6 +65,21 @@ encoding='utf-8'
 
 iswin=os.name=='nt'#sys.platform[0:3].lower()=='win'#Are we on Windows
 
+_stats={} #File stats prefetched during a directory search, see setstat
+
+_listings=collections.OrderedDict() #Directory listings cached by listdir, least recently used first
+_listingslock=threading.Lock()
+maxlistings=256 #Maximum number of directory listings to cache
+
+_archives=collections.OrderedDict() #Archive indexes cached by archiveindex, least recently used first
+_archiveslock=threading.Lock()
+maxarchives=256 #Maximum number of archive indexes to keep in memory
+maxarchivefiles=1000 #Maximum number of archive indexes to keep in the user cache directory
+
+maxcacheage=90*24*60*60 #Seconds files are kept in the user cache directory after they were last used, see prunecache
+_cachewrites={} #Number of files written to the user cache directory by extension, see prunecache
+_cachelock=threading.Lock()
+
 #========================================================================================================
 #{String Utilities
 #========================================================================================================
@@ -66,9 +94,188 @@ def encode(string):
     elif string is None:return ''
     else:return string
 
+#========================================================================================================
+#{Caching Utilities
+#========================================================================================================
+def lrucache(maxsize=1024):
+    ''' Decorator that caches the results of a function, like functools.lru_cache in Python 3.
+
+        Results are keyed on the (hashable, positional only) arguments and the most recently used
+        C{maxsize} results are kept. Exceptions aren't cached. The decorated function has a
+        C{cache_clear()} method.
+
+        Example:
+            >>> @lrucache(256)
+            >>> def owner(uid):
+            >>>     return pwd.getpwuid(uid)[0]
+
+        @type    maxsize: C{int}
+        @param   maxsize: Maximum number of results to cache
+        @rtype:  C{function}
+        @return: Decorator
+    '''
+    def decorator(func):
+        cache=collections.OrderedDict()
+        lock=threading.Lock()
+        @functools.wraps(func)
+        def wrapper(*args):
+            with lock:
+                try:
+                    result=cache.pop(args)
+                    cache[args]=result
+                    return result
+                except KeyError:pass
+            result=func(*args)
+            with lock:
+                cache[args]=result
+                while len(cache)>maxsize:cache.popitem(last=False)
+            return result
+        wrapper.cache_clear=cache.clear
+        return wrapper
+    return decorator
+
+def prunecache(ext,maxfiles,maxage=None,interval=100):
+    ''' Remove the least recently used files with an extension from the user cache directory,
+        keeping at most C{maxfiles} files that have been written or used in the last C{maxage} seconds.
+
+        Call it after writing a cache file and touch (os.utime) cache files when they're read.
+        The directory is only checked after the first and every C{interval} writes (per process),
+        so writing cache files stays cheap.
+
+        @type    ext:      C{str}
+        @param   ext:      File extension, e.g. '.stats'
+        @type    maxfiles: C{int}
+        @param   maxfiles: Maximum number of files to keep
+        @type    maxage:   C{int}
+        @param   maxage:   Maximum age in seconds, defaults to L{maxcacheage}
+        @type    interval: C{int}
+        @param   interval: Number of writes between checks
+    '''
+    with _cachelock:
+        writes=_cachewrites.get(ext,0)
+        _cachewrites[ext]=writes+1
+    if writes%interval:return
+    if maxage is None:maxage=maxcacheage
+    try:
+        from metageta import config
+        cachedir=config.get_cache_dir()
+        files=[]
+        for f in os.listdir(cachedir):
+            if f.endswith(ext):
+                f=os.path.join(cachedir,f)
+                try:files.append((os.stat(f).st_mtime,f))
+                except OSError:pass #Removed by another process
+        files.sort(reverse=True) #Most recently used first
+        oldest=time.time()-maxage
+        for i,(mtime,f) in enumerate(files):
+            if i>=maxfiles or mtime<oldest:
+                try:os.remove(f)
+                except OSError:pass
+    except Exception:pass #Not fatal, the cache will just be bigger than it should be
+
 #========================================================================================================
 #{Filesystem Utilities
 #========================================================================================================
+def isarchive(f):
+    ''' Check whether a file is a tar (inc gzip or bz2 compressed) or zip archive.
+
+        Only the first few bytes of the file are read, files that don't look like
+        an archive (or at least have a .tar or .zip extension) aren't opened with the
+        tarfile and zipfile modules to check.
+
+        @type     f:  C{str}
+        @param    f:  filepath
+        @rtype:   C{bool}
+        @return:  True if it's an archive
+    '''
+    return _archivetype(f) is not None
+
+def _archivetype(f):
+    ''' Get the type of archive ('tar' or 'zip') from its magic bytes, or None if it isn't one'''
+    try:
+        fd=open(f,'rb')
+        try:head=fd.read(512)
+        finally:fd.close()
+    except (IOError,OSError):return None #Doesn't exist, is a directory, etc...
+    ext=os.path.splitext(f)[1].lower()
+    if head[:2]=='PK' or ext=='.zip': #Local file header, empty archive or spanned archive signature
+        if zipfile.is_zipfile(f):return 'zip'
+    if head[:2]=='\x1f\x8b' or head[:3]=='BZh' or head[257:262]=='ustar' or ext=='.tar': #gzip, bzip2, POSIX/GNU tar
+        if tarfile.is_tarfile(f):return 'tar'
+    return None
+
+def archiveindex(f):
+    ''' Get an index of the members of a tar (inc gzip or bz2 compressed) or zip archive.
+
+        Reading a compressed tar archive's member list means decompressing the whole thing,
+        so the index is built once and cached in memory and in the user cache directory,
+        keyed on the archive's path, size and modification time.
+
+        @type     f:  C{str}
+        @param    f:  archive filepath
+        @rtype:   C{dict}
+        @return:  {'type':'tar' or 'zip', 'members':[(name, isfile, size, datemodified),...]}
+                  or None if f isn't an archive
+    '''
+    filestat=os.stat(f)
+    key=normcase(realpath(f))
+    signature=(filestat.st_size,filestat.st_mtime)
+    with _archiveslock:
+        cached=_archives.pop(key,None)
+        if cached is not None and cached[0]==signature:
+            _archives[key]=cached
+            return cached[1]
+
+    try:
+        from metageta import config
+        cache=os.path.join(config.get_cache_dir(),'%s.archive'%uuid(key))
+    except Exception:cache=None
+    try:
+        with open(cache,'rb') as reader:cached=_pickle.load(reader)
+        if cached['path']!=key or cached['signature']!=signature:cached=None
+        else:os.utime(cache,None) #Recently used, see prunecache
+    except Exception:cached=None
+
+    if cached is not None:index=cached['index']
+    else:
+        index=_archiveindex(f)
+        if index is not None and cache is not None:
+            try:
+                tmp='%s.%s.%s.tmp'%(cache,os.getpid(),threading.current_thread().ident) #Unique to this thread
+                with open(tmp,'wb') as writer:_pickle.dump({'path':key,'signature':signature,'index':index},writer,2)
+                if iswin and os.path.exists(cache):os.remove(cache)
+                os.rename(tmp,cache)
+                prunecache('.archive',maxarchivefiles)
+            except Exception:pass #Not fatal, the archive will just have to be read again next time
+
+    if index is not None:
+        index['info']=dict([(name,(size,datemodified)) for name,isfile,size,datemodified in index['members']])
+    with _archiveslock:
+        _archives[key]=(signature,index)
+        while len(_archives)>maxarchives:_archives.popitem(last=False)
+    return index
+
+def _archiveindex(f):
+    ''' Read an archive's member list, see L{archiveindex}'''
+    archivetype=_archivetype(f)
+    members=[]
+    if archivetype=='tar':
+        tf=tarfile.open(f,'r')
+        try:
+            for ti in tf.getmembers():
+                datemodified=time.strftime(datetimeformat, time.localtime(ti.mtime))
+                members.append((ti.name,ti.isfile(),ti.size,datemodified))
+        finally:tf.close()
+    elif archivetype=='zip':
+        zf=zipfile.ZipFile(f,'r')
+        try:
+            for zi in zf.infolist():
+                datemodified=time.strftime(datetimeformat, list(zi.date_time)+[0,0,0])
+                members.append((zi.filename,zi.file_size>0,zi.file_size,datemodified))
+        finally:zf.close()
+    else:return None
+    return {'type':archivetype,'members':members}
+
 def archivelist(f):
     ''' List files in a tar (inc gzip or bz2 compressed) or zip archive.
         @type     f:  C{str}
@@ -76,20 +283,13 @@ def archivelist(f):
         @rtype:   C{list}
         @return:  archive filelisting
     '''
-    lst=[]
-    if tarfile.is_tarfile(f):
-        lst=[ti.name for ti in tarfile.open(f,'r').getmembers() if ti.isfile()]
-        return [os.sep.join(['/vsitar',normcase(f),l]) for l in lst]
-        #return [os.sep.join(['/vsitar',f,l]) for l in lst]
-
-    elif zipfile.is_zipfile(f):
-        lst=[zi.filename for zi in zipfile.ZipFile(f,'r').infolist() if zi.file_size> 0]
-        return [os.sep.join(['/vsizip',normcase(f),l]) for l in lst]
-        #return [os.sep.join(['/vsizip',f,l]) for l in lst]
-    return lst
+    index=archiveindex(f)
+    if index is None:return []
+    vsi='/vsi'+index['type']
+    return [os.sep.join([vsi,normcase(f),name]) for name,isfile,size,datemodified in index['members'] if isfile]
 
 def archivefileinfo(f,n):
-    ''' List files in a tar (inc gzip or bz2 compressed) or zip archive.
+    ''' Get the size and modification date of a file in a tar (inc gzip or bz2 compressed) or zip archive.
         @type     f:  C{str}
         @param    f:  archive filepath
         @type     n:  C{str}
@@ -98,19 +298,14 @@ def archivefileinfo(f,n):
         @return:  archive file member info
     '''
     archiveinfo={}
-
-    if tarfile.is_tarfile(f):
-        afi = tarfile.open(f,'r').getmember(n)
-        archiveinfo['size']=afi.size
-        archiveinfo['datemodified']=time.strftime(datetimeformat, time.localtime(afi.mtime))
+    index=archiveindex(f)
+    if index is not None:
+        try:size,datemodified=index['info'][n]
+        except KeyError:raise KeyError('%s not found in %s'%(n,f)) #Same as tarfile/zipfile
+        archiveinfo['size']=size
+        archiveinfo['datemodified']=datemodified
         #archiveinfo['ownerid']=afi.uid  #Use the owner of the archive instead
         #archiveinfo['ownername']=afi.uname
-
-    elif zipfile.is_zipfile(f):
-        afi = zipfile.ZipFile(f,'r').getinfo(n)
-        archiveinfo['size']=afi.file_size
-        archiveinfo['datemodified']=time.strftime(datetimeformat, list(afi.date_time)+[0,0,0])
-
     return archiveinfo
 
 def archivefilename(filepath):
@@ -125,7 +320,7 @@ def archivefilename(filepath):
         if archive==os.path.dirname(archive):
             raise RuntimeError('Unable to determine archive file from %s'%filepath)
         archive=os.path.dirname(archive)
-        if zipfile.is_zipfile(archive) or tarfile.is_tarfile(archive):
+        if isarchive(archive):
             filename=filepath.split(archive)[1].strip('\\/')
             return (archive, filename)
 
@@ -141,7 +336,7 @@ def compressed_file_exists(path,testfile=True):
     '''
     p=os.path.split(path[8:])[0]
     while p:
-        if os.path.exists(p) and tarfile.is_tarfile(p) or zipfile.is_zipfile(p):
+        if isarchive(p):
             if testfile:
                 if path in archivelist(p):return True
                 else:return False
@@ -266,6 +461,93 @@ def readascii(data,offset,start,stop):
     '''
     return data[start+offset-1:stop+offset].strip()
 
+def mapfile(f):
+    ''' Memory map a (binary) file read only, so only the pages that are actually read are loaded.
+
+        Use it in a C{with} statement (or call C{close()}) so the file is unmapped once it's been read.
+
+        Example:
+            >>> with mapfile(leader) as meta:
+            >>>     scene=RecordLayout({'sceneid':(37,52)}).read(meta, 4320)
+
+        @type    f: C{str}
+        @param   f: File path
+        @rtype:     C{mmap.mmap}
+        @return:    The mapped file or, if it can't be mapped (e.g. it's empty), a C{str} of its contents
+    '''
+    with open(f,'rb') as fd:
+        try:return _MappedFile(fd.fileno(),0,access=mmap.ACCESS_READ)
+        except (ValueError,EnvironmentError):return _FileContents(fd.read())
+
+class _MappedFile(mmap.mmap):
+    ''' A memory mapped file that can be used in a C{with} statement, see L{mapfile}'''
+    def __enter__(self):return self
+    def __exit__(self,*args):self.close()
+
+class _FileContents(str):
+    ''' File contents that can be used in a C{with} statement like a L{_MappedFile}'''
+    def __enter__(self):return self
+    def __exit__(self,*args):pass
+    def close(self):pass
+
+class RecordLayout(object):
+    ''' A fixed length binary record layout, e.g. a CEOS leader file record.
+
+        Each field is defined once as C{name:(start,stop)} or C{name:(start,stop,type)}, where
+        start and stop are the byte positions (from 1, inclusive) given in the format
+        specification, as used by L{readbinary}. The layout is compiled to C{struct.Struct}s
+        so a record is decoded with a single C{unpack_from} (more if fields overlap)
+        instead of one L{readbinary} call per field.
+
+        Values are stripped strings, or the result of calling type with the stripped string.
+
+        Example:
+            >>> scene=RecordLayout({'sceneid':(37,52), 'ncols':(333,348,int)})
+            >>> with mapfile(leader) as meta:md=scene.read(meta, 4320)
+            >>> print md['sceneid'], md['ncols']
+    '''
+    def __init__(self,fields):
+        ''' A fixed length binary record layout
+
+            @type    fields: C{dict}
+            @param   fields: C{{name:(start,stop[,type])}}
+        '''
+        self.fields=fields
+        self.size=max([spec[1] for spec in fields.values()])
+        self._structs=[]
+        pending=sorted(fields.items(),key=lambda field:field[1][0])
+        while pending:
+            fmt,names,overlapping,pos=['='],[],[],1
+            for name,spec in pending:
+                start,stop=spec[0],spec[1]
+                if start<pos:
+                    overlapping.append((name,spec))
+                    continue
+                if start>pos:fmt.append('%dx'%(start-pos))
+                fmt.append('%ds'%(stop-start+1))
+                names.append((name,spec[2] if len(spec)>2 else None))
+                pos=stop+1
+            self._structs.append((struct.Struct(''.join(fmt)),names))
+            pending=overlapping
+
+    def read(self,data,offset=0):
+        ''' Decode a record
+
+            @type    data:   C{str} or C{mmap.mmap}
+            @param   data:   Data read from a binary file or the mapped file, see L{mapfile}
+            @type    offset: C{int}
+            @param   offset: Number of bytes to skip to the start of the record
+            @rtype:          C{dict}
+            @return:         Field values
+        '''
+        values={}
+        for record,names in self._structs:
+            for (name,type),value in zip(names,record.unpack_from(data,offset)):
+                value=value.strip()
+                if type is not None:value=type(value)
+                values[name]=value
+        return values
+
 def ByteOrder():
     ''' Determine byte order of host machine.
 
@@ -281,23 +563,21 @@ def ByteOrder():
         raise Exception,'Unknown byte order'
 
 def _WinFileOwner(filepath):
-    import pywintypes
-    import pythoncom
-    import win32com.client
-    import win32net
-    import win32netcon
-
-    OWNERID=(8,10) # seems to be 8 on XP, 10 on Win7
+    import win32security
     try:
-        d=os.path.split(filepath)
-        oShell = win32com.client.Dispatch("Shell.Application")
-        oFolder = oShell.NameSpace(d[0])
-        for oid in OWNERID:
-            ownerid=str(oFolder.GetDetailsOf(oFolder.parsename(d[1]), oid))
-            if ownerid:break
-        try:domain,ownerid=ownerid.split('\\')
-        except:domain,ownerid=None,ownerid.split('\\')[-1]
-    except: domain,ownerid=None,''
+        sd=win32security.GetFileSecurity(filepath, win32security.OWNER_SECURITY_INFORMATION)
+        sid=win32security.ConvertSidToStringSid(sd.GetSecurityDescriptorOwner())
+    except:sid=None
+    return _WinOwner(sid)
+
+@lrucache(256)
+def _WinOwner(sid):
+    ''' Look up the (ownerid, ownername) of a SID string.
+        Looking up the full name means querying a domain controller, so results are cached.'''
+    import win32net
+    import win32security
+    try:ownerid,domain,accounttype=win32security.LookupAccountSid(None, win32security.ConvertStringSidToSid(sid))
+    except:domain,ownerid=None,''
     #Too slow...
     ##oWMI = win32com.client.GetObject(r"winmgmts:\\.\root\cimv2")
     ##qry = "Select * from Win32_UserAccount where NAME = '%s'" % ownerid
@@ -308,12 +588,7 @@ def _WinFileOwner(filepath):
     ##    break
     ##else: ownername='No user match'
     #Much quicker...
-    try:
-        dc=win32net.NetServerEnum(None,100,win32netcon.SV_TYPE_DOMAIN_CTRL)
-        dcname=r'\\'+dc[0][0]['name']
-    except:
-        try:dcname=win32net.NetGetDCName()
-        except:dcname=None
+    dcname=_WinDCName()
     try:
         if dcname:
             ownername=win32net.NetUserGetInfo(dcname,ownerid,2)['full_name']
@@ -323,6 +598,20 @@ def _WinFileOwner(filepath):
 
     return ownerid,ownername
 
+@lrucache(1)
+def _WinDCName():
+    ''' Name of a domain controller (or None), looked up once'''
+    import win32net
+    import win32netcon
+    try:
+        dc=win32net.NetServerEnum(None,100,win32netcon.SV_TYPE_DOMAIN_CTRL)
+        dcname=r'\\'+dc[0][0]['name']
+    except:
+        try:dcname=win32net.NetGetDCName()
+        except:dcname=None
+    return dcname
+
+@lrucache(256)
 def _NixFileOwner(uid):
     import pwd
     pwuid=pwd.getpwuid(uid)
@@ -330,11 +619,18 @@ def _NixFileOwner(uid):
     ownername = pwuid[4]
     return ownerid,ownername
 
-def FileInfo(filepath):
+def FileInfo(filepath,filestat=None):
     ''' File information.
 
+        If the file's stat result was prefetched (passed in or registered with L{setstat}),
+        the file isn't touched at all. Otherwise it's stat'ed once. Owner names and the
+        normalised/UNC paths of directories are cached.
+
         @type    filepath: C{str}
         @param   filepath: Path to file
+        @type    filestat: C{os.stat_result}
+        @param   filestat: Prefetched stat result, if passed the filepath must already be
+                           normalised, i.e. C{normcase(realpath(filepath))}.
         @rtype:  C{dict}
         @return: Dictionary containing file: size, datemodified, datecreated, dateaccessed, ownerid & ownername
     '''
@@ -346,8 +642,11 @@ def FileInfo(filepath):
         'filepath':'',
         'guid':''
     }
-    if not os.path.exists(filepath) and filepath[:4].lower()!= '/vsi':
-        raise IOError('File not found')
+    if filestat is None:filestat=_stats.get(filepath)
+    if filestat is None and filepath[:4].lower()!= '/vsi':
+        filepath,filestat=_realstat(filepath)
+        if filestat is None:raise IOError('File not found')
+    #else: the path was normalised when it was found
 
     try:
         if filepath[:4].lower() == '/vsi':
@@ -366,17 +665,13 @@ def FileInfo(filepath):
             fileinfo['guid']=uuid(filepath)
             filepath=archive
         else:
-            filepath=normcase(realpath(filepath))
-            #filepath=realpath(filepath)
-            filestat = os.stat(filepath)
-
             fileinfo['filename']=os.path.basename(filepath)
             fileinfo['filepath']=filepath
             fileinfo['size']=filestat.st_size
             fileinfo['datemodified']=time.strftime(datetimeformat, time.localtime(filestat.st_mtime))
             fileinfo['datecreated']=time.strftime(datetimeformat, time.localtime(filestat.st_ctime))
             fileinfo['dateaccessed']=time.strftime(datetimeformat, time.localtime(filestat.st_atime))
-            fileinfo['guid']=uuid(filepath)
+            fileinfo['guid']=_uuid3(normcase(uncpath(filepath)))
 
         if not fileinfo.get('ownerid'):
             if iswin:
@@ -397,10 +692,43 @@ def uuid(filepath):
         @rtype:  C{str}
         @return: uuid
     '''
-    filepath=normcase(uncpath(realpath(filepath)))
+    filepath=normcase(uncpath(_realpath(filepath)))
     #filepath=uncpath(realpath(filepath))
+    return _uuid3(filepath)
+
+def _uuid3(filepath):
+    ''' uuid of an already normalised filepath, see L{uuid}'''
     return str(_uuid.uuid3(_uuid.NAMESPACE_DNS,filepath))
 
+def _realpath(filepath):
+    ''' Like L{realpath}, but the real paths of directories are cached.
+        Only costs an lstat (to check it's not a link) per file on POSIX.'''
+    if iswin:return realpath(filepath) #No links to resolve, it's just abspath
+    directory,name=os.path.split(filepath)
+    if not os.path.isabs(directory) or name in ('','.','..') or os.path.islink(filepath):
+        return realpath(filepath)
+    return os.path.join(_realdir(directory),name)
+
+def _realstat(filepath):
+    ''' Get a file's normalised path (C{normcase(realpath(filepath))}) and stat result
+        with as few system calls as possible, the stat result is None if it doesn't exist.'''
+    if iswin:
+        filepath=normcase(realpath(filepath))
+        try:return filepath,os.stat(filepath)
+        except OSError:return filepath,None
+    directory,name=os.path.split(filepath)
+    try:filestat=os.lstat(filepath)
+    except OSError:return normcase(realpath(filepath)),None
+    if not os.path.isabs(directory) or name in ('','.','..') or _stat.S_ISLNK(filestat.st_mode):
+        filepath=normcase(realpath(filepath))
+        try:return filepath,os.stat(filepath)
+        except OSError:return filepath,None #Broken link
+    return normcase(os.path.join(_realdir(directory),name)),filestat
+
+@lrucache(4096)
+def _realdir(directory):
+    return realpath(directory)
+
 def uncpath(filepath):
     ''' Convert file path to UNC.
 
@@ -411,20 +739,31 @@ def uncpath(filepath):
     '''
     #if sys.platform[0:3].lower()=='win':
     if iswin:
-        import win32wnet
         if hasattr(filepath,'__iter__'): #Is iterable
             uncpath=[]
             for path in filepath:
-                try:    uncpath.append(normcase(win32wnet.WNetGetUniversalName(path)))
-                except: uncpath.append(normcase(path)) #Local path
-                #try:    uncpath.append(win32wnet.WNetGetUniversalName(path))
-                #except: uncpath.append(path) #Local path
+                uncpath.append(normcase(_WinUNCPath(path)))
+                #uncpath.append(_WinUNCPath(path))
         else:
-            try:    uncpath=win32wnet.WNetGetUniversalName(filepath)
-            except: uncpath=filepath #Local path
+            uncpath=_WinUNCPath(filepath)
     else:uncpath=filepath
     return uncpath
 
+def _WinUNCPath(filepath):
+    ''' Convert a file path to UNC, the UNC paths of directories are cached
+        as WNetGetUniversalName can be slow for mapped network drives.'''
+    directory,name=os.path.split(filepath)
+    if not name or not os.path.isabs(directory):return _WinUNCDir(filepath)
+    uncdir=_WinUNCDir(directory)
+    if uncdir==directory:return filepath #Local path
+    return os.path.join(uncdir,name)
+
+@lrucache(4096)
+def _WinUNCDir(filepath):
+    import win32wnet
+    try:    return win32wnet.WNetGetUniversalName(filepath)
+    except: return filepath #Local path
+
 def normcase(filepath):
     ''' Normalize case of pathname. Makes all characters lowercase and all slashes into backslashes.
 
@@ -525,9 +864,316 @@ def writable(filepath):
     except:
         return False
 
+def setstat(filepath,filestat):
+    ''' Register a prefetched stat result so L{FileInfo} doesn't need to stat the file again.
+
+        The filepath must already be normalised, i.e. C{normcase(realpath(filepath))}.
+
+        @type    filepath: C{str}
+        @param   filepath: Path to file
+        @type    filestat: C{os.stat_result}
+        @param   filestat: stat result, if None any registered result is removed
+    '''
+    if filestat is None:_stats.pop(filepath,None)
+    else:_stats[filepath]=filestat
+
+class _DirEntry(object):
+    ''' Minimal os.DirEntry substitute for when scandir is not available'''
+    def __init__(self,root,name):
+        self.name=name
+        self.path=os.path.join(root,name)
+        self._lstat=None
+        self._stat=None
+
+    def _getlstat(self):
+        if self._lstat is None:self._lstat=os.lstat(self.path)
+        return self._lstat
+
+    def is_symlink(self):
+        try:return _stat.S_ISLNK(self._getlstat().st_mode)
+        except OSError:return False
+
+    def is_dir(self,follow_symlinks=True):
+        try:return _stat.S_ISDIR(self.stat(follow_symlinks).st_mode)
+        except OSError:return False
+
+    def is_file(self,follow_symlinks=True):
+        try:return _stat.S_ISREG(self.stat(follow_symlinks).st_mode)
+        except OSError:return False
+
+    def stat(self,follow_symlinks=True):
+        if not follow_symlinks or not self.is_symlink():return self._getlstat()
+        if self._stat is None:self._stat=os.stat(self.path)
+        return self._stat
+
+def scandir(directory):
+    ''' List a directory, returning os.DirEntry (or equivalent) objects.
+
+        Uses os.scandir or the scandir module if available, so the file type (and on Windows
+        the stat result) comes from the directory listing without any extra system calls.
+
+        @type    directory: C{str}
+        @param   directory: Path to directory
+        @rtype:  C{list}
+        @return: List of DirEntry objects
+    '''
+    if _scandir is None:return [_DirEntry(directory,name) for name in os.listdir(directory)]
+    else:return list(_scandir(directory))
+
+def listdir(directory,refresh=False):
+    ''' List a directory, reusing a cached listing if the directory hasn't been modified since.
+
+        Drivers look for a dataset's related files in the same directory over and over
+        again, once for every dataset in it. Caching the listing (keyed on the directory's
+        modification time) means each directory only needs to be listed once, plus one
+        stat to check it hasn't changed. L{walk} refreshes the listing of each directory
+        it searches, so a crawl fills the cache as it goes. The most recently used
+        L{maxlistings} listings are kept.
+
+        @type    directory: C{str}
+        @param   directory: Path to directory
+        @type    refresh:   C{boolean}
+        @param   refresh:   List the directory even if it's cached
+        @rtype:  C{list}
+        @return: List of DirEntry objects (see L{scandir}), don't modify it
+        @note:   Modifying a file doesn't change its directory's modification time,
+                 so the stat results of DirEntry objects from a cached listing may be out of date.
+    '''
+    directory=os.path.abspath(directory)
+    key=os.path.normcase(directory)
+    mtime=os.stat(directory).st_mtime
+    with _listingslock:
+        listing=_listings.pop(key,None)
+        if listing is not None and listing[0]==mtime and not refresh:
+            _listings[key]=listing
+            return listing[1]
+    entries=scandir(directory)
+    with _listingslock:
+        _listings[key]=(mtime,entries)
+        while len(_listings)>maxlistings:_listings.popitem(last=False)
+    return entries
+
+def glob(pattern):
+    ''' Like glob.glob, but uses L{listdir} so the directory listing is cached.
+
+        Only patterns with wildcards in the last path component use the cache,
+        anything else is passed on to glob.glob.
+
+        @type    pattern: C{str}
+        @param   pattern: Glob style pattern
+        @rtype:  C{list}
+        @return: List of matching paths
+    '''
+    directory,name=os.path.split(pattern)
+    if _glob.has_magic(directory):return _glob.glob(pattern)
+    if not _glob.has_magic(name):
+        if name and os.path.lexists(pattern):return [pattern]
+        return []
+    try:entries=listdir(directory or os.curdir)
+    except OSError:return []
+    names=[entry.name for entry in entries]
+    if name[0]!='.':names=[n for n in names if n[0]!='.'] #Hidden files must be matched explicitly, same as glob.glob
+    return [os.path.join(directory,n) for n in fnmatch.filter(names,name)]
+
+def fnmatcher(patterns):
+    ''' Compile one or more glob style patterns into a single matcher.
+
+        @type    patterns: C{list}
+        @param   patterns: List of glob style patterns
+        @rtype:  C{function}
+        @return: Function that returns True if a name matches any of the patterns (case insensitive on Windows)
+    '''
+    regexes=[]
+    for pattern in patterns:
+        regex=fnmatch.translate(pattern)
+        if regex.endswith('(?ms)'):regex=regex[:-5] #Python 2 appends the flags, they can only appear once
+        regexes.append('(?:%s)'%regex)
+    if not regexes:return lambda name:False
+    rx=re.compile('(?ms)'+'|'.join(regexes), re.I if iswin else 0)
+    return lambda name:rx.match(name) is not None
+
+def walk(directory, recurse=True, excludes=[], onerror=None, followlinks=False, threads=1, prefetch=None, cached=False):
+    ''' Directory tree generator, like os.walk (top down) but built on L{scandir}.
+
+        Directory listing on network file systems is latency bound, so with C{threads > 1} a pool of
+        threads lists the directories that are next in line while the caller processes the current one.
+        Directories are still returned in the same order as a single threaded walk.
+
+        @type    directory: C{str}
+        @param   directory: Path to directory
+        @type    recurse: C{boolean}
+        @param   recurse: Recurse into the directory?
+        @type    excludes: C{list}
+        @param   excludes: List of glob style file/directory exclusion pattern/s
+        @type    onerror: C{function}
+        @param   onerror: Function called with the OSError if a directory can't be listed
+        @type    followlinks: C{boolean}
+        @param   followlinks: Walk into directories pointed to by symlinks?
+        @type    threads: C{int}
+        @param   threads: Number of threads to list directories with
+        @type    prefetch: C{function}
+        @param   prefetch: Function that returns True for file names that should have their stat
+                           results fetched by the listing threads (only used if C{threads > 1})
+        @type    cached: C{boolean}
+        @param   cached: Use cached directory listings if they're still current, see L{listdir}.
+                         Otherwise each directory is listed again and the cache updated.
+        @rtype:  C{generator}
+        @return: (root, [directory DirEntry,...], [file DirEntry,...]) tuples
+    '''
+    excluded=fnmatcher(excludes)
+    def _listdir(root):
+        dirs,files=[],[]
+        for entry in listdir(root,refresh=not cached):
+            if excluded(entry.name):continue
+            if entry.is_dir():dirs.append(entry)
+            else:
+                files.append(entry)
+                if prefetch is not None and prefetch(entry.name):
+                    try:entry.stat() #DirEntry objects cache the result
+                    except OSError:pass
+        return dirs,files
+
+    def subdirs(root,dirs):
+        return [os.path.join(root,d.name) for d in dirs if followlinks or not d.is_symlink()]
+
+    if recurse and threads > 1:lister=_DirLister(_listdir,subdirs,threads)
+    else:lister=None
+
+    stack=[directory]
+    try:
+        while stack:
+            root=stack.pop()
+            try:
+                if lister:dirs,files=lister.result(root)
+                else:dirs,files=_listdir(root)
+            except OSError as e:
+                if onerror is not None:onerror(e)
+                continue
+            yield root,dirs,files
+            if not recurse:break
+            stack.extend(reversed(subdirs(root,dirs)))
+            if lister:lister.fill(stack)
+    finally:
+        if lister:lister.close()
+
+class _DirLister(object):
+    ''' Thread pool that lists directories ahead of a L{walk}.
+
+        Idle threads take the next directory from a shared queue. The queue is topped up from the
+        top of the walk's stack, i.e. with the directories that will be needed next, and by the
+        threads themselves with the subdirectories of each directory they list. At most
+        C{maxpending} listings are queued or held in memory at any one time.
+    '''
+    def __init__(self,listdir,subdirs,threads,maxpending=None):
+        self._listdir=listdir
+        self._subdirs=subdirs
+        self._maxpending=maxpending or threads*16
+        self._submitted=set() #Directories queued or listed but not yet collected
+        self._results={}
+        self._tasks=Queue.Queue()
+        self._done=threading.Condition()
+        self._closed=False
+        for i in range(threads):
+            t=threading.Thread(target=self._work)
+            t.daemon=True
+            t.start()
+        self._threads=threads
+
+    def _work(self):
+        while True:
+            path=self._tasks.get()
+            if path is None:break
+            try:result=(self._listdir(path),None)
+            except OSError as e:result=(None,e)
+            except Exception as e:result=(None,OSError(str(e)))
+            with self._done:
+                if self._closed:continue #Nobody is going to collect it
+                self._results[path]=result
+                if result[1] is None:
+                    for d in self._subdirs(path,result[0][0]):
+                        if len(self._submitted)>=self._maxpending:break
+                        self._submit(d)
+                self._done.notify_all()
+
+    def _submit(self,path):
+        if path not in self._submitted:
+            self._submitted.add(path)
+            self._tasks.put(path)
+
+    def fill(self,stack):
+        with self._done:
+            for path in reversed(stack):
+                if len(self._submitted)>=self._maxpending:break
+                self._submit(path)
+
+    def result(self,path):
+        with self._done:
+            self._submit(path)
+            while path not in self._results:
+                self._done.wait(1) #Timeout so we can still be interrupted
+            listing,err=self._results.pop(path)
+            self._submitted.discard(path)
+        if err is not None:raise err
+        return listing
+
+    def close(self):
+        ''' Stop the threads once they've finished the directories they're listing'''
+        with self._done:
+            self._closed=True
+            #Drop the queued directories and the listings that haven't been collected
+            while True:
+                try:self._tasks.get_nowait()
+                except Queue.Empty:break
+            self._results.clear()
+            self._submitted.clear()
+        for i in range(self._threads):self._tasks.put(None)
+
+def rscandir(directory, pattern="*", regex=False, regex_flags=0, recurse=True, archive=False, excludes=[],
+          onerror=None, followlinks=False, threads=1, cached=False, roots=False):
+    ''' Like L{rglob}, but yields the file's DirEntry as well so the file type
+        and stat results from the directory search can be reused.
+
+        Parameters are the same as L{rglob}, plus C{cached} (see L{walk}) and C{roots}.
+
+        @type    roots: C{boolean}
+        @param   roots: Yield the directory each file was found in as well (for files in
+                        archives, the archive's directory). All the files in a directory
+                        are yielded before moving on to the next one.
+        @rtype:  C{generator}
+        @return: (filepath, DirEntry) or (directory, filepath, DirEntry) tuples,
+                 DirEntry is None for files in archives
+    '''
+    if regex:
+        rx=re.compile(pattern,regex_flags)
+        matches=lambda f:rx.search(f) is not None
+    else:
+        matches=lambda f:fnmatch.fnmatch(f, pattern)
+    excluded=fnmatcher(excludes)
+
+    for root, dirs, files in walk(directory, recurse, excludes, onerror, followlinks, threads, matches, cached):
+        for entry in files:
+            f=os.path.join(root,entry.name)
+            if archive and isarchive(f):
+                try:
+                    for p in archivelist(f):
+                        if not excluded(p) and matches(p):
+                            if roots:yield root,p,None
+                            else:yield p,None
+                except Exception as e:
+                    if onerror is not None:
+                        e.filename = f
+                        onerror(e)
+                continue
+
+            if matches(entry.name):
+                if roots:yield root,f,entry
+                else:yield f,entry
+
 def rglob(directory, pattern="*", regex=False, regex_flags=0, recurse=True, archive=False, excludes=[],
-          onerror=None, followlinks=False):
-    ''' @type    directory: C{str}
+          onerror=None, followlinks=False, threads=1):
+    ''' Directory search generator. Directory listings are cached, see L{listdir}.
+
+        @type    directory: C{str}
         @param   directory: Path to xls file
         @type    pattern: C{type}
         @param   pattern: Regular expression/wildcard pattern to match files against
@@ -543,40 +1189,11 @@ def rglob(directory, pattern="*", regex=False, regex_flags=0, recurse=True, arch
         @param   archive: List files in compressed archives? Archive be supported by the zipfile and tarfile modules. Note: this slows things down considerably....
         @type    excludes: C{list}
         @param   excludes: List of glob style file/directory exclusion pattern/s
+        @type    threads: C{int}
+        @param   threads: Number of threads to list directories with, see L{walk}
     '''
-    for root, dirs, files in os.walk(directory, onerror=onerror, followlinks=followlinks):
-
-        for exc in excludes:
-            dirs[:] = [d for d in dirs if not fnmatch.fnmatch(d,exc)]
-            files[:] = [f for f in files if not fnmatch.fnmatch(f,exc)]
-
-        for f in files:
-            fullname = os.path.join(root, f)
-
-            if archive:
-                try:isarchive=tarfile.is_tarfile(fullname) or zipfile.is_zipfile(fullname)
-                except:isarchive=False
-
-                if isarchive:
-                    try:
-                        paths = archivelist(fullname)
-                        for exc in excludes:
-                            paths[:] = [p for p in paths if not fnmatch.fnmatch(p,exc)]
-                        for p in paths:
-                            if match(p, pattern, regex, regex_flags):
-                                yield p
-                    except Exception as e:
-                        if onerror is not None:
-                            e.filename = fullname
-                            onerror(e)
-                    continue
-
-            if match(f, pattern, regex, regex_flags):
-                yield fullname
-
-        if not recurse:
-            dirs = []
-            break
+    for f,entry in rscandir(directory, pattern, regex, regex_flags, recurse, archive, excludes, onerror, followlinks, threads, True):
+        yield f
 
 def match(f, pattern="*", regex=False, regex_flags=0):
     if regex:
@@ -602,6 +1219,251 @@ def isrunning(pid):
         except:
             return False
 
+class WorkerPool(object):
+    ''' A pool of worker processes that returns results in task order and survives worker crashes.
+
+        Each worker runs one task at a time and has its own pipe, so if a worker process dies
+        (e.g. GDAL segfaults on a corrupt file) the task it was running is reported as failed
+        and the worker is replaced without affecting the others.
+
+        Example:
+            >>> pool=WorkerPool(4)
+            >>> for args,result,error in pool.imap(somemodulefunction, [(1,2),(3,4)]):
+            >>>     if error:print error[0]
+            >>>     else:print result
+            >>> pool.close()
+    '''
+    def __init__(self,processes,initializer=None,initargs=()):
+        ''' A pool of worker processes.
+
+            @type    processes:   C{int}
+            @param   processes:   Number of worker processes
+            @type    initializer: C{function}
+            @param   initializer: Module level function each worker process calls with initargs when it starts
+            @type    initargs:    C{tuple}
+            @param   initargs:    Arguments for the initializer
+        '''
+        import multiprocessing
+        self._mp=multiprocessing
+        self._initializer=initializer
+        self._initargs=initargs
+        self.processes=processes
+        self._workers=[self._start() for i in range(processes)]
+
+    def _start(self):
+        worker=_Worker()
+        worker.conn,conn=self._mp.Pipe()
+        worker.process=self._mp.Process(target=_work,args=(conn,self._initializer,self._initargs))
+        worker.process.daemon=True
+        worker.process.start()
+        conn.close() #So we get an EOFError if the worker dies
+        return worker
+
+    def imap(self,func,iterable,window=None):
+        ''' Run func(*args) for each args tuple in iterable, in the worker processes.
+
+            Tasks are taken from iterable lazily, at most C{window} tasks are running or
+            waiting to be returned at any one time.
+
+            @type    func:     C{function}
+            @param   func:     Module level function, it and its return value must be picklable
+            @type    iterable: C{iterable}
+            @param   iterable: Argument tuples
+            @type    window:   C{int}
+            @param   window:   Maximum number of outstanding tasks, defaults to 4 x processes
+            @rtype:  C{generator}
+            @return: (args, result, error) tuples in task order. Error is None or a
+                     (L{ExceptionInfo}(), L{ExceptionInfo}(10)) tuple of strings.
+        '''
+        window=window or self.processes*4
+        iterable=iter(iterable)
+        tasks,done={},{}
+        nexttask,nextresult=0,0
+        exhausted=False
+        while True:
+            #Give idle workers something to do
+            for worker in self._workers:
+                if exhausted or nexttask-nextresult >= window:break
+                if worker.task is not None:continue
+                try:args=iterable.next()
+                except StopIteration:
+                    exhausted=True
+                    break
+                tasks[nexttask]=args
+                worker.task=nexttask
+                nexttask+=1
+                try:worker.conn.send((func,args))
+                except IOError:pass #Worker has died, it'll be restarted below
+
+            #Return results in order
+            while nextresult in done:
+                result,err=done.pop(nextresult)
+                args=tasks.pop(nextresult)
+                nextresult+=1
+                yield args,result,err
+
+            if exhausted and nextresult==nexttask:return
+
+            #Collect results
+            received=False
+            for i,worker in enumerate(self._workers):
+                if worker.task is None:continue
+                try:
+                    if not worker.conn.poll():
+                        if worker.process.is_alive():continue
+                        raise EOFError
+                    done[worker.task]=worker.conn.recv()
+                    worker.task=None
+                except (EOFError,IOError):
+                    worker.process.join()
+                    done[worker.task]=(None,('WorkerError: worker process exited unexpectedly (exit code %s)'%worker.process.exitcode,''))
+                    self._workers[i]=self._start()
+                received=True
+            if not received:time.sleep(0.01)
+
+    def close(self):
+        ''' Stop the worker processes'''
+        for worker in self._workers:
+            try:worker.conn.send(None)
+            except IOError:pass
+        for worker in self._workers:
+            worker.process.join(5)
+            if worker.process.is_alive():worker.process.terminate()
+            worker.conn.close()
+        self._workers=[]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+class _Worker(object):
+    ''' A WorkerPool process, its pipe and the number of the task it's running (if any)'''
+    process=None
+    conn=None
+    task=None
+
+def _work(conn,initializer,initargs):
+    ''' WorkerPool process main loop'''
+    if initializer is not None:initializer(*initargs)
+    while True:
+        task=conn.recv()
+        if task is None:break
+        func,args=task
+        try:result=(func(*args),None)
+        except Exception:result=(None,(ExceptionInfo(),ExceptionInfo(10)))
+        try:conn.send(result)
+        except Exception:conn.send((None,(ExceptionInfo(),ExceptionInfo(10)))) #Couldn't pickle the result
+
+class ThreadPool(object):
+    ''' A pool of worker threads with the same interface as L{WorkerPool}.
+
+        Threads are much cheaper than processes and suit I/O bound work, e.g. reading
+        files from network shares, but func must be thread safe and a crash (e.g. a
+        GDAL segfault) takes down the whole process.
+
+        Example:
+            >>> with ThreadPool(4) as pool:
+            >>>     for args,result,error in pool.imap(somefunction, [(1,2),(3,4)]):
+            >>>         if error:print error[0]
+            >>>         else:print result
+    '''
+    def __init__(self,threads,initializer=None,initargs=()):
+        ''' A pool of worker threads.
+
+            @type    threads:     C{int}
+            @param   threads:     Number of worker threads
+            @type    initializer: C{function}
+            @param   initializer: Function each worker thread calls with initargs when it starts
+            @type    initargs:    C{tuple}
+            @param   initargs:    Arguments for the initializer
+        '''
+        self.threads=threads
+        self._tasks=Queue.Queue()
+        self._results=Queue.Queue()
+        self._threads=[]
+        for i in range(threads):
+            t=threading.Thread(target=self._work,args=(initializer,initargs))
+            t.daemon=True
+            t.start()
+            self._threads.append(t)
+
+    def _work(self,initializer,initargs):
+        if initializer is not None:initializer(*initargs)
+        while True:
+            task=self._tasks.get()
+            if task is None:break
+            i,func,args=task
+            try:result=(func(*args),None)
+            except Exception:result=(None,(ExceptionInfo(),ExceptionInfo(10)))
+            self._results.put((i,result))
+
+    def imap(self,func,iterable,window=None):
+        ''' Run func(*args) for each args tuple in iterable, in the worker threads.
+
+            Tasks are taken from iterable lazily, only when a thread is free, and at most
+            C{window} tasks are running or waiting to be returned at any one time.
+
+            @type    func:     C{function}
+            @param   func:     Thread safe function
+            @type    iterable: C{iterable}
+            @param   iterable: Argument tuples
+            @type    window:   C{int}
+            @param   window:   Maximum number of outstanding tasks, defaults to 4 x threads
+            @rtype:  C{generator}
+            @return: (args, result, error) tuples in task order. Error is None or a
+                     (L{ExceptionInfo}(), L{ExceptionInfo}(10)) tuple of strings.
+        '''
+        window=window or self.threads*4
+        iterable=iter(iterable)
+        tasks,done={},{}
+        nexttask,nextresult=0,0
+        running=0
+        exhausted=False
+        while True:
+            #Give idle threads something to do
+            while not exhausted and running < self.threads and nexttask-nextresult < window:
+                try:args=iterable.next()
+                except StopIteration:
+                    exhausted=True
+                    break
+                tasks[nexttask]=args
+                self._tasks.put((nexttask,func,args))
+                nexttask+=1
+                running+=1
+
+            #Return results in order
+            while nextresult in done:
+                result,err=done.pop(nextresult)
+                args=tasks.pop(nextresult)
+                nextresult+=1
+                yield args,result,err
+
+            if exhausted and nextresult==nexttask:return
+            if not exhausted and running < self.threads and nexttask-nextresult < window:continue #Room for more tasks now the results have been returned
+
+            #Collect results
+            try:i,result=self._results.get(True,1) #Timeout so we can still be interrupted
+            except Queue.Empty:continue
+            done[i]=result
+            running-=1
+
+    def close(self):
+        ''' Stop the worker threads once they've finished their current task'''
+        try:
+            while True:self._tasks.get_nowait() #Discard any tasks that haven't started
+        except Queue.Empty:pass
+        for t in self._threads:self._tasks.put(None)
+        for t in self._threads:t.join(5)
+        self._threads=[]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
 #========================================================================================================
 #{Exception Utilities
 #========================================================================================================
@@ -729,6 +1591,8 @@ class ExcelWriter:
 
             @type    data: C{dict} #Known issue, doesn't handle list of lists (zipped lists)
             @param   data: Dict containing column headers (dict.keys()) and values (dict.values())
+            @rtype:  C{int}
+            @return: Row number of the record (for L{UpdateRecord}) or None if nothing was written
         '''
         dirty=False
         if self._rows > 1048575:
@@ -754,6 +1618,7 @@ class ExcelWriter:
         if dirty:
             self._rows+=1
             #self._wb.save(self._file)
+            return self._sheets.index(self._ws)*1048575+self._rows-1
 
     def UpdateRecord(self,data,row):
         ''' Update an existing record
@@ -792,6 +1657,17 @@ class ExcelWriter:
         else:
             self._wb.save(self._file)
 
+    def checkpoint(self):
+        ''' Save the records written so far to the spreadsheet.
+
+            The spreadsheet is saved to a temporary file which then replaces the
+            spreadsheet, so a crash while saving doesn't lose the previous checkpoint.
+        '''
+        tmp='%s.checkpoint%s'%os.path.splitext(self._file)
+        self._wb.save(tmp)
+        if iswin and os.path.exists(self._file):os.remove(self._file) #Can't rename over an existing file on Windows
+        os.rename(tmp,self._file)
+
     def __enter__(self):
         return self
 
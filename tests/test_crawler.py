@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Tests for the metadata crawler (L{metageta.crawler})
+
+Run with C{python -m unittest discover -s tests}. The tests are skipped if GDAL,
+openpyxl, etc... aren't installed.
+'''
+
+import os, shutil, tempfile, unittest
+
+try:
+    from metageta import crawler
+except ImportError:
+    crawler=None
+
+class Dataset(object):
+    ''' Stands in for a format driver, the dataset claims every file in its directory'''
+    claims=[] #Extra files claimed by the first dataset opened
+    def __init__(self,f):
+        d=os.path.dirname(f)
+        self.filelist=[os.path.join(d,name) for name in os.listdir(d) if name.endswith('.tif')]
+        self.filelist.extend(Dataset.claims)
+        Dataset.claims=[]
+
+@unittest.skipIf(crawler is None, 'GDAL or openpyxl not installed')
+class StreamTest(unittest.TestCase):
+    def setUp(self):
+        self.dir=tempfile.mkdtemp()
+        self.files=[]
+        for i in range(50):
+            for d in [os.path.join(self.dir,'%02d'%i),os.path.join(self.dir,'%02d'%i,'sub')]:
+                os.mkdir(d)
+                for name in ['band1.tif','band2.tif']:
+                    self.files.append(os.path.join(d,name))
+                    open(self.files[-1],'w').close()
+        self.Open=crawler.formats.Open
+        crawler.formats.Open=Dataset
+
+    def tearDown(self):
+        crawler.formats.Open=self.Open
+        Dataset.claims=[]
+        shutil.rmtree(self.dir)
+
+    def crawl(self):
+        ''' Stream crawl, returning the filelists and the number of files claimed ahead of the search'''
+        Crawler=crawler.Crawler(self.dir,stream=True)
+        filelists,claimed=[],[]
+        for ds in Crawler:
+            filelists.append(ds.filelist)
+            claimed.append(len(Crawler._claimed))
+        return filelists,claimed
+
+    def test_bounded(self):
+        filelists,claimed=self.crawl()
+        self.assertEqual(len(filelists),100)
+        self.assertEqual(max(claimed),0)
+
+    def test_claimed_ahead(self):
+        Dataset.claims=self.files
+        filelists,claimed=self.crawl()
+        self.assertEqual(len(filelists),1)
+        self.assertEqual(claimed[0],len(self.files)-2)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Tests for the geometry utilities (L{metageta.geometry})
+
+The tests are skipped if GDAL isn't installed.
+'''
+
+import unittest, warnings
+
+try:
+    from metageta import geometry
+except ImportError:
+    geometry=None
+
+@unittest.skipIf(geometry is None, 'GDAL is not installed')
+class ReprojectPointsTest(unittest.TestCase):
+    points=[[150.0,-35.0],[151.0,-35.0],[151.0,-36.0],[150.0,-36.0]]
+
+    def test_reproject(self):
+        xy=geometry.ReprojectPoints(self.points,4326,4326)
+        for p,q in zip(xy,self.points):
+            self.assertAlmostEqual(p[0],q[0])
+            self.assertAlmostEqual(p[1],q[1])
+
+    def test_invalid_srs(self):
+        ''' Points with an empty or invalid SRS are returned unchanged, with a warning'''
+        for srs in ('','not a spatial reference'):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                self.assertEqual(geometry.ReprojectPoints(self.points,srs,4326),self.points)
+            self.assertEqual(len(caught),1)
+
+@unittest.skipIf(geometry is None, 'GDAL is not installed')
+class InBoundsTest(unittest.TestCase):
+    def test_inbounds(self):
+        self.assertTrue(geometry.InBounds([[150,-35],[151,-36]],-180,-90,180,90))
+        self.assertFalse(geometry.InBounds([[150,-35],[500000,6000000]],-180,-90,180,90))
+        self.assertEqual(list(geometry.InBounds([[[150,-35]],[[500000,6000000]]],-180,-90,180,90)),[True,False])
+
+    def test_strings(self):
+        ''' Corners split from the UL/LL/LR/UR fields are strings'''
+        numpy=geometry.numpy
+        try:
+            for geometry.numpy in (numpy,None): #None checks the fallback when numpy isn't installed
+                self.assertTrue(geometry.InBounds([u'150.5,-35.5'.split(','),u'151,-36'.split(',')],-180,-90,180,90))
+                self.assertFalse(geometry.InBounds(['500000,6000000'.split(',')],-180,-90,180,90))
+        finally:geometry.numpy=numpy
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Tests for the crawl manifest (L{metageta.manifest})
+'''
+
+import os, shutil, tempfile, unittest
+
+from metageta import manifest
+
+class CrashedTest(unittest.TestCase):
+    def setUp(self):
+        self.dir=tempfile.mkdtemp()
+        self.path=os.path.join(self.dir,'crawl.manifest')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def reopen(self,mft):
+        ''' Open the manifest again as if the crawl had died, i.e. without closing it'''
+        return manifest.Manifest(self.path)
+
+    def test_inactive(self):
+        ''' Nothing is written before the crawl can be resumed'''
+        mft=manifest.Manifest(self.path)
+        mft.opening('/data/a.tif')
+        self.assertFalse(os.path.exists(self.path+'.current'))
+        self.assertEqual(self.reopen(mft).crashed(),None)
+
+    def test_crash_while_opening(self):
+        ''' A file that crashed the crawl while it was being opened is reported'''
+        mft=manifest.Manifest(self.path)
+        mft.active=True
+        mft.opening('/data/a.tif')
+        self.assertEqual(self.reopen(mft).crashed(),'/data/a.tif')
+
+    def test_crash_after_opening(self):
+        ''' A crash after the file was opened (extracting metadata, generating overviews) isn't'''
+        mft=manifest.Manifest(self.path)
+        mft.active=True
+        mft.opening('/data/a.tif')
+        mft.opened()
+        self.assertEqual(self.reopen(mft).crashed(),None)
+
+if __name__=='__main__':
+    unittest.main()
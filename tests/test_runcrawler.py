@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Tests for the metadata crawler script (L{metageta.__runcrawler__})
+
+Run with C{python -m unittest discover -s tests}. The tests are skipped if GDAL,
+openpyxl, etc... aren't installed.
+'''
+
+import os, shutil, tempfile, unittest, warnings
+
+try:
+    from metageta import __runcrawler__ as runcrawler
+    from metageta import crawler, overviews
+    from metageta.formats import __dataset__
+    from osgeo import gdal
+except ImportError:
+    runcrawler=None
+
+class FakeDataset(object):
+    ''' Stands in for a format driver's Dataset so the crawl doesn't need real imagery'''
+    def __init__(self,f):
+        self.filelist=[f]
+        self.guid=f
+        self.extent=[[0,1],[1,1],[1,0],[0,0]]
+        self.fileinfo={'filepath':f,'filename':os.path.basename(f),'guid':f,'datemodified':''}
+        self.metadata=dict(self.fileinfo)
+        self.metadata.update({'cols':10,'rows':20,'srs':'GEOGCS["WGS 84"]','filesize':123})
+    def getmetadata(self,fields=None):
+        return __dataset__.Dataset.getmetadata.im_func(self,fields)
+
+class Writer(object):
+    ''' Records what the crawl writes'''
+    def __init__(self):self.records=[]
+    def WriteRecord(self,*args):
+        self.records.append(args[-1])
+        return len(self.records)-1
+    def UpdateRecord(self,*args):pass
+    def add(self,*args):pass
+    def update(self,*args):pass
+    def __getattr__(self,name):return lambda *args:None #Logger methods
+
+class Logger(Writer):
+    ''' Records the warnings the crawl logs'''
+    def warn(self,msg):self.records.append(msg)
+
+def _exceptions():
+    ''' Check GDAL is still raising exceptions in this thread'''
+    try:gdal.Open('/nonexistent/metageta.tif')
+    except RuntimeError:return True
+    return False
+
+class StatsDataset(FakeDataset):
+    ''' Calculates statistics and warns while other worker threads do the same'''
+    failed=[] #Files where GDAL stopped raising exceptions
+    def getmetadata(self,fields=None):
+        ds=gdal.GetDriverByName('MEM').Create('',10,20)
+        band=ds.GetRasterBand(1)
+        for i in range(20):
+            band.Fill(i)
+            self.metadata['stats']=overviews.GetStatistics(band,0,1)
+            if not _exceptions():self.failed.append(self.guid)
+        warnings.warn(self.guid)
+        return FakeDataset.getmetadata(self,fields)
+
+@unittest.skipIf(runcrawler is None, 'MetaGETA dependencies are not installed')
+class ExtractAllTest(unittest.TestCase):
+    def setUp(self):
+        self.dir=tempfile.mkdtemp()
+        for i in range(10):open(os.path.join(self.dir,'%s.tif'%i),'w').close()
+        self._open=runcrawler.formats.Open
+        runcrawler.formats.Open=FakeDataset
+
+    def tearDown(self):
+        runcrawler.formats.Open=self._open
+        shutil.rmtree(self.dir)
+
+    def crawl(self,threaded,fields=None):
+        writer=Writer()
+        runcrawler.extractall(crawler.Crawler(self.dir),os.path.join(self.dir,'x.xlsx'),writer,Writer(),Writer(),{},Writer(),
+                              2,threaded=threaded,fields=fields)
+        return writer.records
+
+    def test_full_records(self):
+        ''' A multi-worker crawl without --fields writes every field'''
+        for threaded in (False,True):
+            records=self.crawl(threaded)
+            self.assertEqual(len(records),10)
+            for record in records:
+                self.assertEqual((record['cols'],record['rows'],record['filesize']),(10,20,123))
+
+    def test_selected_fields(self):
+        ''' A multi-worker crawl with --fields only writes those fields (and the file info)'''
+        for threaded in (False,True):
+            for record in self.crawl(threaded,['cols']):
+                self.assertEqual((record['cols'],record['rows'],record['filesize']),(10,'',''))
+                self.assertTrue(record['filepath'])
+
+@unittest.skipIf(runcrawler is None, 'MetaGETA dependencies are not installed')
+class ThreadedTest(unittest.TestCase):
+    ''' Extraction in several threads at once mustn't change process wide GDAL or warnings settings'''
+    def setUp(self):
+        self.dir=tempfile.mkdtemp()
+        for i in range(40):open(os.path.join(self.dir,'%s.tif'%i),'w').close()
+        self._open=runcrawler.formats.Open
+        runcrawler.formats.Open=StatsDataset
+
+    def tearDown(self):
+        runcrawler.formats.Open=self._open
+        shutil.rmtree(self.dir)
+
+    def test_threaded(self):
+        writer,logger=Writer(),Logger()
+        with warnings.catch_warnings():
+            warnings.simplefilter('always') #As the crawler's logger does
+            filters=list(warnings.filters)
+            runcrawler.extractall(crawler.Crawler(self.dir),os.path.join(self.dir,'x.xlsx'),writer,Writer(),Writer(),{},logger,
+                                  8,threaded=True)
+            self.assertEqual(warnings.filters,filters)
+        self.assertEqual(len(writer.records),40)
+        self.assertEqual(StatsDataset.failed,[]) #GetStatistics didn't turn exceptions off in another thread
+        self.assertTrue(_exceptions())
+        self.assertEqual(sorted(logger.records),sorted(r['filepath'] for r in writer.records)) #Each warning logged once, for its own file
+
+@unittest.skipIf(runcrawler is None, 'MetaGETA dependencies are not installed')
+class OverviewsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir=tempfile.mkdtemp()
+        self.f=os.path.join(self.dir,'rgb.tif')
+        ds=gdal.GetDriverByName('GTiff').Create(self.f,200,100,3)
+        for i in range(3):ds.GetRasterBand(i+1).Fill(50*i)
+        ds.SetGeoTransform([150,0.01,0,-35,0,-0.01])
+        ds=None
+        self._open=runcrawler.formats.Open
+
+    def tearDown(self):
+        runcrawler.formats.Open=self._open
+        shutil.rmtree(self.dir)
+
+    def test_source(self):
+        ''' Overview workers only open the gdal.Dataset when the job has its source'''
+        source=runcrawler.formats.Open(self.f).getoverviewsource()
+        self.assertNotEqual(source,None)
+        runcrawler.formats.Open=lambda f:self.fail('The format driver was used')
+        qlk,thm=os.path.join(self.dir,'rgb.qlk.jpg'),os.path.join(self.dir,'rgb.thm.jpg')
+        result=runcrawler._overviews(self.f,qlk,thm,source)
+        self.assertEqual((result['quicklook'],result['thumbnail']),('rgb.qlk.jpg','rgb.thm.jpg'))
+        self.assertTrue(os.path.exists(qlk) and os.path.exists(thm))
+
+if __name__=='__main__':
+    unittest.main()
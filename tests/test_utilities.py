@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Tests for the utilities module (L{metageta.utilities})
+
+The tests are skipped if openpyxl isn't installed.
+'''
+
+import os, shutil, tempfile, threading, time, unittest
+
+try:
+    from metageta import utilities, config
+except ImportError:
+    utilities=None
+
+@unittest.skipIf(utilities is None, 'MetaGETA dependencies are not installed')
+class PruneCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir=tempfile.mkdtemp()
+        self._get_cache_dir=config.get_cache_dir
+        config.get_cache_dir=lambda:self.dir
+        now=time.time()
+        for i in range(6):
+            f=os.path.join(self.dir,'%s.test'%i)
+            open(f,'w').close()
+            os.utime(f,(now-i*60,now-i*60)) #0.test is the most recently used
+        open(os.path.join(self.dir,'other.stats'),'w').close()
+
+    def tearDown(self):
+        config.get_cache_dir=self._get_cache_dir
+        utilities._cachewrites.pop('.test',None)
+        shutil.rmtree(self.dir)
+
+    def test_maxfiles(self):
+        utilities.prunecache('.test',4)
+        self.assertEqual(sorted(os.listdir(self.dir)),['0.test','1.test','2.test','3.test','other.stats'])
+
+    def test_maxage(self):
+        utilities.prunecache('.test',10,maxage=150)
+        self.assertEqual(sorted(os.listdir(self.dir)),['0.test','1.test','2.test','other.stats'])
+
+    def test_interval(self):
+        ''' The cache directory is only checked after the first and every interval writes'''
+        utilities.prunecache('.test',5,interval=3)
+        self.assertEqual(len(os.listdir(self.dir)),6)
+        for i in range(2):utilities.prunecache('.test',1,interval=3)
+        self.assertEqual(len(os.listdir(self.dir)),6)
+        utilities.prunecache('.test',1,interval=3)
+        self.assertEqual(sorted(os.listdir(self.dir)),['0.test','other.stats'])
+
+@unittest.skipIf(utilities is None, 'MetaGETA dependencies are not installed')
+class DirListerTest(unittest.TestCase):
+    def setUp(self):
+        self.listed=[]
+        self.threads=threading.active_count()
+
+    def listdir(self,path):
+        time.sleep(0.01)
+        self.listed.append(path)
+        return [],[]
+
+    def test_close(self):
+        ''' Directories that were queued when the walk stopped aren't listed'''
+        lister=utilities._DirLister(self.listdir,lambda root,dirs:[],2,maxpending=100)
+        stack=['/dir/%s'%i for i in range(100)]
+        lister.fill(stack)
+        lister.result(stack[-1])
+        lister.close()
+        for i in range(100):
+            if threading.active_count()==self.threads:break
+            time.sleep(0.01)
+        self.assertEqual(threading.active_count(),self.threads)
+        self.assertTrue(len(self.listed)<10,self.listed)
+        self.assertEqual(lister._results,{})
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013 Australian Government, Department of the Environment
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Tests for the streaming XML reader (L{metageta.formats.__xml__})
+
+The tests are skipped if lxml isn't installed.
+'''
+
+import os, shutil, tempfile, unittest
+
+try:
+    from metageta.formats import __xml__
+except ImportError:
+    __xml__=None
+
+_document='''<?xml version="1.0"?>
+<Dimap_Document xmlns:n="urn:n">
+  <Metadata_Identification><METADATA_FORMAT version="2.0">DIMAP</METADATA_FORMAT></Metadata_Identification>
+  <Dataset_Identification><DATASET_NAME>SCENE 1</DATASET_NAME></Dataset_Identification>
+  <Geometric_Data>
+    <Located_Geometric_Values><LOCATION_TYPE>Center</LOCATION_TYPE><n:SUN_ELEVATION>45</n:SUN_ELEVATION></Located_Geometric_Values>
+    <Located_Geometric_Values><LOCATION_TYPE>Top</LOCATION_TYPE><n:SUN_ELEVATION>46</n:SUN_ELEVATION></Located_Geometric_Values>
+  </Geometric_Data>
+  <Other><DATASET_NAME>Not this one</DATASET_NAME></Other>
+  <Data_Strip><DATASET_NAME>Or this one</DATASET_NAME></Data_Strip>
+</Dimap_Document>
+'''
+
+@unittest.skipIf(__xml__ is None, 'lxml is not installed')
+class ReadTest(unittest.TestCase):
+    def setUp(self):
+        self.dir=tempfile.mkdtemp()
+        self.f=os.path.join(self.dir,'METADATA.DIM')
+        open(self.f,'w').write(_document)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_read(self):
+        xml=__xml__.read(self.f,{'version':'//METADATA_FORMAT/@version',
+                                 'sceneid':'/Dimap_Document/Dataset_Identification/DATASET_NAME',
+                                 'names':'//DATASET_NAME',
+                                 'geometry':'//Located_Geometric_Values',
+                                 'missing':'//NCOLS'},stop='Data_Strip')
+        self.assertEqual(xml.root,'Dimap_Document')
+        self.assertEqual(xml.string('version'),'2.0')
+        self.assertEqual(xml.string('sceneid'),'SCENE 1')
+        self.assertEqual([n.text for n in xml['names']],['SCENE 1','Not this one'])
+        self.assertEqual([g.xpath('string(LOCATION_TYPE)') for g in xml['geometry']],['Center','Top'])
+        self.assertEqual(xml['geometry'][1].xpath('number(*[local-name()="SUN_ELEVATION"])'),46)
+        self.assertEqual(xml.string('missing','none'),'none')
+        self.assertNotEqual(xml.number('missing'),xml.number('missing')) #NaN
+
+    def test_nested(self):
+        ''' Nested matches of the same path are in document order'''
+        open(self.f,'w').write('<Root><Group id="1"><Group id="2"><Group id="3"/></Group></Group><Group id="4"/></Root>')
+        xml=__xml__.read(self.f,{'groups':'//Group','ids':'//Group/@id'})
+        self.assertEqual([g.get('id') for g in xml['groups']],['1','2','3','4'])
+        self.assertEqual(xml['ids'],['1','2','3','4'])
+        self.assertEqual(len(xml['groups'][0].xpath('.//Group')),2)
+
+    def test_text(self):
+        ''' The text up to the stop tag, in any case and however it's split across reads'''
+        head=_document[:_document.index('<Data_Strip>')].rstrip()+'\n</Dimap_Document>\n'
+        for size in (5,64,65536):
+            self.assertEqual(__xml__.text(self.f,'DATA_STRIP','Dimap_Document',size=size),head)
+            self.assertEqual(__xml__.text(self.f,size=size),_document)
+
+if __name__=='__main__':
+    unittest.main()